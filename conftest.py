@@ -49,6 +49,18 @@ def audio_file(goodsounds_root):
                         'bass_alejandro_recordings', 'neumann', '0005.wav')
 
 
+@pytest.fixture(autouse=True)
+def audio_cache_dir(monkeypatch, tmpdir):
+    """Keep the decoded audio and track caches out of the user's home
+    directory."""
+    import minst.cache
+    cache_dir = str(tmpdir.join('audio_cache'))
+    monkeypatch.setattr(minst.cache, 'CACHE_DIR', cache_dir)
+    monkeypatch.setattr(minst.cache, 'TRACK_CACHE_DIR',
+                        str(tmpdir.join('track_cache')))
+    return cache_dir
+
+
 @pytest.fixture()
 def workspace(request):
     test_workspace = tempfile.mkdtemp()
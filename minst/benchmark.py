@@ -0,0 +1,307 @@
+"""Accuracy and resource benchmarks for the onset detectors.
+
+Estimated onsets are scored against reference onsets, e.g. the annotated
+`-fix.csv` files gathered by `scripts/collect_onsets.py`, which the
+dataset indexes point to as `onsets_file`. For offline use,
+`synthesize_corpus` writes a corpus of synthetic notes with known onsets in
+the same layout.
+"""
+import logging
+import numpy as np
+import os
+import pandas as pd
+from sklearn.utils import check_random_state
+import time
+
+import claudio
+
+import minst.signal as S
+import minst.utils as utils
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+logger = logging.getLogger(__name__)
+
+CPU_TIME = getattr(time, 'process_time', None) or time.clock
+
+RESULT_COLUMNS = ['mode', 'n_reference', 'n_estimated', 'f_measure',
+                  'precision', 'recall', 'wall_time', 'cpu_time',
+                  'peak_memory', 'error']
+
+
+def read_onsets(onsets_file):
+    """Return the sorted onset times (the `time` column) of a CSV file."""
+    onsets = pd.read_csv(onsets_file, index_col=0)
+    return np.sort(onsets['time'].values.astype(np.float64))
+
+
+def f_measure(reference, estimated, window=0.05):
+    """Score estimated onsets against reference onsets.
+
+    Each reference onset can be matched to at most one estimated onset
+    within `window` seconds of it, and vice versa; on a line, matching the
+    two sorted lists greedily gives the largest such matching.
+
+    Parameters
+    ----------
+    reference, estimated : array_like
+        Onset times, in seconds.
+
+    window : float
+        Tolerance, in seconds.
+
+    Returns
+    -------
+    f_measure, precision, recall : float
+        Zero when there is nothing to score.
+    """
+    reference = np.sort(np.asarray(reference, dtype=np.float64).ravel())
+    estimated = np.sort(np.asarray(estimated, dtype=np.float64).ravel())
+
+    i, j, hits = 0, 0, 0
+    while i < len(reference) and j < len(estimated):
+        delta = estimated[j] - reference[i]
+        if abs(delta) <= window:
+            hits, i, j = hits + 1, i + 1, j + 1
+        elif delta < 0:
+            j += 1
+        else:
+            i += 1
+
+    precision = hits / float(len(estimated)) if len(estimated) else 0.0
+    recall = hits / float(len(reference)) if len(reference) else 0.0
+    if not precision + recall:
+        return 0.0, precision, recall
+    return (2 * precision * recall / (precision + recall),
+            precision, recall)
+
+
+def measure(func, *args, **kwargs):
+    """Call a function, measuring the resources it uses.
+
+    Returns
+    -------
+    result : object
+        Return value of `func(*args, **kwargs)`.
+
+    usage : dict
+        wall_time and cpu_time, in seconds, and peak_memory, the most
+        memory allocated at once during the call (in bytes, as traced by
+        `tracemalloc`; None where unavailable).
+    """
+    tracing = tracemalloc is not None and not tracemalloc.is_tracing()
+    if tracing:
+        tracemalloc.start()
+    elif tracemalloc is not None and hasattr(tracemalloc, 'reset_peak'):
+        tracemalloc.reset_peak()
+    baseline = tracemalloc.get_traced_memory()[0] if tracemalloc else None
+
+    wall_time, cpu_time = time.time(), CPU_TIME()
+    try:
+        result = func(*args, **kwargs)
+        usage = dict(wall_time=time.time() - wall_time,
+                     cpu_time=CPU_TIME() - cpu_time, peak_memory=None)
+        if tracemalloc is not None:
+            usage['peak_memory'] = tracemalloc.get_traced_memory()[1] - \
+                baseline
+    finally:
+        if tracing:
+            tracemalloc.stop()
+    return result, usage
+
+
+def synthesize_corpus(output_dir, n_files=4, duration=10.0, samplerate=22050,
+                      random_state=None):
+    """Write a corpus of synthetic notes, with their onsets.
+
+    Each file holds a few decaying harmonic tones over a noise floor, at
+    least 2.5 seconds apart, and each onsets file is written as by
+    `scripts/collect_onsets.py`.
+
+    Parameters
+    ----------
+    output_dir : str
+        Directory for the audio and onset files; created if needed.
+
+    n_files : int
+        Number of files to write.
+
+    duration : float
+        Duration of each file, in seconds.
+
+    samplerate : int
+        Samplerate of the audio files.
+
+    random_state : None, int, or np.random.RandomState
+        For reproducible corpora.
+
+    Returns
+    -------
+    index : pd.DataFrame
+        With columns audio_file and onsets_file.
+    """
+    rng = check_random_state(random_state)
+    utils.create_directory(output_dir)
+    n_samples = int(duration * samplerate)
+    t = np.arange(int(1.5 * samplerate)) / float(samplerate)
+
+    records, indexes = [], []
+    for n in range(n_files):
+        uid = "synthetic{:04d}".format(n)
+        x = rng.normal(scale=10.**-3, size=n_samples)
+        onsets = []
+        onset = rng.uniform(0.25, 1.0)
+        while onset + t[-1] < duration:
+            f0 = 110 * 2 ** rng.uniform(0, 3)
+            note = sum(np.sin(2 * np.pi * k * f0 * t) / k for k in range(1, 6))
+            note *= 0.3 * np.exp(-t / rng.uniform(0.2, 0.6))
+            note *= np.minimum(t / 0.005, 1.0)
+            start = int(onset * samplerate)
+            x[start:start + len(t)] += note
+            onsets.append(start / float(samplerate))
+            onset += rng.uniform(2.5, 3.5)
+
+        audio_file = os.path.join(output_dir, "{}.wav".format(uid))
+        onsets_file = os.path.join(output_dir, "{}.csv".format(uid))
+        claudio.write(audio_file, np.clip(x, -1, 1), samplerate=samplerate)
+        pd.DataFrame(dict(time=onsets)).to_csv(onsets_file)
+        indexes.append(uid)
+        records.append(dict(audio_file=audio_file, onsets_file=onsets_file))
+
+    return pd.DataFrame(records, index=indexes,
+                        columns=['audio_file', 'onsets_file'])
+
+
+def benchmark_onsets(index, modes=('envelope', 'logcqt'), window=0.05,
+                     params=None):
+    """Run onset detectors over a corpus, scoring and timing each.
+
+    Audio is decoded once per file, outside of the measurements, and each
+    detector gets a fresh `AnalysisContext`, so nothing is shared between
+    them.
+
+    Parameters
+    ----------
+    index : pd.DataFrame
+        With columns audio_file and onsets_file; rows without an
+        onsets_file are skipped.
+
+    modes : iterable of str
+        Detectors to run; see `minst.signal.ONSETS`.
+
+    window : float
+        Tolerance for `f_measure`, in seconds.
+
+    params : dict, or None
+        Mode -> dict of keyword arguments for its detector.
+
+    Returns
+    -------
+    results : pd.DataFrame
+        One row per file and mode, indexed by the file's index, with
+        columns as `RESULT_COLUMNS`. Detectors that can't run (e.g. HLL,
+        without its binary) leave the scores empty and an error.
+    """
+    params = dict() if params is None else params
+    records, indexes = [], []
+    for idx, row in index.iterrows():
+        if pd.isnull(row['onsets_file']):
+            logger.debug("Skipping {}: no reference onsets".format(idx))
+            continue
+        reference = read_onsets(row['onsets_file'])
+        x, fs = S.AnalysisContext(row['audio_file']).signal
+
+        for mode in modes:
+            context = S.AnalysisContext(row['audio_file'], x=x, fs=fs)
+            args = (row['audio_file'],) if mode == 'hll' else (x, fs)
+            record = dict(mode=mode, n_reference=len(reference))
+            try:
+                onsets, usage = measure(S.ONSETS[mode], *args,
+                                        context=context,
+                                        **params.get(mode, {}))
+            except EnvironmentError as derp:
+                logger.warning("{} failed on {}: {}".format(mode, idx, derp))
+                record['error'] = str(derp)
+            else:
+                record.update(usage, n_estimated=len(onsets))
+                (record['f_measure'], record['precision'],
+                 record['recall']) = f_measure(reference, onsets, window)
+            records.append(record)
+            indexes.append(idx)
+
+    return pd.DataFrame(records, index=indexes, columns=RESULT_COLUMNS)
+
+
+def benchmark_sweep(index, mode, window=0.05, **grid):
+    """Score a grid of peak picking parameters over a corpus.
+
+    The onset strength (or, for HLL, the tracks) is computed once per
+    file; see `minst.signal.sweep_onsets` and
+    `minst.signal.sweep_hll_onsets`.
+
+    Parameters
+    ----------
+    index : pd.DataFrame
+        With columns audio_file and onsets_file; rows without an
+        onsets_file are skipped.
+
+    mode : str
+        One of 'envelope', 'logcqt' or 'hll'.
+
+    window : float
+        Tolerance for `f_measure`, in seconds.
+
+    grid : dict
+        Peak picking (or, for HLL, post-processing) parameters, as a value
+        or a list of values.
+
+    Returns
+    -------
+    results : pd.DataFrame
+        One row per file and combination, indexed by the file's index, with
+        a column per parameter, and f_measure, precision and recall.
+    """
+    frames = []
+    for idx, row in index.iterrows():
+        if pd.isnull(row['onsets_file']):
+            continue
+        reference = read_onsets(row['onsets_file'])
+        if mode == 'hll':
+            sweep = S.sweep_hll_onsets(row['audio_file'], **grid)
+        else:
+            x, fs = S.AnalysisContext(row['audio_file']).signal
+            sweep = S.sweep_onsets(x, fs, mode, **grid)
+        scores = [f_measure(reference, onsets, window)
+                  for onsets in sweep.pop('onsets')]
+        sweep['f_measure'], sweep['precision'], sweep['recall'] = \
+            zip(*scores) if scores else ([], [], [])
+        sweep.index = [idx] * len(sweep)
+        frames.append(sweep)
+
+    params = S.HLL_PARAMS if mode == 'hll' else S.PEAK_PICK_PARAMS
+    columns = list(params) + ['f_measure', 'precision', 'recall']
+    if not frames:
+        return pd.DataFrame(columns=columns)
+    return pd.concat(frames)[columns]
+
+
+def summarize(results):
+    """Aggregate `benchmark_onsets` results by mode.
+
+    Returns
+    -------
+    summary : pd.DataFrame
+        Per mode: the number of files scored, mean f_measure, precision and
+        recall, total wall_time and cpu_time, and the largest peak_memory.
+    """
+    scored = results[results['error'].isnull()]
+    groups = scored.groupby('mode')
+    summary = groups[['f_measure', 'precision', 'recall']].mean()
+    summary.insert(0, 'n_files', groups.size())
+    summary['wall_time'] = groups['wall_time'].sum()
+    summary['cpu_time'] = groups['cpu_time'].sum()
+    summary['peak_memory'] = groups['peak_memory'].max()
+    return summary
@@ -0,0 +1,340 @@
+"""Persistent cache of decoded audio.
+
+Decoding (and resampling) a file through sox is often the slowest part of
+analyzing it, so decoded signals are kept on disk as float32 `.npy` files,
+which are memory-mapped when read back:
+
+    {CACHE_DIR}/
+        {key}.npy
+
+The key hashes the absolute path, modification time and size of the source
+file, along with the decode parameters, so edited files are decoded again.
+Entries are touched when read, and the least recently used are evicted once
+the cache grows past its size cap.
+
+The default location and cap may be set with the MINST_AUDIO_CACHE and
+MINST_AUDIO_CACHE_SIZE environment variables; set MINST_AUDIO_CACHE to an
+empty string to disable caching.
+
+Analysis tracks that are slow to compute, but cheap to post-process (e.g.
+HLL's pitch and amplitude), are kept likewise in a `TrackCache` under
+MINST_TRACK_CACHE (capped at MINST_TRACK_CACHE_SIZE); tracks on a regular
+time grid are stored as float32 values, without their time points.
+"""
+import claudio
+import glob
+import hashlib
+import json
+import logging
+import numpy as np
+import os
+
+logger = logging.getLogger(__name__)
+
+CACHE_DIR = os.environ.get(
+    'MINST_AUDIO_CACHE',
+    os.path.join(os.path.expanduser('~'), '.cache', 'minst', 'audio'))
+CACHE_SIZE = int(os.environ.get('MINST_AUDIO_CACHE_SIZE', 2 ** 32))
+TRACK_CACHE_DIR = os.environ.get(
+    'MINST_TRACK_CACHE',
+    os.path.join(os.path.expanduser('~'), '.cache', 'minst', 'tracks'))
+TRACK_CACHE_SIZE = int(os.environ.get('MINST_TRACK_CACHE_SIZE', 2 ** 30))
+VERSION = 1
+
+_INSTANCES = dict()
+
+
+class AudioCache(object):
+    """Decoded audio, stored as `.npy` files with LRU eviction.
+
+    Several processes may share a cache directory. Each keeps a running
+    total of the cache size, and takes it from disk again whenever it has
+    stored `1 / RESYNC` of the cap since the last time. With N processes
+    the cache can then overshoot its cap by about N / RESYNC of it, until
+    the next eviction.
+    """
+    RESYNC = 16
+
+    def __init__(self, cache_dir=None, max_bytes=None):
+        """
+        Parameters
+        ----------
+        cache_dir : str, or None
+            Directory of the cache, created as needed; by default,
+            `CACHE_DIR`.
+
+        max_bytes : int, or None
+            Size cap of the cache; by default, `CACHE_SIZE`.
+        """
+        self.cache_dir = CACHE_DIR if cache_dir is None else cache_dir
+        self.max_bytes = CACHE_SIZE if max_bytes is None else max_bytes
+        # Running size of the entries, seeded from disk on the first store,
+        # so most stores don't have to list the directory; `_unsynced` is
+        # what this process has stored since.
+        self._total = None
+        self._unsynced = 0
+
+    def key(self, filename, *params):
+        """Return the cache key of a file, processed with the given
+        (JSON serializable) parameters."""
+        stat = os.stat(filename)
+        params = [VERSION, os.path.abspath(filename), stat.st_mtime,
+                  stat.st_size] + list(params)
+        return hashlib.md5(json.dumps(params).encode('utf-8')).hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.cache_dir, "{}.npy".format(key))
+
+    def lookup(self, filename, samplerate=22050, channels=1, bytedepth=2,
+               mmap_mode='r'):
+        """Return a cached signal, or None if it isn't cached.
+
+        Returns
+        -------
+        x : np.ndarray, dtype=np.float32, shape=(n, channels), or None
+            Memory-mapped, unless `mmap_mode` is None.
+        """
+        return self._load(
+            self.key(filename, samplerate, channels, bytedepth), mmap_mode)
+
+    def _load(self, key, mmap_mode=None):
+        path = self.path(key)
+        try:
+            x = np.load(path, mmap_mode=mmap_mode)
+        except (IOError, OSError, ValueError):
+            return None
+        try:
+            os.utime(path, None)
+        except OSError:
+            pass
+        return x
+
+    def store(self, filename, x, samplerate=22050, channels=1, bytedepth=2):
+        """Add a decoded signal to the cache, evicting old entries to make
+        room; failures are logged, not raised.
+
+        Returns
+        -------
+        x : np.ndarray, dtype=np.float32
+            The signal, as cached.
+        """
+        x = np.asarray(x, dtype=np.float32)
+        self._save(self.key(filename, samplerate, channels, bytedepth), x,
+                   filename)
+        return x
+
+    def _save(self, key, x, filename):
+        if x.nbytes > self.max_bytes:
+            return
+        path = self.path(key)
+        tmp_path = "{}.{}.tmp".format(path, os.getpid())
+        try:
+            if not os.path.exists(self.cache_dir):
+                os.makedirs(self.cache_dir)
+            with open(tmp_path, 'wb') as fh:
+                np.save(fh, x)
+            size = os.path.getsize(tmp_path)
+            if (self._total is None or
+                    self._unsynced + size > self.max_bytes // self.RESYNC):
+                # Other processes may have stored entries meanwhile.
+                self._total, self._unsynced = self.size(), 0
+            if os.path.exists(path):
+                self._total -= os.path.getsize(path)
+            self._total += size
+            self._unsynced += size
+            os.rename(tmp_path, path)
+            if self._total > self.max_bytes:
+                self.evict()
+        except (IOError, OSError) as derp:
+            logger.warning("Failed to cache {}: {}".format(filename, derp))
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def read(self, filename, samplerate=22050, channels=1, bytedepth=2,
+             mmap_mode='r'):
+        """Read an audio file through the cache; see `claudio.read`.
+
+        Returns
+        -------
+        x : np.ndarray, dtype=np.float32, shape=(n, channels)
+            The decoded signal.
+
+        fs : scalar
+            Its samplerate.
+        """
+        x = self.lookup(filename, samplerate, channels, bytedepth, mmap_mode)
+        if x is None:
+            x, samplerate = claudio.read(filename, samplerate=samplerate,
+                                         channels=channels,
+                                         bytedepth=bytedepth)
+            x = self.store(filename, x, samplerate, channels, bytedepth)
+        return x, samplerate
+
+    def entries(self):
+        """Return the (path, size, last access) of every entry, least
+        recently used first."""
+        entries = []
+        for path in glob.glob(os.path.join(self.cache_dir, '*.npy')):
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((path, stat.st_size, stat.st_mtime))
+        return sorted(entries, key=lambda entry: entry[2])
+
+    def size(self):
+        """Total size of the entries, in bytes."""
+        return sum(entry[1] for entry in self.entries())
+
+    def evict(self, max_bytes=None):
+        """Remove the least recently used entries until the cache is no
+        larger than `max_bytes` (by default, its size cap)."""
+        max_bytes = self.max_bytes if max_bytes is None else max_bytes
+        entries = self.entries()
+        total = sum(entry[1] for entry in entries)
+        for path, size, _ in entries:
+            if total <= max_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+        self._total, self._unsynced = total, 0
+
+    def clear(self):
+        """Remove every entry."""
+        self.evict(0)
+
+
+class TrackCache(AudioCache):
+    """Analysis tracks of audio files (e.g. HLL's time points, frequencies
+    and amplitudes), stored as `.npy` files with LRU eviction.
+
+    Entries are keyed by file, as decoded audio is, and by a signature of
+    the analysis, e.g. a tracker's name and parameters.
+
+    When the time points (the first track) are on a regular grid, as for
+    frame-based trackers, only the other tracks are stored, as float32,
+    after one column holding the first time point and the rate of the grid;
+    the time points are rebuilt on read. Anything else is stored as is, in
+    float64.
+    """
+
+    def __init__(self, cache_dir=None, max_bytes=None):
+        """
+        Parameters
+        ----------
+        cache_dir : str, or None
+            Directory of the cache, created as needed; by default,
+            `TRACK_CACHE_DIR`.
+
+        max_bytes : int, or None
+            Size cap of the cache; by default, `TRACK_CACHE_SIZE`.
+        """
+        super(TrackCache, self).__init__(
+            TRACK_CACHE_DIR if cache_dir is None else cache_dir,
+            TRACK_CACHE_SIZE if max_bytes is None else max_bytes)
+
+    def lookup(self, filename, signature):
+        """Return the cached tracks of a file, or None if they aren't
+        cached.
+
+        Returns
+        -------
+        tracks : tuple of np.ndarray, or None
+            Equal length vectors, as stored.
+        """
+        tracks = self._load(self.key(filename, signature))
+        return None if tracks is None else _unpack_tracks(tracks)
+
+    def store(self, filename, signature, tracks):
+        """Add the tracks of a file to the cache; failures are logged, not
+        raised.
+
+        Returns
+        -------
+        tracks : tuple of np.ndarray
+            The tracks, as cached.
+        """
+        tracks = _pack_tracks(tracks)
+        self._save(self.key(filename, signature), tracks, filename)
+        return _unpack_tracks(tracks)
+
+    def read(self, filename, signature, func, *args, **kwargs):
+        """Return the cached tracks of a file, or compute and cache them
+        with `func(*args, **kwargs)`."""
+        tracks = self.lookup(filename, signature)
+        if tracks is None:
+            tracks = self.store(filename, signature, func(*args, **kwargs))
+        return tracks
+
+
+def _pack_tracks(tracks):
+    """Pack tracks for a `TrackCache` entry, dropping the time points (the
+    first track) if they're on a regular grid."""
+    tracks = np.vstack(tracks).astype(np.float64)
+    time_points, n_points = tracks[0], tracks.shape[1]
+    # The header column needs two rows.
+    if len(tracks) < 3 or n_points < 2 or time_points[-1] <= time_points[0]:
+        return tracks
+    t0 = np.float32(time_points[0])
+    rate = np.float32((n_points - 1) / (time_points[-1] - time_points[0]))
+    # Only drop time points that can be rebuilt to a thousandth of a step.
+    rebuilt = t0 + np.arange(n_points) / np.float64(rate)
+    if not np.allclose(rebuilt, time_points, rtol=0, atol=1e-3 / rate):
+        return tracks
+    packed = np.zeros((len(tracks) - 1, n_points + 1), dtype=np.float32)
+    packed[:2, 0] = t0, rate
+    packed[:, 1:] = tracks[1:]
+    return packed
+
+
+def _unpack_tracks(packed):
+    """Inverse of `_pack_tracks`."""
+    if packed.dtype != np.float32:
+        return tuple(packed)
+    t0, rate = np.float64(packed[0, 0]), np.float64(packed[1, 0])
+    time_points = t0 + np.arange(packed.shape[1] - 1) / rate
+    return (time_points,) + tuple(packed[:, 1:])
+
+
+def _shared(cls, cache_dir, max_bytes):
+    """Return one instance per class and location, so its running size is
+    shared by every read through the module functions."""
+    key = (cls, cache_dir, max_bytes)
+    if key not in _INSTANCES:
+        _INSTANCES[key] = cls(cache_dir, max_bytes)
+    return _INSTANCES[key]
+
+
+def default_cache():
+    """Return the cache at `CACHE_DIR`, or None if caching is disabled."""
+    return _shared(AudioCache, CACHE_DIR, CACHE_SIZE) if CACHE_DIR else None
+
+
+def read(filename, samplerate=22050, channels=1, bytedepth=2):
+    """Read an audio file through the default cache, if enabled; see
+    `AudioCache.read`."""
+    cache = default_cache()
+    if cache is None or samplerate is None:
+        return claudio.read(filename, samplerate=samplerate,
+                            channels=channels, bytedepth=bytedepth)
+    return cache.read(filename, samplerate, channels, bytedepth)
+
+
+def lookup(filename, samplerate=22050, channels=1, bytedepth=2):
+    """Return a signal from the default cache, or None; see
+    `AudioCache.lookup`."""
+    cache = default_cache()
+    if cache is None:
+        return None
+    return cache.lookup(filename, samplerate, channels, bytedepth)
+
+
+def default_track_cache():
+    """Return the track cache at `TRACK_CACHE_DIR`, or None if caching is
+    disabled."""
+    if not TRACK_CACHE_DIR:
+        return None
+    return _shared(TrackCache, TRACK_CACHE_DIR, TRACK_CACHE_SIZE)
@@ -0,0 +1,363 @@
+"""Binary, columnar on-disk format for index tables.
+
+An index is stored as a directory holding one `.npy` file per column, plus
+a small JSON manifest:
+
+    {path}/
+        manifest.json
+        index.codes.npy
+        index.categories.npy
+        {column}.npy                 # numeric / boolean columns
+        {column}.codes.npy           # everything else, as categoricals
+        {column}.categories.npy
+
+Numeric columns are written as-is; all other columns (strings, None, mixed)
+are stored as integer codes into a table of categories, with -1 for nulls.
+Every array can be memory-mapped, so opening an index only reads the
+manifest, and columns can be loaded selectively. Read with `categorical`,
+the columns (and the index) stay encoded as pandas categoricals, so only
+the categories are ever turned into python objects; `to_objects` decodes
+them when needed. `iter_arrays` goes one step further, and decodes the
+index a block of rows at a time.
+
+The `read_index` / `write_index` functions pick the format from the path:
+anything ending in `.csv` is read / written as CSV, everything else as a
+columnar directory.
+"""
+from collections import OrderedDict
+import json
+import numpy as np
+import os
+import pandas as pd
+import shutil
+
+FORMAT_VERSION = 1
+MANIFEST = 'manifest.json'
+INDEX = 'index'
+
+try:
+    STRING_TYPES = (basestring,)
+except NameError:
+    STRING_TYPES = (str,)
+
+
+def _native(value):
+    """Unbox numpy scalars to the equivalent python builtin."""
+    return value.item() if isinstance(value, np.generic) else value
+
+
+def _is_csv(path):
+    return path.lower().endswith('.csv')
+
+
+def _encode(values):
+    """Encode a column as a dict of arrays and its manifest entry.
+
+    Parameters
+    ----------
+    values : array_like or pd.Categorical
+        Column to encode.
+
+    Returns
+    -------
+    arrays : dict
+        Suffix -> np.ndarray to write.
+
+    spec : dict
+        Manifest entry (minus the column name).
+    """
+    if isinstance(values, pd.Series) and str(values.dtype) == 'category':
+        values = values.values
+
+    if isinstance(values, pd.Categorical):
+        codes, uniques = values.codes, np.asarray(values.categories)
+    else:
+        array = np.asarray(values)
+        if array.dtype.kind in 'biuf':
+            return {'': array}, dict(kind='array')
+        codes, uniques = pd.factorize(array)
+
+    spec = dict(kind='categorical')
+    arrays = {'.codes': np.asarray(codes, dtype=np.int32)}
+    uniques = [_native(x) for x in uniques]
+    categories = np.asarray(uniques)
+    homogeneous = categories.dtype.kind in 'biuf' or (
+        categories.dtype.kind == 'U' and
+        all(isinstance(x, STRING_TYPES) for x in uniques))
+    if len(uniques) and homogeneous:
+        arrays['.categories'] = categories
+    else:
+        # Mixed or exotic types; keep them in the manifest instead.
+        spec['categories'] = uniques
+    return arrays, spec
+
+
+def _load(path, name, suffix, mmap_mode):
+    filename = os.path.join(path, "{}{}.npy".format(name, suffix))
+    return np.load(filename, mmap_mode=mmap_mode)
+
+
+def _open(path, name, spec, mmap_mode='r'):
+    """Open a column without decoding it.
+
+    Returns
+    -------
+    values : np.ndarray
+        The (memory-mapped) array for numeric columns, else the codes.
+
+    categories : array_like, or None
+        The categories, for categorical columns.
+    """
+    if spec['kind'] == 'array':
+        return _load(path, name, '', mmap_mode), None
+
+    codes = _load(path, name, '.codes', mmap_mode)
+    if 'categories' in spec:
+        categories = spec['categories']
+    else:
+        categories = _load(path, name, '.categories', mmap_mode)
+    return codes, categories
+
+
+def _lookup(categories):
+    """Object array of categories, plus a null so that code -1 is None."""
+    lookup = np.empty(len(categories) + 1, dtype=object)
+    lookup[:-1] = [_native(x) for x in categories]
+    lookup[-1] = None
+    return lookup
+
+
+def to_objects(values):
+    """Decode a pd.Categorical to an object array, with None for nulls;
+    anything else is returned as-is."""
+    if isinstance(values, pd.Categorical):
+        return _lookup(values.categories)[values.codes]
+    return values
+
+
+def _decode(path, name, spec, mmap_mode='r', categorical=False):
+    """Load a column from disk.
+
+    Returns
+    -------
+    column : np.ndarray or pd.Categorical
+        Numeric columns as (memory-mapped) arrays; categoricals as a
+        pd.Categorical if `categorical`, else as an object array with None
+        for nulls.
+    """
+    values, categories = _open(path, name, spec, mmap_mode)
+    if categories is None:
+        return values
+    if categorical:
+        return pd.Categorical.from_codes(values, categories)
+    return _lookup(categories)[values]
+
+
+def write_arrays(path, index, columns):
+    """Write an index and its columns as a columnar directory.
+
+    The directory is written alongside and then moved into place, so a
+    reader never sees a partially written index.
+
+    Parameters
+    ----------
+    path : str
+        Output directory; replaced if it exists.
+
+    index : array_like
+        Row labels.
+
+    columns : OrderedDict
+        Column name -> array_like, all the same length as `index`.
+
+    Returns
+    -------
+    success : bool
+        True if the output exists.
+    """
+    tmp_path = path.rstrip(os.sep) + '.tmp'
+    if os.path.exists(tmp_path):
+        shutil.rmtree(tmp_path)
+    os.makedirs(tmp_path)
+
+    manifest = dict(version=FORMAT_VERSION, length=len(index), columns=[])
+    for name, values in [(INDEX, index)] + list(columns.items()):
+        if len(values) != len(index):
+            raise ValueError("Column '{}' has {} rows; expected {}".format(
+                name, len(values), len(index)))
+        arrays, spec = _encode(values)
+        for suffix, array in arrays.items():
+            np.save(os.path.join(tmp_path, "{}{}.npy".format(name, suffix)),
+                    array)
+        spec['name'] = name
+        manifest['columns'].append(spec)
+
+    with open(os.path.join(tmp_path, MANIFEST), 'w') as fh:
+        json.dump(manifest, fh, indent=2)
+
+    if os.path.exists(path):
+        shutil.rmtree(path)
+    os.rename(tmp_path, path)
+    return os.path.exists(path)
+
+
+def read_manifest(path):
+    """Return the manifest of a columnar directory."""
+    with open(os.path.join(path, MANIFEST), 'r') as fh:
+        manifest = json.load(fh)
+    if manifest.get('version') != FORMAT_VERSION:
+        raise ValueError("Unsupported columnar index version: {}".format(
+            manifest.get('version')))
+    return manifest
+
+
+def read_arrays(path, columns=None, mmap_mode='r', categorical=False):
+    """Read the index and (a subset of) the columns of a columnar directory.
+
+    Parameters
+    ----------
+    path : str
+        Columnar directory, as written by `write_arrays`.
+
+    columns : list of str, or None
+        Columns to load; by default, all of them.
+
+    mmap_mode : str or None, default='r'
+        Memory-map mode for the arrays; see `np.load`.
+
+    categorical : bool, default=False
+        If True, return the index and categorical columns as
+        pd.Categorical, without decoding them.
+
+    Returns
+    -------
+    index : np.ndarray, dtype=object, or pd.Categorical
+        Row labels.
+
+    data : OrderedDict
+        Column name -> array.
+    """
+    specs = _select(path, columns)
+    index = _decode(path, INDEX, specs.pop(INDEX), mmap_mode, categorical)
+    if not categorical:
+        index = np.asarray(index, dtype=object)
+    data = OrderedDict()
+    for name, spec in specs.items():
+        data[name] = _decode(path, name, spec, mmap_mode, categorical)
+    return index, data
+
+
+def _select(path, columns=None):
+    """Return the manifest entries for the index and the given columns."""
+    manifest = read_manifest(path)
+    specs = OrderedDict((x['name'], x) for x in manifest['columns'])
+    if columns is not None:
+        missing = set(columns) - set(specs) - set([INDEX])
+        if missing:
+            raise KeyError("Columns not in {}: {}".format(
+                path, sorted(missing)))
+        specs = OrderedDict([(INDEX, specs[INDEX])] +
+                            [(name, specs[name]) for name in columns])
+    return specs
+
+
+def iter_arrays(path, rows, columns=None, mmap_mode='r'):
+    """Iterate over a columnar directory in blocks of rows.
+
+    Only one block is decoded at a time, so memory use is bounded by
+    `rows` rather than by the size of the index.
+
+    Parameters
+    ----------
+    path : str
+        Columnar directory, as written by `write_arrays`.
+
+    rows : int
+        Maximum number of rows per block.
+
+    columns : list of str, or None
+        Columns to load; by default, all of them.
+
+    mmap_mode : str or None, default='r'
+        Memory-map mode for the arrays; see `np.load`.
+
+    Yields
+    ------
+    index : np.ndarray, dtype=object
+        Row labels of the block.
+
+    data : OrderedDict
+        Column name -> array, for the block.
+    """
+    if rows < 1:
+        raise ValueError("rows must be positive; got {}".format(rows))
+    opened = OrderedDict()
+    for name, spec in _select(path, columns).items():
+        values, categories = _open(path, name, spec, mmap_mode)
+        lookup = None if categories is None else _lookup(categories)
+        opened[name] = (values, lookup)
+
+    length = len(opened[INDEX][0])
+    for start in range(0, length, rows):
+        block = OrderedDict()
+        for name, (values, lookup) in opened.items():
+            values = values[start:start + rows]
+            block[name] = values if lookup is None else lookup[values]
+        index = np.asarray(block.pop(INDEX), dtype=object)
+        yield index, block
+
+
+def write_dataframe(dframe, path):
+    """Write a dataframe as a columnar directory; see `write_arrays`."""
+    columns = OrderedDict()
+    for name in dframe.columns:
+        columns[name] = dframe[name]
+    return write_arrays(path, np.asarray(dframe.index, dtype=object),
+                        columns)
+
+
+def read_dataframe(path, columns=None, mmap_mode='r'):
+    """Read a columnar directory as a dataframe.
+
+    Numeric columns keep their dtype, and the rest come back as pandas
+    categoricals.
+    """
+    index, data = read_arrays(path, columns, mmap_mode, categorical=True)
+    names = list(data.keys())
+    index = np.asarray(to_objects(index), dtype=object)
+    return pd.DataFrame(data, index=index, columns=names)
+
+
+def read_index(path, columns=None):
+    """Read an index table, as CSV or columnar depending on `path`.
+
+    Parameters
+    ----------
+    path : str
+        A `.csv` file, or a columnar directory.
+
+    columns : list of str, or None
+        Columns to load; by default, all of them.
+
+    Returns
+    -------
+    dframe : pd.DataFrame
+    """
+    if _is_csv(path):
+        dframe = pd.read_csv(path, index_col=0)
+        return dframe if columns is None else dframe[list(columns)]
+    return read_dataframe(path, columns)
+
+
+def write_index(dframe, path):
+    """Write an index table, as CSV or columnar depending on `path`.
+
+    Returns
+    -------
+    success : bool
+        True if the output exists.
+    """
+    if _is_csv(path):
+        dframe.to_csv(path)
+        return os.path.exists(path)
+    return write_dataframe(dframe, path)
@@ -1,15 +1,583 @@
+"""Harmonic-locked loop (HLL) pitch and amplitude tracking.
+
+Tracking is done by a backend, chosen by name:
+
+    binary
+        The external `hll_mono` tracker (see `BIN` and `PARAMS`), run on a
+        temporary 44.1kHz WAV file and read back from CSV.
+
+    numpy
+        An in-process approximation, working directly on the decoded
+        signal, with one point per analysis frame rather than per sample;
+        see `NumpyTracker`.
+
+The default backend is `BACKEND`, which may be set with the
+MINST_HLL_BACKEND environment variable. To track many (short) files, a
+`TrackerPool` spreads them over long-lived worker processes, which decode
+and track in parallel. `hll_mono` only reads and writes files, one per
+run, so with the binary backend each file still starts one `hll_mono`
+process and goes through a temporary WAV and CSV file.
+
+Tracks are cached per file and tracker (see `minst.cache.TrackCache`), so
+re-tuning the onset post-processing doesn't track anything again.
+"""
+import claudio
 import claudio.sox
 import claudio.util
+import multiprocessing
 import numpy as np
 import os
 import pandas as pd
+import shutil
 import subprocess
+import tempfile
+import uuid
+import wave
+
+import minst.cache as cache
 
 BIN = os.path.expanduser('~/hll/hll_mono')
 PARAMS = os.path.expanduser('~/hll/HLL_MONO_PARAMS.csv')
+BACKEND = os.environ.get('MINST_HLL_BACKEND', 'binary')
+
+
+def write_pcm(filename, x, fs):
+    """Write a mono signal in [-1, 1] as a 16-bit WAV file."""
+    pcm = np.clip(np.asarray(x, dtype=np.float64).ravel() * 32768,
+                  -32768, 32767).astype('<i2')
+    writer = wave.open(filename, 'wb')
+    try:
+        writer.setnchannels(1)
+        writer.setsampwidth(2)
+        writer.setframerate(int(fs))
+        writer.writeframes(pcm.tobytes())
+    finally:
+        writer.close()
+
+
+class Tracker(object):
+    """Base class for HLL tracker backends.
+
+    Subclasses implement `track`, and may override `track_file` to read
+    files some other way (clearing `IN_PROCESS`).
+    """
+    SAMPLERATE = 44100
+    IN_PROCESS = True
+    # Attributes that don't change the tracks, so not in their signature.
+    VOLATILE = ()
+
+    def signature(self):
+        """Name and parameters of the tracker, keying its cached tracks."""
+        params = sorted((key, value) for key, value in vars(self).items()
+                        if key not in self.VOLATILE)
+        return [self.__class__.__name__, params]
+
+    def track(self, x, fs):
+        """Track a decoded signal.
+
+        Parameters
+        ----------
+        x : np.ndarray
+            Mono audio signal.
+
+        fs : scalar
+            Samplerate of the signal.
+
+        Returns
+        -------
+        time_points, frequencies, amplitudes : np.ndarray, len=n
+            Time (in seconds), frequency (in Hz), and amplitude vectors of
+            the analysis; both are zero where nothing is tracked.
+        """
+        raise NotImplementedError("Subclasses must implement track()")
+
+    def track_file(self, filename):
+        """Track an audio file, decoded at `SAMPLERATE`; see `track`."""
+        x, fs = cache.read(filename, samplerate=self.SAMPLERATE, channels=1,
+                           bytedepth=2)
+        return self.track(x, fs)
+
+
+class BinaryTracker(Tracker):
+    """The external `hll_mono` binary."""
+    IN_PROCESS = False
+    VOLATILE = ('tmp_dir',)
+
+    def __init__(self, binary=None, params=None, tmp_dir=None):
+        """
+        Parameters
+        ----------
+        binary, params : str, or None
+            Paths to the tracker and its parameters; by default, `BIN` and
+            `PARAMS`.
+
+        tmp_dir : str, or None
+            Directory for the intermediate files; by default, the system's.
+        """
+        self.binary = BIN if binary is None else binary
+        self.params = PARAMS if params is None else params
+        self.tmp_dir = tmp_dir
+
+    def signature(self):
+        """Name and parameters of the tracker, with the modification time
+        and size of the binary and its parameters file, so rebuilding or
+        re-tuning either doesn't serve stale cached tracks."""
+        signature = super(BinaryTracker, self).signature()
+        for path in (self.binary, self.params):
+            try:
+                stat = os.stat(path)
+                signature.append([stat.st_mtime, stat.st_size])
+            except OSError:
+                signature.append(None)
+        return signature
+
+    def _temp_file(self, ext):
+        if self.tmp_dir is None:
+            return claudio.util.temp_file(ext)
+        return os.path.join(self.tmp_dir, uuid.uuid4().hex + ext)
+
+    def _run(self, wav_file):
+        deps = (self.binary, self.params)
+        if not all([os.path.exists(x) for x in deps]):
+            raise EnvironmentError(
+                "Requires the following files: {}".format(deps))
+        output_file = self._temp_file('.csv')
+        try:
+            if os.path.exists(output_file):
+                os.remove(output_file)
+            args = [self.binary, wav_file, output_file, self.params]
+            subprocess.check_output(args)
+            (time_points, freqs,
+                amps) = np.asarray(pd.read_csv(output_file, header=0)).T
+        finally:
+            if os.path.exists(output_file):
+                os.remove(output_file)
+
+        time_points = time_points / float(self.SAMPLERATE)
+        null_idx = amps > 0.999
+        freqs[null_idx] = 0
+        amps[null_idx] = 0
+        return time_points, np.abs(freqs), np.abs(amps)
+
+    def track(self, x, fs):
+        """Track a decoded signal; signals at `SAMPLERATE` are written
+        straight to 16-bit PCM, others are resampled with sox."""
+        wav_file = self._temp_file('.wav')
+        input_file = self._temp_file('.wav')
+        try:
+            if fs == self.SAMPLERATE:
+                write_pcm(wav_file, x, fs)
+            else:
+                claudio.write(input_file, np.asarray(x).ravel(),
+                              samplerate=fs)
+                claudio.sox.convert(input_file, wav_file,
+                                    samplerate=self.SAMPLERATE, channels=1,
+                                    bytedepth=2)
+            return self._run(wav_file)
+        finally:
+            for fname in (wav_file, input_file):
+                if os.path.exists(fname):
+                    os.remove(fname)
+
+    def track_file(self, filename):
+        wav_file = self._temp_file('.wav')
+        try:
+            claudio.sox.convert(filename, wav_file,
+                                samplerate=self.SAMPLERATE, channels=1,
+                                bytedepth=2)
+            return self._run(wav_file)
+        finally:
+            if os.path.exists(wav_file):
+                os.remove(wav_file)
+
+
+class NumpyTracker(Tracker):
+    """In-process, vectorized pitch and amplitude tracker.
+
+    For every frame, the period is taken from the first strong peak of the
+    normalized autocorrelation (refined by parabolic interpolation), and
+    the amplitude from demodulating the first few harmonics at that pitch.
+    Frames with a weak periodicity are left untracked.
+
+    This approximates the outputs of the binary rather than reproducing
+    them. It runs on the same decoded signal as the other analyses, with
+    frames every `hop_length` samples, and amplitudes in the same units as
+    the binary's (that of the fundamental, full scale being 1). By default
+    there is one point per frame, `hop_length` times fewer than the
+    binary's one per sample at 44.1kHz; `minst.signal.hll_track_onsets`
+    holds such tracks onto the binary's grid (see `hold_tracks`), so its
+    post-processing means the same for both.
+    """
+    SAMPLERATE = 22050
+    VOLATILE = ('block_frames',)
+
+    def __init__(self, hop_length=128, frame_length=2048, fmin=27.5,
+                 fmax=2000.0, n_harmonics=1, min_clarity=0.5,
+                 block_frames=256, output_rate=None):
+        """
+        Parameters
+        ----------
+        hop_length, frame_length : int
+            Hop and analysis window, in samples.
+
+        fmin, fmax : float
+            Range of tracked pitches, in Hz.
+
+        n_harmonics : int
+            Number of harmonics (below Nyquist) in the amplitude; by
+            default, only the fundamental, as tracked by the binary.
+
+        min_clarity : float
+            Smallest normalized autocorrelation of a tracked frame.
+
+        block_frames : int
+            Number of frames to analyze at a time.
+
+        output_rate : int, or None
+            Rate of the returned tracks, in points per second, if held onto
+            a finer grid; see `hold_tracks`. By default, one point per
+            analysis frame.
+        """
+        self.hop_length, self.frame_length = hop_length, frame_length
+        self.fmin, self.fmax = fmin, fmax
+        self.n_harmonics = n_harmonics
+        self.min_clarity = min_clarity
+        self.block_frames = block_frames
+        self.output_rate = output_rate
+
+    def _track_frames(self, frames, fs, window):
+        n_fft = 2 * self.frame_length
+        lag_min = max(int(np.floor(fs / self.fmax)), 2)
+        lag_max = min(int(np.ceil(fs / self.fmin)), self.frame_length // 2)
+
+        frames = frames - frames.mean(axis=1, keepdims=True)
+        frames_w = frames * window
+        acf = np.fft.irfft(np.abs(np.fft.rfft(frames_w, n_fft)) ** 2,
+                           n_fft)[:, :lag_max + 2]
+        # Unbias by the autocorrelation of the window.
+        w_acf = np.fft.irfft(np.abs(np.fft.rfft(window, n_fft)) ** 2,
+                             n_fft)[:lag_max + 2]
+        energy = acf[:, :1]
+        acf = acf / np.maximum(energy, np.finfo(float).tiny) / \
+            (w_acf / w_acf[0])
+
+        # First local maximum within 90% of the strongest, to avoid
+        # locking on to subharmonics.
+        r = acf[:, lag_min - 1:lag_max + 2]
+        peaks = (r[:, 1:-1] >= r[:, :-2]) & (r[:, 1:-1] >= r[:, 2:])
+        r_max = np.max(np.where(peaks, r[:, 1:-1], -np.inf), axis=1)
+        peaks &= r[:, 1:-1] >= 0.9 * r_max[:, np.newaxis]
+        idx = np.argmax(peaks, axis=1)
+        rows = np.arange(len(r))
+        left, center, right = r[rows, idx], r[rows, idx + 1], r[rows, idx + 2]
+        denom = left - 2 * center + right
+        offset = np.where(denom < 0, 0.5 * (left - right) /
+                          np.where(denom < 0, denom, -1), 0)
+        lag = lag_min + idx + offset
+        clarity = center
+        voiced = peaks.any(axis=1) & (clarity >= self.min_clarity) & \
+            (energy[:, 0] > 0)
+
+        freqs = np.where(voiced, fs / lag, 0.0)
+        n = np.arange(self.frame_length) - self.frame_length // 2
+        amps_sq = np.zeros(len(frames))
+        for k in range(1, self.n_harmonics + 1):
+            f_k = k * freqs
+            phasors = np.exp(-2j * np.pi * np.outer(f_k / fs, n))
+            z_k = (frames_w * phasors).sum(axis=1)
+            amps_sq += np.where(f_k < fs / 2.0, np.abs(z_k) ** 2, 0)
+        amps = np.where(voiced, 2 * np.sqrt(amps_sq) / window.sum(), 0.0)
+        return freqs, amps
+
+    def track(self, x, fs):
+        x = np.asarray(x, dtype=np.float64).ravel()
+        hop, length = self.hop_length, self.frame_length
+        n_frames = 1 + len(x) // hop
+        x_pad = np.pad(x, (length // 2, length), mode='constant')
+        window = np.hanning(length)
+
+        freqs = np.zeros(n_frames)
+        amps = np.zeros(n_frames)
+        for t0 in range(0, n_frames, self.block_frames):
+            t1 = min(t0 + self.block_frames, n_frames)
+            frames = np.lib.stride_tricks.as_strided(
+                x_pad[t0 * hop:], shape=(t1 - t0, length),
+                strides=(hop * x_pad.strides[0], x_pad.strides[0]))
+            freqs[t0:t1], amps[t0:t1] = self._track_frames(frames, fs,
+                                                           window)
+        time_points = np.arange(n_frames) * hop / float(fs)
+        if self.output_rate is None:
+            return time_points, freqs, amps
+        return hold_tracks(
+            time_points, freqs, amps, self.output_rate,
+            n_points=int(round(len(x) * self.output_rate / float(fs))))
+
 
+def hold_tracks(time_points, freqs, amps, rate, n_points=None):
+    """Resample tracks onto a grid of `rate` points per second, holding
+    each point over the grid points nearest to it.
 
-def hll(filename):
+    Parameters
+    ----------
+    time_points, freqs, amps : np.ndarray
+        Tracks, in increasing time order.
+
+    rate : int
+        Points per second of the output.
+
+    n_points : int, or None
+        Length of the output; by default, up to the last time point.
+
+    Returns
+    -------
+    time_points, freqs, amps : np.ndarray
+        The held tracks.
+    """
+    time_points = np.asarray(time_points, dtype=np.float64)
+    if n_points is None:
+        n_points = (int(np.floor(time_points[-1] * rate)) + 1
+                    if len(time_points) else 0)
+    grid = np.arange(n_points) / float(rate)
+    idx = np.searchsorted((time_points[1:] + time_points[:-1]) / 2.0, grid)
+    return grid, np.asarray(freqs)[idx], np.asarray(amps)[idx]
+
+
+TRACKERS = {
+    'binary': BinaryTracker,
+    'numpy': NumpyTracker
+}
+
+
+def get_tracker(backend=None):
+    """Return a tracker, by backend name (default, `BACKEND`) or as is."""
+    if isinstance(backend, Tracker):
+        return backend
+    backend = BACKEND if backend is None else backend
+    if backend not in TRACKERS:
+        raise ValueError("Unknown HLL backend '{}'; expected one of {}"
+                         "".format(backend, sorted(TRACKERS)))
+    return TRACKERS[backend]()
+
+
+def _serve(conn, tracker, tmp_dir):
+    """Worker loop of a `TrackerPool`.
+
+    Receives jobs, either ('file', filename) or ('signal', fs) followed by
+    float32 PCM, answered with ('tracks', shape) and then their float64
+    bytes, or ('call', (func, args)), answered with ('result', value); or
+    with an exception.
+    """
+    if isinstance(tracker, BinaryTracker):
+        tracker.tmp_dir = tmp_dir
+    while True:
+        job = conn.recv()
+        if job is None:
+            break
+        kind, arg = job
+        try:
+            if kind == 'call':
+                func, args = arg
+                result = func(tracker, *args)
+            elif kind == 'signal':
+                x = np.frombuffer(conn.recv_bytes(), dtype=np.float32)
+                tracks = tracker.track(x, arg)
+            else:
+                tracks = tracker.track_file(arg)
+            if kind != 'call':
+                tracks = np.vstack(tracks).astype(np.float64)
+        except Exception as derp:
+            conn.send(derp)
+            continue
+        if kind == 'call':
+            conn.send(('result', result))
+            continue
+        conn.send(('tracks', tracks.shape))
+        conn.send_bytes(tracks.tobytes())
+    conn.close()
+
+
+class TrackerPool(object):
+    """Long-lived tracker processes, fed audio over pipes.
+
+    Each worker keeps one tracker for its lifetime. Files are decoded by
+    the workers (through `minst.cache`, for in-process trackers), so
+    decoding runs in parallel too; already decoded signals are sent as
+    float32 PCM. Tracks come back as float64 arrays, as raw bytes. Work
+    that consumes the tracks can run in the workers too, with `map`.
+
+    In-process trackers pay no process startup per file. The binary
+    backend, however, can only run `hll_mono` once per file, on a
+    temporary WAV file, and parse its CSV output; the pool runs those in
+    parallel, and keeps each worker's temporary files in a directory of
+    its own, all of which are removed on `close`.
+
+    Example
+    -------
+    >>> with TrackerPool(4, backend='binary') as pool:
+    ...     for time_points, freqs, amps in pool.track_files(filenames):
+    ...         ...
+    """
+
+    def __init__(self, n_workers=None, backend=None):
+        """
+        Parameters
+        ----------
+        n_workers : int, or None
+            Number of processes; by default, one per CPU.
+
+        backend : str, Tracker, or None
+            Tracker to run in each worker; see `get_tracker`.
+        """
+        n_workers = n_workers or multiprocessing.cpu_count()
+        self.tracker = get_tracker(backend)
+        self.tmp_dir = tempfile.mkdtemp(prefix='hll_pool_')
+        self._workers = []
+        for n in range(n_workers):
+            worker_dir = os.path.join(self.tmp_dir, str(n))
+            os.makedirs(worker_dir)
+            conn, worker_conn = multiprocessing.Pipe()
+            process = multiprocessing.Process(
+                target=_serve, args=(worker_conn, self.tracker, worker_dir))
+            process.daemon = True
+            process.start()
+            worker_conn.close()
+            self._workers.append((process, conn))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __len__(self):
+        return len(self._workers)
+
+    def _send(self, worker, job):
+        conn = self._workers[worker][1]
+        if job[0] == 'signal':
+            _, x, fs = job
+            conn.send(('signal', fs))
+            conn.send_bytes(np.asarray(x, dtype=np.float32).ravel().tobytes())
+        else:
+            conn.send(job)
+
+    def _receive(self, worker):
+        conn = self._workers[worker][1]
+        reply = conn.recv()
+        if isinstance(reply, Exception):
+            raise reply
+        kind, value = reply
+        if kind == 'result':
+            return value
+        tracks = np.frombuffer(conn.recv_bytes(), dtype=np.float64)
+        return tuple(tracks.reshape(value))
+
+    def _map(self, jobs):
+        """Run jobs on the workers, one in flight per worker, yielding
+        their tracks in order."""
+        if not self._workers:
+            raise ValueError("The pool is closed")
+        results, busy, next_job = dict(), dict(), 0
+        try:
+            for job, args in enumerate(jobs):
+                worker = job % len(self._workers)
+                if worker in busy:
+                    done = busy.pop(worker)
+                    results[done] = self._receive(worker)
+                self._send(worker, args)
+                busy[worker] = job
+                while next_job in results:
+                    yield results.pop(next_job)
+                    next_job += 1
+
+            while busy:
+                worker = min(busy, key=busy.get)
+                done = busy.pop(worker)
+                results[done] = self._receive(worker)
+                while next_job in results:
+                    yield results.pop(next_job)
+                    next_job += 1
+        finally:
+            # Keep the pipes in step if we stopped early, or on an error.
+            for worker in busy:
+                try:
+                    self._receive(worker)
+                except Exception:
+                    pass
+
+    def track_many(self, signals):
+        """Track decoded signals, spread over the workers.
+
+        Parameters
+        ----------
+        signals : iterable of (x, fs)
+            Decoded mono signals; consumed lazily.
+
+        Yields
+        ------
+        time_points, frequencies, amplitudes : np.ndarray
+            For each signal, in order; see `Tracker.track`.
+        """
+        return self._map(('signal', x, fs) for x, fs in signals)
+
+    def track_files(self, filenames):
+        """Track audio files, decoded by the workers; see `track_many`.
+
+        Tracks already in the track cache are read from there, and the
+        others are added to it.
+        """
+        filenames = list(filenames)
+        track_cache = cache.default_track_cache()
+        signature = self.tracker.signature()
+        cached = [track_cache and track_cache.lookup(filename, signature)
+                  for filename in filenames]
+        computed = self._map(('file', filename) for filename, tracks
+                             in zip(filenames, cached) if tracks is None)
+
+        for filename, tracks in zip(filenames, cached):
+            if tracks is None:
+                tracks = next(computed)
+                if track_cache is not None:
+                    tracks = track_cache.store(filename, signature, tracks)
+            yield tracks
+
+    def map(self, func, *iterables):
+        """Call a function in the workers, with their trackers.
+
+        Parameters
+        ----------
+        func : callable
+            Called as `func(tracker, *args)`; it, its arguments and its
+            results must be picklable, e.g. a module-level function.
+
+        iterables : iterables
+            Arguments of each call, zipped as by the builtin `map`;
+            consumed lazily.
+
+        Yields
+        ------
+        result : object
+            Return value of each call, in order.
+        """
+        return self._map(('call', (func, args)) for args in zip(*iterables))
+
+    def close(self):
+        """Stop the workers and remove their intermediate files."""
+        for process, conn in self._workers:
+            try:
+                conn.send(None)
+            except (IOError, OSError):
+                pass
+            conn.close()
+        for process, conn in self._workers:
+            process.join(5)
+            if process.is_alive():
+                process.terminate()
+        self._workers = []
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+
+def hll(filename, backend=None):
     """Perform HLL-tracking over an audio file.
 
     Parameters
@@ -17,30 +585,18 @@ def hll(filename):
     filename : str
         Audio file to process.
 
+    backend : str, Tracker, or None
+        Tracker to use; see `get_tracker`.
+
     Returns
     -------
     time_points, frequencies, amplitudes : np.ndarray, len=n
-        Time, frequency, and amplitude vectors of the analysis.
+        Time, frequency, and amplitude vectors of the analysis; read from
+        the track cache (see `minst.cache.TrackCache`), if enabled.
     """
-    deps = (BIN, PARAMS)
-    if not all([os.path.exists(x) for x in deps]):
-        raise EnvironmentError(
-            "Requires the following files: {}".format(deps))
-    samplerate = 44100.0
-    tempfile = claudio.util.temp_file('.wav')
-    output_file = claudio.util.temp_file('.csv')
-    claudio.sox.convert(filename, tempfile,
-                        samplerate=samplerate, channels=1,
-                        bytedepth=2)
-    if os.path.exists(output_file):
-        os.remove(output_file)
-    args = [BIN, tempfile, output_file, PARAMS]
-    subprocess.check_output(args)
-
-    (time_points, freqs,
-        amps) = np.asarray(pd.read_csv(output_file, header=0)).T
-    time_points = time_points / samplerate
-    null_idx = amps > 0.999
-    freqs[null_idx] = 0
-    amps[null_idx] = 0
-    return time_points, np.abs(freqs), np.abs(amps)
+    tracker = get_tracker(backend)
+    track_cache = cache.default_track_cache()
+    if track_cache is None:
+        return tracker.track_file(filename)
+    return track_cache.read(filename, tracker.signature(),
+                            tracker.track_file, filename)
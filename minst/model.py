@@ -1,27 +1,47 @@
-import copy
+from collections import OrderedDict
+import hashlib
 import json
 import jsonschema
 import logging
+import numbers
+import operator
+import numpy as np
 import pandas as pd
 import os
-from sklearn.cross_validation import train_test_split
+from sklearn.utils import check_random_state
 
+import minst.columnar as columnar
 import minst.utils as utils
 
 logger = logging.getLogger(__name__)
 
+try:
+    STRING_TYPES = (basestring,)
+except NameError:
+    STRING_TYPES = (str,)
+
 
 class MissingDataException(Exception):
     pass
 
 
 class Observation(object):
-    """Document model each item in the collection."""
+    """Document model each item in the collection.
+
+    Fields live in `__slots__` rather than a per-instance `__dict__`.
+    """
+    __slots__ = ('index', 'dataset', 'audio_file', 'instrument',
+                 'source_index', 'start_time', 'duration', 'note_number',
+                 'dynamic', 'partition')
 
     # This should use package resources :o(
     SCHEMA_PATH = os.path.join(os.path.dirname(__file__), 'schema',
                                'observation.json')
     SCHEMA = json.load(open(SCHEMA_PATH))
+    VALIDATOR = jsonschema.validators.validator_for(SCHEMA)(SCHEMA)
+
+    FIELDS = __slots__
+    DEFAULTS = dict(note_number=None, dynamic='', partition='')
 
     def __init__(self, index, dataset, audio_file, instrument, source_index,
                  start_time, duration, note_number=None, dynamic='',
@@ -68,12 +88,44 @@ class Observation(object):
         self.partition = partition
 
     def to_builtin(self):
-        return self.__dict__.copy()
+        return dict(zip(self.FIELDS, _field_getter(self)))
 
     @classmethod
     def from_series(cls, series):
         """Convert a pd.Series to an Observation."""
-        return cls(index=series.name, **series.to_dict())
+        return cls(index=series.name,
+                   **dict(zip(series.index, series.tolist())))
+
+    @classmethod
+    def from_arrays(cls, index, **columns):
+        """Build many observations at once from aligned arrays.
+
+        Parameters
+        ----------
+        index : array_like
+            Observation indexes.
+
+        **columns : array_like
+            One array per remaining field; optional fields may be omitted.
+
+        Returns
+        -------
+        observations : list of Observation
+        """
+        unknown = set(columns) - set(cls.FIELDS[1:])
+        if unknown:
+            raise TypeError("Unexpected observation fields: {}"
+                            "".format(sorted(unknown)))
+        index = _tolist(index)
+        values = [_tolist(columns[k]) if k in columns
+                  else [cls.DEFAULTS[k]] * len(index)
+                  for k in cls.FIELDS[1:]]
+        return [cls(*row) for row in zip(index, *values)]
+
+    @classmethod
+    def from_records(cls, records):
+        """Build many observations at once from a list of dicts."""
+        return [cls(**rec) for rec in records]
 
     def to_series(self):
         """Convert to a flat series (ie make features a column)
@@ -87,18 +139,22 @@ class Observation(object):
         return pd.Series(data=flat_dict, name=name)
 
     def to_dict(self):
-        return self.__dict__.copy()
+        return dict(zip(self.FIELDS, _field_getter(self)))
 
     def __getitem__(self, key):
-        return self.__dict__[key]
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key)
 
     def validate(self, schema=None, verbose=False, check_files=True):
         """Returns True if valid.
         """
-        schema = self.SCHEMA if schema is None else schema
+        validator = (self.VALIDATOR if schema is None else
+                     jsonschema.validators.validator_for(schema)(schema))
         success = True
         try:
-            jsonschema.validate(self.to_builtin(), schema)
+            validator.validate(self.to_builtin())
         except jsonschema.ValidationError as derp:
             success = False
             if verbose:
@@ -111,46 +167,414 @@ class Observation(object):
         return success
 
 
-def _enforce_obs(obs, audio_root='', strict=True):
-    """Get dict from an Observation if an observation, else just dict"""
-    audio_file = obs['audio_file']
+_field_getter = operator.attrgetter(*Observation.FIELDS)
+
+
+def _tolist(values):
+    """Convert an array-like (or pd.Categorical) to a list of python
+    builtins."""
+    values = columnar.to_objects(values)
+    return values.tolist() if hasattr(values, 'tolist') else list(values)
+
+
+def _resolve_audio_file(audio_file, audio_root='', strict=True,
+                        path_cache=None):
+    """Resolve an audio file against `audio_root`, if it exists there.
+
+    Existence checks go through `path_cache` (a utils.PathCache) if given.
+    """
+    exists = os.path.exists if path_cache is None else path_cache.exists
     escaped_audio_file = os.path.join(audio_root, audio_file)
-    file_checks = [os.path.exists(audio_file),
-                   os.path.exists(escaped_audio_file)]
+    file_checks = [exists(audio_file), exists(escaped_audio_file)]
     if not any(file_checks) and strict:
         raise MissingDataException(
             "Audio file(s) missing:\n\tbase: {}\n\tescaped:{}"
             "".format(audio_file, escaped_audio_file))
 
+    return escaped_audio_file if file_checks[1] else audio_file
+
+
+def _resolve_audio_files(audio_files, audio_root='', strict=True,
+                         path_cache=None):
+    """Column-wise `_resolve_audio_file`; returns an object array.
+
+    If no `path_cache` is given, a fresh one is used for this call, so each
+    directory involved is only listed once.
+    """
+    if not audio_root and not strict:
+        # Joining against an empty root is a no-op, and nothing can raise.
+        return audio_files
+    path_cache = utils.PathCache() if path_cache is None else path_cache
+    if isinstance(audio_files, pd.Categorical):
+        # Resolve each distinct file once, and keep the column encoded.
+        resolved = _resolve_audio_files(audio_files.categories, audio_root,
+                                        strict, path_cache)
+        codes, uniques = pd.factorize(resolved)
+        return pd.Categorical.from_codes(
+            np.append(codes, -1)[audio_files.codes], uniques)
+    return _object_column([
+        _resolve_audio_file(x, audio_root, strict, path_cache)
+        for x in audio_files])
+
+
+def _enforce_obs(obs, audio_root='', strict=True, path_cache=None):
+    """Get dict from an Observation if an observation, else just dict"""
+    audio_file = _resolve_audio_file(obs['audio_file'], audio_root, strict,
+                                     path_cache)
     if isinstance(obs, Observation):
         obs = obs.to_dict()
-    obs['audio_file'] = escaped_audio_file if file_checks[1] else audio_file
+    obs['audio_file'] = audio_file
     return obs
 
 
+def _object_column(values):
+    """Pack a sequence of values, as-is, into a 1d object array."""
+    values = list(values)
+    column = np.empty(len(values), dtype=object)
+    column[:] = values
+    return column
+
+
+def _as_column(values):
+    """Pack a sequence of values into a 1d column array.
+
+    Numeric values become a typed array; anything else (strings, None, or a
+    mix of types) is kept verbatim in an object array.
+    """
+    values = list(values)
+    column = np.array(values)
+    if column.ndim != 1 or column.dtype.kind not in 'biuf':
+        column = _object_column(values)
+    return column
+
+
+def _native(value):
+    """Unbox numpy scalars to the equivalent python builtin."""
+    return value.item() if isinstance(value, np.generic) else value
+
+
+def _value(column, n):
+    """Return the value at row `n` of a column as a python builtin; a
+    pd.Categorical only decodes that one row."""
+    if isinstance(column, pd.Categorical):
+        code = column.codes[n]
+        return None if code < 0 else _native(column.categories[code])
+    return _native(column[n])
+
+
+def _equals(column, value):
+    """Row mask of `column == value`; a pd.Categorical only compares its
+    categories."""
+    if isinstance(column, pd.Categorical):
+        lookup = _object_column(list(column.categories) + [None])
+        return (lookup == value)[column.codes]
+    return column == value
+
+
+def _records_to_columns(records):
+    """Transpose a list of observation dicts into index and columns.
+
+    Parameters
+    ----------
+    records : list of dict
+        Observation records, keyed by `Observation.FIELDS`.
+
+    Returns
+    -------
+    index : np.ndarray, dtype=object
+        Observation indexes.
+
+    columns : OrderedDict of np.ndarray
+        One array per field in `Collection.COLUMNS`.
+    """
+    unknown = set().union(*records) - set(Observation.FIELDS)
+    if unknown:
+        raise TypeError("Unexpected observation fields: {}"
+                        "".format(sorted(unknown)))
+
+    index = _object_column(rec['index'] for rec in records)
+    columns = OrderedDict()
+    for key in Collection.COLUMNS:
+        if key in Observation.DEFAULTS:
+            default = Observation.DEFAULTS[key]
+            columns[key] = _as_column(rec.get(key, default) for rec in records)
+        else:
+            columns[key] = _as_column(rec[key] for rec in records)
+    return index, columns
+
+
+def _is_number(value):
+    return (isinstance(value, numbers.Number) and
+            not isinstance(value, (bool, np.bool_)))
+
+
+_TYPE_CHECKS = {
+    'string': lambda x: isinstance(x, STRING_TYPES),
+    'number': _is_number,
+    'null': lambda x: x is None,
+    'object': lambda x: isinstance(x, dict)
+}
+
+
+def _check_column(column, spec):
+    """Evaluate a JSON-schema property spec over a whole column.
+
+    Supports the `type`, `enum`, `minimum` and `oneOf` keywords; anything
+    else is checked value-by-value with a compiled validator.
+
+    Parameters
+    ----------
+    column : np.ndarray, ndim=1
+        Values to check.
+
+    spec : dict
+        JSON-schema for a single property.
+
+    Returns
+    -------
+    valid : np.ndarray, dtype=bool
+        True where the value satisfies the spec.
+    """
+    unsupported = set(spec) - set(['type', 'enum', 'minimum', 'oneOf'])
+    if unsupported or spec.get('type', 'null') not in _TYPE_CHECKS:
+        validator = jsonschema.validators.validator_for(spec)(spec)
+        return np.array([validator.is_valid(_native(x)) for x in column],
+                        dtype=bool)
+
+    numeric_dtype = column.dtype.kind in 'iuf'
+    valid = np.ones(len(column), dtype=bool)
+    if 'type' in spec:
+        if numeric_dtype:
+            # Typed numeric columns are homogeneous; no need to look inside.
+            valid &= spec['type'] == 'number'
+        else:
+            valid &= np.array([_TYPE_CHECKS[spec['type']](x)
+                               for x in column], dtype=bool)
+    if 'enum' in spec:
+        valid &= pd.Series(column, dtype=object).isin(spec['enum']).values
+    if 'minimum' in spec:
+        # Like JSON-schema, `minimum` only constrains numeric values.
+        numeric = column if numeric_dtype else np.array(
+            [x if _is_number(x) else np.nan for x in column], dtype=float)
+        valid &= ~(numeric < spec['minimum'])
+    if 'oneOf' in spec:
+        matches = sum(_check_column(column, x).astype(int)
+                      for x in spec['oneOf'])
+        valid &= (matches == 1)
+    return valid
+
+
+def _group_positions(column):
+    """Map each distinct value in a column to the rows that hold it.
+
+    Parameters
+    ----------
+    column : np.ndarray, ndim=1
+        Values to group; null values (None / NaN) are grouped under None.
+
+    Returns
+    -------
+    groups : dict
+        Value -> ascending np.ndarray of row positions.
+    """
+    codes, uniques = pd.factorize(column)
+    order = np.argsort(codes, kind='mergesort')
+    bounds = np.flatnonzero(np.diff(codes[order])) + 1
+    groups = dict()
+    for rows in np.split(order, bounds):
+        if len(rows):
+            code = codes[rows[0]]
+            groups[_native(uniques[code]) if code >= 0 else None] = rows
+    return groups
+
+
+def _batches(iterable, size):
+    """Yield lists of (at most) `size` consecutive items of an iterable."""
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _iter_json_array(fh, blocksize=2 ** 16):
+    """Incrementally decode the items of a top-level JSON array.
+
+    Only one item (plus one read block) is held in memory at a time.
+
+    Parameters
+    ----------
+    fh : file
+        Open file, positioned at the start of the array.
+
+    blocksize : int
+        Number of characters to read at a time.
+
+    Yields
+    ------
+    item : obj
+        Each decoded item of the array.
+    """
+    decoder = json.JSONDecoder()
+    buf = ''
+    # One of: '[' before the array, 'item' for an item (or the end of an
+    # empty array), ',' for a separator or the end of the array.
+    expect = '['
+    while True:
+        buf = buf.lstrip()
+        if buf:
+            if expect == '[':
+                if buf[0] != '[':
+                    raise ValueError("Expected a JSON array")
+                buf, expect = buf[1:], 'item'
+                continue
+            if buf[0] == ']' and expect != '[':
+                return
+            if expect == ',':
+                if buf[0] != ',':
+                    raise ValueError("Expected ',' or ']' in a JSON array")
+                buf, expect = buf[1:], 'item'
+                continue
+            try:
+                item, end = decoder.raw_decode(buf)
+            except ValueError:
+                # Most likely an incomplete item; read more below.
+                pass
+            else:
+                yield item
+                buf, expect = buf[end:], ','
+                continue
+
+        block = fh.read(blocksize)
+        if not block:
+            raise ValueError("Unexpected end of JSON array")
+        buf += block
+
+
 class Collection(object):
     """Dictionary-like collection of Observations (maintains order).
 
+    Observations are stored column-wise, one array per field, and are only
+    instantiated as `Observation` objects on access.
+
+    Column arrays are copy-on-write: copies (and contiguous slices) share
+    them with their source until one side modifies a column, at which point
+    that side gets its own copy of that column.
+
+    Appended observations are buffered, and folded into the columns all at
+    once on the next read, so building a collection one `append` at a time
+    costs linear (not quadratic) time.
+
     Expands relative audio files to a given `audio_root` path.
     """
     # MODEL = Observation
+    COLUMNS = Observation.FIELDS[1:]
+    INDEXED_COLUMNS = ('dataset', 'instrument', 'source_index', 'partition')
+    CHUNK_ROWS = 100000
 
-    def __init__(self, observations, audio_root='', strict=False):
+    def __init__(self, observations, audio_root='', strict=False,
+                 path_cache=None):
         """
         Parameters
         ----------
         observations : list
             List of Observations (as dicts or Observations.)
-            If they're dicts, this will convert them to Observations.
 
         data_root : str or None
             Path to look for an observation, if not None
+
+        path_cache : utils.PathCache, or None
+            Directory snapshots to check audio files against; by default, a
+            fresh snapshot is taken for this call.
         """
-        self._observations = [Observation(**_enforce_obs(x, audio_root,
-                                                         strict))
-                              for x in observations]
+        records = [x.to_dict() if isinstance(x, Observation) else dict(x)
+                   for x in observations]
+        index, columns = _records_to_columns(records)
+        columns['audio_file'] = _resolve_audio_files(
+            columns['audio_file'], audio_root, strict, path_cache)
+        self._pending = []
+        self._index = index
+        self._columns = columns
+        self._shared = set()
         self.audio_root = audio_root
         self.strict = strict
+        self._reset_indexes()
+
+    @classmethod
+    def _from_columns(cls, index, columns, audio_root='', strict=False,
+                      shared=()):
+        """Build a collection directly from (already resolved) columns.
+
+        Columns named in `shared` are owned elsewhere, and are copied
+        before any in-place modification.
+        """
+        collection = cls.__new__(cls)
+        collection._pending = []
+        collection._index = index
+        collection._columns = columns
+        collection._shared = set(shared)
+        collection.audio_root = audio_root
+        collection.strict = strict
+        collection._reset_indexes()
+        return collection
+
+    @property
+    def _index(self):
+        self._flush()
+        return self._index_data
+
+    @_index.setter
+    def _index(self, index):
+        self._index_data = index
+
+    @property
+    def _columns(self):
+        self._flush()
+        return self._column_data
+
+    @_columns.setter
+    def _columns(self, columns):
+        self._column_data = columns
+
+    def _flush(self):
+        """Fold the appended observations into the column arrays."""
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, []
+        self._index_data = np.concatenate(
+            [columnar.to_objects(self._index_data)] +
+            [index for index, _ in pending])
+        for key, values in self._column_data.items():
+            self._column_data[key] = np.concatenate(
+                [columnar.to_objects(values)] +
+                [columns[key] for _, columns in pending])
+        # Concatenating always allocates, so nothing is shared any more.
+        self._shared.clear()
+
+    def _writable(self, column):
+        """Return a column array that is safe to modify in place, copying it
+        first if it is shared (or read-only, e.g. memory-mapped).
+
+        Categorical columns are decoded to a new object array.
+        """
+        values = self._columns[column]
+        if isinstance(values, pd.Categorical):
+            values = columnar.to_objects(values)
+            self._columns[column] = values
+            self._shared.discard(column)
+        elif column in self._shared or not values.flags.writeable:
+            values = values.copy()
+            self._columns[column] = values
+            self._shared.discard(column)
+        return values
+
+    def _reset_indexes(self):
+        """Drop the lookup tables; they are rebuilt lazily on next use."""
+        self._positions = None
+        self._groups = dict()
 
     def __eq__(self, a):
         is_eq = False
@@ -159,34 +583,186 @@ class Collection(object):
         return is_eq
 
     def __len__(self):
-        return len(self.values())
+        return len(self._index_data) + len(self._pending)
 
-    def __getitem__(self, n):
-        """Return the observation for a given integer index."""
-        return self._observations[n]
+    def __getitem__(self, key):
+        """Return the observation for a given observation index; use `iloc`
+        for row positions.
+
+        A slice of positions returns a new collection of those rows.
+        """
+        if isinstance(key, slice):
+            return self.iloc(key)
+        return self.iloc(self.position(key))
+
+    def iloc(self, n):
+        """Return the observation at an integer position, or a new
+        collection of the rows in a slice of positions."""
+        if isinstance(n, slice):
+            return self._take(np.arange(len(self))[n])
+        return Observation(_value(self._index, n),
+                           *[_value(self._columns[k], n)
+                             for k in self.COLUMNS])
+
+    def __contains__(self, key):
+        return key in self.positions
+
+    @property
+    def positions(self):
+        """Hash index of observation index -> row position.
+
+        Repeated indexes resolve to their first occurrence.
+        """
+        if self._positions is None:
+            positions = dict()
+            for n, key in enumerate(_tolist(self._index)):
+                positions.setdefault(key, n)
+            self._positions = positions
+        return self._positions
+
+    def position(self, key):
+        """Return the row position of an observation index.
+
+        Raises
+        ------
+        KeyError
+            If the index is not in the collection.
+        """
+        return self.positions[key]
+
+    def get(self, key, default=None):
+        """Return the observation for an index, or `default` if absent."""
+        n = self.positions.get(key)
+        return default if n is None else self.iloc(n)
+
+    def groups(self, column):
+        """Secondary index over a column.
+
+        Parameters
+        ----------
+        column : str
+            One of `INDEXED_COLUMNS`.
+
+        Returns
+        -------
+        groups : dict
+            Column value -> ascending np.ndarray of row positions. Treat the
+            arrays as read-only; they are shared with the collection.
+        """
+        if column not in self.INDEXED_COLUMNS:
+            raise ValueError("No secondary index for column '{}'; expected "
+                             "one of {}".format(column, self.INDEXED_COLUMNS))
+        if column not in self._groups:
+            self._groups[column] = _group_positions(self._columns[column])
+        return self._groups[column]
+
+    def rows(self, column, value):
+        """Return the row positions where `column == value`."""
+        if column in self.INDEXED_COLUMNS:
+            rows = self.groups(column).get(value)
+            return np.zeros(0, dtype=int) if rows is None else rows
+        return np.flatnonzero(_equals(self._columns[column], value))
+
+    def __iter__(self):
+        for n in range(len(self)):
+            yield self.iloc(n)
+
+    def _take(self, rows):
+        """Return a new collection of the given row positions.
+
+        A contiguous run of rows shares its column buffers with this
+        collection (copy-on-write); anything else is copied.
+        """
+        rows = np.asarray(rows, dtype=int)
+        shared = ()
+        if len(rows) and np.all(np.diff(rows) == 1):
+            rows = slice(rows[0], rows[-1] + 1)
+            shared = self._columns.keys()
+            self._shared.update(shared)
+        columns = OrderedDict((k, v[rows]) for k, v in self._columns.items())
+        return self._from_columns(self._index[rows], columns,
+                                  self.audio_root, self.strict, shared)
 
     def items(self):
-        return [(v.index, v) for v in self.values()]
+        return list(zip(self.keys(), self.values()))
 
     def values(self):
-        return self._observations
+        return Observation.from_arrays(self._index, **self._columns)
 
     def keys(self):
-        return [v.index for v in self.values()]
+        return _tolist(self._index)
 
-    def append(self, observation, audio_root=None):
+    def append(self, observation, audio_root=None, path_cache=None):
         audio_root = self.audio_root if audio_root is None else audio_root
-        obs = _enforce_obs(observation, audio_root, self.strict)
-        self._observations += [Observation(**obs)]
+        obs = _enforce_obs(observation, audio_root, self.strict, path_cache)
+        index, columns = _records_to_columns([obs])
+        row = len(self)
+        self._pending.append((index, columns))
+
+        # Keep the hash index up to date; secondary indexes are rebuilt on
+        # next use.
+        if self._positions is not None:
+            self._positions.setdefault(index[0], row)
+        self._groups = dict()
 
     def to_builtin(self):
-        return [v.to_builtin() for v in self.values()]
+        columns = [_tolist(self._index)]
+        columns += [_tolist(self._columns[k]) for k in self.COLUMNS]
+        return [dict(zip(Observation.FIELDS, row)) for row in zip(*columns)]
 
     @classmethod
     def read_json(cls, json_path, audio_root=''):
         with open(json_path, 'r') as fh:
             return cls(json.load(fh), audio_root=audio_root)
 
+    @classmethod
+    def iter_chunks(cls, path, rows=CHUNK_ROWS, audio_root='', strict=False,
+                    path_cache=None):
+        """Read an index from disk as a sequence of smaller collections.
+
+        Only one chunk is held in memory at a time, so this works for
+        indexes that are too large to load at once.
+
+        Parameters
+        ----------
+        path : str
+            A `.csv` file, a `.json` file (as written by `to_json`), or a
+            columnar directory (see `columnar`).
+
+        rows : int
+            Maximum number of observations per chunk.
+
+        audio_root : str, default=''
+            Path to look for relative audio files.
+
+        strict : bool, default=False
+            If True, raise a MissingDataException for missing audio files.
+
+        path_cache : utils.PathCache, or None
+            Directory snapshots to check audio files against; shared by
+            every chunk.
+
+        Yields
+        ------
+        chunk : Collection
+            Consecutive observations of the index, in order.
+        """
+        if audio_root and path_cache is None:
+            path_cache = utils.PathCache()
+
+        if path.lower().endswith('.csv'):
+            for dframe in pd.read_csv(path, index_col=0, chunksize=rows):
+                yield cls.from_dataframe(dframe, audio_root, strict,
+                                         path_cache)
+        elif path.lower().endswith('.json'):
+            with open(path, 'r') as fh:
+                for records in _batches(_iter_json_array(fh), rows):
+                    yield cls(records, audio_root, strict, path_cache)
+        else:
+            for index, data in columnar.iter_arrays(path, rows):
+                yield cls._from_data(index, data, audio_root, strict,
+                                     path_cache)
+
     def to_json(self, json_path=None, **kwargs):
         """Pandas-like `to_json` method.
 
@@ -206,24 +782,270 @@ class Collection(object):
         else:
             return sdata
 
-    def validate(self, verbose=False, check_files=True):
-        """Returns True if all are valid."""
-        return all([x.validate(verbose=verbose, check_files=check_files)
-                    for x in self.values()])
+    def validate(self, verbose=False, check_files=True, header_only=False,
+                 num_cpus=1):
+        """Returns True if all are valid.
+
+        See `validation_report` for details on the parameters.
+        """
+        report = self.validation_report(check_files=check_files,
+                                        header_only=header_only,
+                                        num_cpus=num_cpus)
+        if verbose:
+            for index, row in report.iterrows():
+                print("Failed {} check [{}]: \n{}".format(
+                    row['field'], index, row['reason']))
+        return report.empty
+
+    def validation_report(self, schema=None, check_files=True,
+                          header_only=False, num_cpus=1):
+        """Validate every observation in one batch.
+
+        The schema is checked column-by-column rather than record-by-record,
+        and file checks (only for schema-valid rows) run in parallel.
+
+        Parameters
+        ----------
+        schema : dict, or None
+            JSON-schema to validate against; defaults to Observation.SCHEMA.
+
+        check_files : bool, default=True
+            If True, also check that each audio file is readable.
+
+        header_only : bool, default=False
+            If True, only read file headers for the file checks; see
+            `utils.check_audio_header`.
+
+        num_cpus : int, default=1
+            Number of CPUs to use for the file checks; -1 for all.
+
+        Returns
+        -------
+        report : pd.DataFrame
+            One row per failed check, indexed by observation index, with
+            columns `position`, `field` and `reason`; empty if all is valid.
+        """
+        schema = Observation.SCHEMA if schema is None else schema
+        index = columnar.to_objects(self._index)
+        fields = [('index', index)] + [
+            (k, columnar.to_objects(v)) for k, v in self._columns.items()]
+        records = []
+        valid = np.ones(len(self), dtype=bool)
+        for key, column in fields:
+            spec = schema.get('properties', {}).get(key)
+            if spec is None:
+                continue
+            column_valid = _check_column(column, spec)
+            for n in np.flatnonzero(~column_valid):
+                records.append(dict(position=n, field=key, reason=(
+                    "{!r} is not valid under {}".format(
+                        _native(column[n]), json.dumps(spec)))))
+            valid &= column_valid
+
+        if check_files:
+            rows = np.flatnonzero(valid)
+            audio_files = dict(fields)['audio_file'][rows]
+            results = utils.check_many_audio_files(
+                audio_files, num_cpus=num_cpus, header_only=header_only)
+            for n, audio_file, (status, error) in zip(rows, audio_files,
+                                                      results):
+                if not status:
+                    records.append(dict(position=n, field='audio_file',
+                                        reason="Failed file check: {} ({})"
+                                        "".format(audio_file, error)))
+
+        records.sort(key=lambda x: x['position'])
+        return pd.DataFrame.from_records(
+            records, index=index[[x['position'] for x in records]],
+            columns=['position', 'field', 'reason'])
 
     def to_dataframe(self):
-        return pd.DataFrame([x.to_series() for x in self.values()])
+        """Return the collection as a dataframe, indexed by observation.
+
+        The columns are handed to pandas without copying where the dtypes
+        allow it, so this scales with the number of fields, not rows;
+        categorical columns (see `read_columnar`) stay categorical.
+        """
+        # The frame may share our buffers, so don't write through them.
+        self._shared.update(self._columns.keys())
+        return pd.DataFrame(self._columns,
+                            index=columnar.to_objects(self._index),
+                            columns=self.COLUMNS, copy=False)
+
+    @classmethod
+    def from_dataframe(cls, dframe, audio_root='', strict=False,
+                       path_cache=None):
+        """Create a collection from a dataframe, indexed by observation.
+
+        Parameters
+        ----------
+        dframe : pd.DataFrame
+            Table with a column for each (required) observation field.
+
+        audio_root : str, default=''
+            Path to look for relative audio files.
+
+        strict : bool, default=False
+            If True, raise a MissingDataException for missing audio files.
+
+        path_cache : utils.PathCache, or None
+            Directory snapshots to check audio files against.
+
+        Returns
+        -------
+        collection : Collection
+        """
+        data = OrderedDict((k, np.asarray(dframe[k])) for k in dframe.columns)
+        return cls._from_data(np.asarray(dframe.index, dtype=object), data,
+                              audio_root, strict, path_cache)
 
     @classmethod
-    def from_dataframe(cls, dframe, audio_root=''):
-        return cls([Observation.from_series(x) for _, x in dframe.iterrows()],
-                   audio_root=audio_root)
+    def concat(cls, collections):
+        """Join collections end to end, in order.
+
+        Parameters
+        ----------
+        collections : iterable of Collection
+            Collections to join; the first one's `audio_root` and `strict`
+            settings carry over to the result.
+
+        Returns
+        -------
+        collection : Collection
+        """
+        collections = list(collections)
+        if not collections:
+            return cls([])
+        index = np.concatenate([columnar.to_objects(x._index)
+                                for x in collections])
+        columns = OrderedDict(
+            (k, np.concatenate([columnar.to_objects(x._columns[k])
+                                for x in collections]))
+            for k in cls.COLUMNS)
+        return cls._from_columns(index, columns, collections[0].audio_root,
+                                 collections[0].strict)
+
+    @classmethod
+    def _from_data(cls, index, data, audio_root='', strict=False,
+                   path_cache=None):
+        """Build a collection from external column data.
+
+        Checks the fields, fills in default columns, and resolves the audio
+        files against `audio_root`.
+        """
+        unknown = set(data) - set(cls.COLUMNS)
+        if unknown:
+            raise TypeError("Unexpected observation fields: {}"
+                            "".format(sorted(unknown)))
+
+        columns = OrderedDict()
+        for key in cls.COLUMNS:
+            if key in data:
+                columns[key] = data[key]
+            elif key in Observation.DEFAULTS:
+                columns[key] = _as_column(
+                    [Observation.DEFAULTS[key]] * len(index))
+            else:
+                raise TypeError("Missing observation field: {}".format(key))
+
+        columns['audio_file'] = _resolve_audio_files(
+            columns['audio_file'], audio_root, strict, path_cache)
+        return cls._from_columns(index, columns, audio_root, strict,
+                                 shared=columns.keys())
+
+    @classmethod
+    def read_columnar(cls, path, audio_root='', mmap_mode='r',
+                      path_cache=None):
+        """Load a collection from a columnar directory.
+
+        Parameters
+        ----------
+        path : str
+            Directory written by `to_columnar` (or `columnar.write_index`).
+
+        audio_root : str, default=''
+            Path to look for relative audio files.
+
+        mmap_mode : str or None, default='r'
+            Memory-map mode for numeric columns; see `np.load`.
+
+        path_cache : utils.PathCache, or None
+            Directory snapshots to check audio files against.
+
+        Returns
+        -------
+        collection : Collection
+            The index and non-numeric columns stay encoded as
+            pd.Categorical, and are only decoded a row at a time (or in
+            full, when a column is first modified).
+        """
+        index, data = columnar.read_arrays(path, mmap_mode=mmap_mode,
+                                           categorical=True)
+        return cls._from_data(index, data, audio_root=audio_root,
+                              path_cache=path_cache)
+
+    def to_columnar(self, path):
+        """Write the collection as a columnar directory; see `columnar`.
+
+        Returns
+        -------
+        success : bool
+            True if the output exists.
+        """
+        return columnar.write_arrays(path, self._index, self._columns)
 
     def copy(self, deep=True):
-        return Collection(copy.deepcopy(self._observations))
+        """Copy the collection without copying its data.
+
+        Parameters
+        ----------
+        deep : bool, default=True
+            If True, the copy behaves as an independent collection: the
+            column buffers are shared copy-on-write. If False, in-place
+            modifications (see `set`) are visible to both.
+
+        Returns
+        -------
+        collection : Collection
+        """
+        shared = ()
+        if deep:
+            shared = self._columns.keys()
+            self._shared.update(shared)
+        return self._from_columns(self._index, OrderedDict(self._columns),
+                                  self.audio_root, self.strict, shared)
+
+    def set(self, column, value, rows=None):
+        """Assign a value (or values) to a column, in place.
+
+        Parameters
+        ----------
+        column : str
+            Column to modify; one of `COLUMNS`.
 
-    def view(self, column, filter_value):
-        """Returns a copy of the collection restricted to the filter value.
+        value : obj or array_like
+            Value(s) to assign; array values must align with `rows`.
+
+        rows : array_like of int, slice, or None
+            Row positions to modify; by default, all of them.
+        """
+        if column not in self.COLUMNS:
+            raise ValueError("Cannot set column '{}'; expected one of {}"
+                             "".format(column, self.COLUMNS))
+        rows = slice(None) if rows is None else rows
+        values = self._writable(column)
+        try:
+            values[rows] = value
+        except (TypeError, ValueError):
+            # The values don't fit the column dtype; fall back to objects.
+            values = _object_column(values.tolist())
+            values[rows] = value
+            self._columns[column] = values
+        self._groups.pop(column, None)
+
+    def view(self, column=None, filter_value=None, **predicates):
+        """Returns a lazy view of the collection restricted to the filter
+        value(s).
 
         Parameters
         ----------
@@ -233,13 +1055,319 @@ class Collection(object):
         filter_value : obj
             Value to restrict the collection.
 
+        **predicates : keyword args
+            Further `column=value` restrictions; see `CollectionView.where`.
+
+        Returns
+        -------
+        view : CollectionView
+            The observations where `column == filter_value`, evaluated (and
+            materialized) only on demand.
+        """
+        if column is not None:
+            predicates[column] = filter_value
+        return CollectionView(self).where(**predicates)
+
+
+class CollectionView(object):
+    """Lazy, read-only selection of rows over a parent Collection.
+
+    Predicates are only evaluated when the rows are first needed, and the
+    selected observations are only copied out by `materialize` (or the
+    methods that build on it, like `to_dataframe`).
+    """
+
+    def __init__(self, collection, predicates=None, parent=None):
+        """
+        Parameters
+        ----------
+        collection : Collection
+            Collection being viewed.
+
+        predicates : list of (column, value) tuples, or None
+            Restrictions to apply; a list, tuple or set value matches any of
+            its members.
+
+        parent : CollectionView, or None
+            View to further restrict, if any.
+        """
+        self.collection = collection
+        self.predicates = list(predicates or [])
+        self.parent = parent
+        self._rows = None
+
+    def where(self, **predicates):
+        """Return a new view further restricted by `column=value` pairs.
+
+        Example
+        -------
+        >>> collection.view(dataset='rwc').where(instrument='violin')
+        """
+        return CollectionView(self.collection, sorted(predicates.items()),
+                              parent=self)
+
+    @property
+    def rows(self):
+        """Row positions (ascending) of the parent collection in view."""
+        if self._rows is None:
+            rows = None if self.parent is None else self.parent.rows
+            for column, value in self.predicates:
+                if isinstance(value, (list, tuple, set)):
+                    matches = np.unique(np.concatenate(
+                        [self.collection.rows(column, v) for v in value] +
+                        [np.zeros(0, dtype=int)]))
+                else:
+                    matches = self.collection.rows(column, value)
+                rows = matches if rows is None else np.intersect1d(
+                    rows, matches, assume_unique=True)
+            if rows is None:
+                rows = np.arange(len(self.collection))
+            self._rows = rows
+        return self._rows
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __getitem__(self, n):
+        """Return the observation for a given integer position in the view."""
+        return self.collection.iloc(self.rows[n])
+
+    def __iter__(self):
+        for n in self.rows:
+            yield self.collection.iloc(n)
+
+    def keys(self):
+        return _tolist(self.collection._index[self.rows])
+
+    def values(self):
+        return self.materialize().values()
+
+    def items(self):
+        return list(zip(self.keys(), self.values()))
+
+    def materialize(self):
+        """Copy the observations in view out to a new Collection."""
+        return self.collection._take(self.rows)
+
+    def to_builtin(self):
+        return self.materialize().to_builtin()
+
+    def to_dataframe(self):
+        return self.materialize().to_dataframe()
+
+
+class ChunkedCollection(object):
+    """Read-only collection over an index on disk, processed in chunks.
+
+    Nothing is loaded up front; every operation streams through the index
+    one chunk (see `Collection.iter_chunks`) at a time, so memory use is
+    bounded by the chunk size (or, for `to_dataframe` and `to_collection`,
+    by the size of the filtered result).
+
+    Example
+    -------
+    >>> index = ChunkedCollection('master_index.csv', rows=50000)
+    >>> index.validate(check_files=False)
+    >>> index.view(dataset='rwc').where(instrument='violin').to_dataframe()
+    """
+
+    def __init__(self, path, rows=Collection.CHUNK_ROWS, audio_root='',
+                 strict=False, predicates=None):
+        """
+        Parameters
+        ----------
+        path : str
+            Index to read; see `Collection.iter_chunks`.
+
+        rows : int
+            Maximum number of observations per chunk.
+
+        audio_root : str, default=''
+            Path to look for relative audio files.
+
+        strict : bool, default=False
+            If True, raise a MissingDataException for missing audio files.
+
+        predicates : list of (column, value) tuples, or None
+            Restrictions to apply to each chunk; see `CollectionView.where`.
+        """
+        self.path = path
+        self.rows = rows
+        self.audio_root = audio_root
+        self.strict = strict
+        self.predicates = list(predicates or [])
+
+    def where(self, **predicates):
+        """Return a new chunked collection further restricted by
+        `column=value` pairs; see `CollectionView.where`."""
+        return ChunkedCollection(
+            self.path, self.rows, self.audio_root, self.strict,
+            self.predicates + sorted(predicates.items()))
+
+    def view(self, column=None, filter_value=None, **predicates):
+        """Restrict to the filter value(s); see `Collection.view`."""
+        if column is not None:
+            predicates[column] = filter_value
+        return self.where(**predicates)
+
+    def __iter__(self):
+        """Yield each (filtered, non-empty) chunk as a Collection."""
+        for chunk in Collection.iter_chunks(self.path, self.rows,
+                                            self.audio_root, self.strict):
+            if self.predicates:
+                chunk = CollectionView(chunk, self.predicates).materialize()
+            if len(chunk):
+                yield chunk
+
+    def __len__(self):
+        return sum(len(chunk) for chunk in self)
+
+    def keys(self):
+        return [key for chunk in self for key in chunk.keys()]
+
+    def iter_dataframes(self):
+        """Yield each chunk as a dataframe."""
+        for chunk in self:
+            yield chunk.to_dataframe()
+
+    def to_dataframe(self):
+        """Return the (filtered) observations as one dataframe."""
+        return self.to_collection().to_dataframe()
+
+    def to_collection(self):
+        """Load the (filtered) observations into one Collection."""
+        collection = Collection.concat(self)
+        collection.audio_root = self.audio_root
+        collection.strict = self.strict
+        return collection
+
+    def validate(self, verbose=False, check_files=True, header_only=False,
+                 num_cpus=1):
+        """Returns True if all are valid; see `Collection.validate`."""
+        valid = True
+        for chunk in self:
+            valid = chunk.validate(verbose, check_files, header_only,
+                                   num_cpus) and valid
+        return valid
+
+    def validation_report(self, schema=None, check_files=True,
+                          header_only=False, num_cpus=1):
+        """Validate chunk by chunk; see `Collection.validation_report`.
+
         Returns
         -------
+        report : pd.DataFrame
+            As for `Collection.validation_report`, with `position` counted
+            from the start of the (filtered) index.
+        """
+        reports = []
+        offset = 0
+        for chunk in self:
+            report = chunk.validation_report(schema, check_files,
+                                             header_only, num_cpus)
+            report['position'] += offset
+            reports.append(report)
+            offset += len(chunk)
+        if not reports:
+            return Collection([]).validation_report(schema, check_files)
+        return pd.concat(reports)
+
+
+def _json_default(value):
+    """JSON fallback for numpy scalars."""
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError("{!r} is not JSON serializable".format(value))
+
+
+class ObservationJournal(object):
+    """Append-only, JSON-lines journal of observations.
+
+    Each line records every observation generated from one source (e.g. one
+    audio file), and is written and flushed in one go. After a crash, a torn
+    final line is dropped on open, so the journal only ever holds complete
+    sources and can be resumed by skipping those already `completed`.
+    """
+
+    def __init__(self, path):
+        """
+        Parameters
+        ----------
+        path : str
+            Journal file; created on first write if it doesn't exist.
+        """
+        self.path = path
+        self._completed = None
+        self._recover()
+
+    def _entries(self):
+        """Yield (end_offset, entry) for each intact line of the journal."""
+        if not os.path.exists(self.path):
+            return
+        offset = 0
+        with open(self.path, 'rb') as fh:
+            for line in fh:
+                if not line.endswith(b'\n'):
+                    break
+                try:
+                    entry = json.loads(line.decode('utf-8'))
+                except ValueError:
+                    break
+                offset += len(line)
+                yield offset, entry
+
+    def _recover(self):
+        """Truncate anything after the last intact line."""
+        if not os.path.exists(self.path):
+            return
+        offset = 0
+        for offset, _ in self._entries():
+            pass
+        if offset < os.path.getsize(self.path):
+            logger.warning("Dropping a partial entry at the end of {}"
+                           "".format(self.path))
+            with open(self.path, 'rb+') as fh:
+                fh.truncate(offset)
+
+    @property
+    def completed(self):
+        """Set of sources already recorded in the journal."""
+        if self._completed is None:
+            self._completed = set(entry['source']
+                                  for _, entry in self._entries())
+        return self._completed
+
+    def write(self, source, observations):
+        """Append the observations for one source, and sync to disk.
+
+        Parameters
+        ----------
+        source : str
+            Identifier of the source these observations were generated from.
 
+        observations : list of Observation or dict
+            Observations to record; may be empty.
         """
-        thecopy = copy.copy(self.to_dataframe())
-        ds_view = thecopy[thecopy[column] == filter_value]
-        return Collection.from_dataframe(ds_view, self.audio_root)
+        entry = dict(source=source, observations=[
+            x.to_builtin() if isinstance(x, Observation) else x
+            for x in observations])
+        line = json.dumps(entry, default=_json_default) + '\n'
+        with open(self.path, 'ab') as fh:
+            fh.write(line.encode('utf-8'))
+            fh.flush()
+            os.fsync(fh.fileno())
+        self.completed.add(source)
+
+    def observations(self):
+        """Iterate over every recorded observation, as a dict."""
+        for _, entry in self._entries():
+            for obs in entry['observations']:
+                yield obs
+
+    def to_collection(self, audio_root='', strict=False):
+        """Read the journal back into a Collection."""
+        return Collection(self.observations(), audio_root=audio_root,
+                          strict=strict)
 
 
 def load(filename, audio_root):
@@ -248,8 +1376,369 @@ def load(filename, audio_root):
     return Collection.load(filename)
 
 
+def _factorize(values):
+    """Integer-encode values, with nulls as one extra code at the end.
+
+    Returns
+    -------
+    codes : np.ndarray, dtype=int
+        Code of each value.
+
+    uniques : np.ndarray, dtype=object
+        Value of each code.
+    """
+    codes, uniques = pd.factorize(values)
+    uniques = _object_column(list(uniques))
+    codes = np.asarray(codes, dtype=np.int64)
+    nulls = codes < 0
+    if nulls.any():
+        codes[nulls] = len(uniques)
+        uniques = _object_column(uniques.tolist() + [None])
+    return codes, uniques
+
+
+def _encode_groups(instruments, sources):
+    """Integer-encode the (instrument, source_index) groups of some rows.
+
+    Parameters
+    ----------
+    instruments, sources : np.ndarray
+        Instrument and source_index of each row.
+
+    Returns
+    -------
+    group_codes : np.ndarray, dtype=int
+        Group of each row.
+
+    group_instruments : np.ndarray, dtype=int
+        Instrument (code) of each group.
+
+    instruments : np.ndarray, dtype=object
+        Instrument name of each instrument code.
+    """
+    inst_codes, instruments = _factorize(instruments)
+    src_codes, src_uniques = _factorize(sources)
+    pairs = inst_codes * max(len(src_uniques), 1) + src_codes
+    group_codes, group_pairs = pd.factorize(pairs)
+    group_instruments = (np.asarray(group_pairs, dtype=np.int64) //
+                         max(len(src_uniques), 1))
+    return np.asarray(group_codes), group_instruments, instruments
+
+
+def _rank_groups(group_instruments, n_instruments, rng):
+    """Randomly order the groups of each instrument.
+
+    Equivalent to one random permutation of the groups of each instrument,
+    but done for all instruments at once.
+
+    Returns
+    -------
+    rank : np.ndarray, dtype=int
+        Position of each group in the permutation of its instrument.
+
+    counts : np.ndarray, dtype=int
+        Number of groups per instrument.
+    """
+    counts = np.bincount(group_instruments, minlength=n_instruments)
+    # Sort groups by instrument, then randomly within each instrument.
+    order = np.lexsort((rng.random_sample(len(group_instruments)),
+                        group_instruments))
+    starts = np.cumsum(counts) - counts
+    rank = np.empty(len(order), dtype=int)
+    rank[order] = np.arange(len(order)) - starts[group_instruments[order]]
+    return rank, counts
+
+
+def _split_groups(group_instruments, n_instruments, valid_size, rng):
+    """Randomly assign whole groups to train / valid, per instrument, with
+    the first `ceil(valid_size * n_groups)` of each going to valid.
+
+    Returns
+    -------
+    valid : np.ndarray, dtype=bool
+        True for the groups assigned to valid.
+
+    counts : np.ndarray, dtype=int
+        Number of groups per instrument.
+    """
+    rank, counts = _rank_groups(group_instruments, n_instruments, rng)
+    # Keep at least one group on each side, like `train_test_split`.
+    n_valid = np.clip(np.ceil(valid_size * counts).astype(int),
+                      1, np.maximum(counts - 1, 1))
+    return rank < n_valid[group_instruments], counts
+
+
+def _is_integer(value):
+    return (isinstance(value, numbers.Integral) and
+            not isinstance(value, (bool, np.bool_)))
+
+
+def _canonical_label(value):
+    """Canonical string form of a label, the same however it was stored;
+    e.g. 1, 1.0, '1' and '001' (which CSV readers parse as numbers) are
+    all '1'."""
+    if _is_integer(value):
+        return u"{:d}".format(int(value))
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return u"{}".format(value)
+    if not np.isfinite(number):
+        return u"{}".format(value)
+    if not isinstance(value, numbers.Number):
+        try:
+            # Exact, for integer strings too long for a float.
+            return u"{:d}".format(int(value))
+        except (TypeError, ValueError):
+            pass
+    if number.is_integer():
+        return u"{:d}".format(int(number))
+    return repr(number)
+
+
+def _stable_hash(values, salt=''):
+    """Map values to floats in [0, 1) by a salted hash of their canonical
+    string form (see `_canonical_label`).
+
+    Unlike `hash`, the result doesn't depend on the process or platform, so
+    the same value (and salt) always maps to the same number, even once
+    read back from another storage format. Each distinct value is only
+    hashed once.
+    """
+    codes, uniques = _factorize(values)
+    digests = [hashlib.md5(u"{}\x00{}".format(
+        salt, _canonical_label(x)).encode('utf-8')) for x in uniques]
+    # 52 bits, so the quotient is exact in a float64.
+    units = np.array([int(d.hexdigest()[:13], 16) for d in digests],
+                     dtype=np.float64) / 16.0 ** 13
+    return units[codes]
+
+
+def _sample_per_class(rows, classes, n_per_class, rng):
+    """Sample `n_per_class` of the rows of each class; with replacement for
+    classes that have fewer rows than that."""
+    samples = []
+    for cls in np.unique(classes):
+        members = rows[classes == cls]
+        replace = len(members) <= n_per_class
+        samples.append(rng.choice(members, n_per_class, replace=replace))
+    return np.sort(np.concatenate(samples + [np.zeros(0, dtype=int)]))
+
+
+class Partitioner(object):
+    """Generates train / valid / test partitions of a collection.
+
+    The instruments and (instrument, source_index) groups are encoded as
+    integers once, up front, and shared by every partition generated, so
+    producing many partitions (e.g. every leave-one-dataset-out split, or
+    k folds) costs little more than producing one.
+
+    Observations of the same instrument and source_index always land in the
+    same partition, and every instrument is split separately so that its
+    distribution doesn't change.
+
+    Example
+    -------
+    >>> partitioner = Partitioner(collection)
+    >>> for test_set, partition_df in partitioner.leave_one_out(0.2).items():
+    ...     partition_df.to_csv("{}_partitions.csv".format(test_set))
+    """
+
+    def __init__(self, collection):
+        """
+        Parameters
+        ----------
+        collection : Collection
+            Observations to partition.
+        """
+        self.collection = collection
+        self.group_codes, self.group_instruments, self.instruments = \
+            _encode_groups(collection._columns['instrument'],
+                           collection._columns['source_index'])
+
+    @property
+    def datasets(self):
+        """Datasets in the collection, in order of appearance."""
+        return [x for x in _factorize(self.collection._columns['dataset'])[1]
+                if x is not None]
+
+    def _groups(self, test_set):
+        """Encode the groups left once `test_set` is held out.
+
+        Returns
+        -------
+        test_rows, rows : np.ndarray, dtype=int
+            Row positions in and out of the test set.
+
+        groups : np.ndarray, dtype=int
+            Group of each of `rows`, renumbered to the groups present.
+
+        group_instruments : np.ndarray, dtype=int
+            Instrument (code) of each group present.
+        """
+        test_rows = self.collection.rows('dataset', test_set)
+        is_test = np.zeros(len(self.collection), dtype=bool)
+        is_test[test_rows] = True
+        rows = np.flatnonzero(~is_test)
+
+        present = np.zeros(len(self.group_instruments), dtype=bool)
+        present[self.group_codes[rows]] = True
+        renumber = np.cumsum(present) - 1
+        groups = renumber[self.group_codes[rows]]
+        return test_rows, rows, groups, self.group_instruments[present]
+
+    def _frame(self, train_rows, valid_rows, test_rows):
+        """Build the partition dataframe from row positions."""
+        order = np.concatenate([train_rows, valid_rows, test_rows])
+        partition = np.repeat(
+            _object_column(['train', 'valid', 'test']),
+            [len(train_rows), len(valid_rows), len(test_rows)])
+        return pd.DataFrame(dict(partition=partition),
+                            index=columnar.to_objects(
+                                self.collection._index[order]),
+                            columns=['partition'])
+
+    def holdout(self, test_set, train_val_split=0.2, max_files_per_class=None,
+                random_state=None):
+        """Partition with `test_set` held out for testing, and a random
+        train / valid split of the rest; see `partition_collection`.
+
+        Returns
+        -------
+        partition_df : pd.DataFrame
+        """
+        rng = check_random_state(random_state)
+        test_rows, rows, groups, group_instruments = self._groups(test_set)
+        valid_groups, counts = _split_groups(
+            group_instruments, len(self.instruments), train_val_split, rng)
+
+        for instrument in self.instruments[(counts > 0) & (counts < 2)]:
+            logger.warning("Instrument {} doesn't haven enough samples "
+                           "to split.".format(instrument))
+        keep = (counts >= 2)[group_instruments][groups]
+        valid = valid_groups[groups]
+        train_rows, valid_rows = rows[keep & ~valid], rows[keep & valid]
+
+        if max_files_per_class:
+            train_rows = _sample_per_class(
+                train_rows, group_instruments[groups][keep & ~valid],
+                max_files_per_class, rng)
+
+        return self._frame(train_rows, valid_rows, test_rows)
+
+    def hashed(self, test_set, train_val_split=0.2, salt='', existing=None):
+        """Deterministic partition, with `test_set` held out for testing,
+        and the rest assigned to train / valid by a salted hash of each
+        observation's source_index.
+
+        A source_index always lands on the same side of the split for a
+        given salt, whatever else is in the collection, so observations can
+        be partitioned incrementally: adding (or re-collecting) a dataset
+        never moves existing assignments.
+
+        Parameters
+        ----------
+        test_set : str
+            Dataset to hold out for testing.
+
+        train_val_split : float, default=0.2
+            Expected fraction of the source_index groups to use for
+            validation.
+
+        salt : str, default=''
+            Salt for the hash; change it to draw a different split.
+
+        existing : pd.DataFrame, or None
+            A previous partition of (some of) the observations. Its
+            assignments are kept as they are, and only the observations not
+            in it are partitioned and appended.
+
+        Returns
+        -------
+        partition_df : pd.DataFrame
+        """
+        rows = np.arange(len(self.collection))
+        if existing is not None:
+            rows = rows[~pd.Index(self.collection._index).isin(
+                existing.index)]
+        is_test = _equals(self.collection._columns['dataset'][rows],
+                          test_set)
+        test_rows, rows = rows[is_test], rows[~is_test]
+
+        valid = _stable_hash(self.collection._columns['source_index'][rows],
+                             salt) < train_val_split
+        partition_df = self._frame(rows[~valid], rows[valid], test_rows)
+        if existing is not None:
+            partition_df = pd.concat([existing[['partition']], partition_df])
+        return partition_df
+
+    def leave_one_out(self, train_val_split=0.2, max_files_per_class=None,
+                      random_state=None):
+        """Hold out each dataset in turn; see `holdout`.
+
+        Returns
+        -------
+        partitions : OrderedDict
+            Test set -> partition dataframe, for each dataset.
+        """
+        rng = check_random_state(random_state)
+        return OrderedDict(
+            (test_set, self.holdout(test_set, train_val_split,
+                                    max_files_per_class, rng))
+            for test_set in self.datasets)
+
+    def repeated(self, test_set, train_val_split=0.2, n_repeats=5,
+                 max_files_per_class=None, random_state=None):
+        """Independent random train / valid splits with `test_set` held out;
+        see `holdout`.
+
+        Returns
+        -------
+        partitions : list of pd.DataFrame
+            One partition dataframe per repeat.
+        """
+        rng = check_random_state(random_state)
+        return [self.holdout(test_set, train_val_split, max_files_per_class,
+                             rng) for _ in range(n_repeats)]
+
+    def kfold(self, test_set, n_folds=5, random_state=None):
+        """Grouped k-fold train / valid splits with `test_set` held out.
+
+        The groups of each instrument are shuffled and dealt out to the
+        folds in turn, so each fold gets (to within one group) the same
+        share of every instrument, and every group is in exactly one valid
+        fold.
+
+        Parameters
+        ----------
+        test_set : str
+            Dataset to hold out for testing.
+
+        n_folds : int, default=5
+            Number of folds; at least 2.
+
+        random_state : int, np.random.RandomState, or None
+            Seed for the random assignment.
+
+        Returns
+        -------
+        partitions : list of pd.DataFrame
+            One partition dataframe per fold.
+        """
+        if n_folds < 2:
+            raise ValueError("n_folds must be at least 2; got {}"
+                             "".format(n_folds))
+        rng = check_random_state(random_state)
+        test_rows, rows, groups, group_instruments = self._groups(test_set)
+        rank, _ = _rank_groups(group_instruments, len(self.instruments), rng)
+        folds = (rank % n_folds)[groups]
+        return [self._frame(rows[folds != k], rows[folds == k], test_rows)
+                for k in range(n_folds)]
+
+
 def partition_collection(collection, test_set, train_val_split=0.2,
-                         max_files_per_class=None):
+                         max_files_per_class=None, random_state=None,
+                         salt=None):
     """Returns Datasets for train and validation constructed
     from the datasets not in the test_set, and split with
     the ratio train_val_split.
@@ -257,68 +1746,107 @@ def partition_collection(collection, test_set, train_val_split=0.2,
      * First selects from only the datasets given in datasets.
      * Then **for each instrument** (so the distribution from
          each instrument doesn't change)
-        * train_test_split to generate training and validation sets.
+        * randomly assigns whole source_index groups to the training and
+            validation sets, in the ratio train_val_split.
         * if max_files_per_class, also then restrict the training set to
             a maximum of that number of files for each train and test
 
+    Everything works on integer codes for the instruments and groups, in a
+    single pass over the collection; use a `Partitioner` directly to make
+    several partitions of the same collection.
+
     Parameters
     ----------
     test_set : str
         String in ["rwc", "uiowa", "philharmonia"] which selects
         the hold-out-set to be used for testing.
 
+    train_val_split : float, default=0.2
+        Fraction of the groups of each instrument to use for validation.
+
+    max_files_per_class : int, or None
+        If given, sample this many training observations per instrument.
+
+    random_state : int, np.random.RandomState, or None
+        Seed for the random assignment.
+
+    salt : str, or None
+        If given, assign source_index groups deterministically by a hash
+        salted with this, instead of at random; see `Partitioner.hashed`.
+        Not compatible with `max_files_per_class`.
+
     Returns
     -------
     partition_df : pd.DataFrame
         DataFrame with only an index to the original table, and
         the partiition in ['train', 'valid', 'test']
     """
-    df = collection.to_dataframe()
-    test_df = collection.view(
-        column='dataset', filter_value=test_set).to_dataframe()
-    datasets = set(df["dataset"].unique()) - set([test_set])
-    search_df = df[df["dataset"].isin(datasets)]
-
-    selected_instruments_train = []
-    selected_instruments_valid = []
-    for instrument in search_df["instrument"].unique():
-        instrument_df = search_df[search_df["instrument"] == instrument]
-
-        if len(instrument_df) < 2:
-            logger.warning("Instrument {} doesn't haven enough samples "
-                           "to split.".format(instrument))
-            continue
+    if salt is not None:
+        if max_files_per_class:
+            raise ValueError("max_files_per_class can't be used with a "
+                             "hashed partition")
+        return Partitioner(collection).hashed(test_set, train_val_split, salt)
+    return Partitioner(collection).holdout(
+        test_set, train_val_split, max_files_per_class, random_state)
 
-        groups = instrument_df.groupby(['source_index'])
-        train_grps, valid_grps = train_test_split(
-            list(groups), test_size=train_val_split)
 
-        # Groups get backed out as (source_index, dataframe) tuples, so stick
-        # these back together now that they've been partitioned.
-        traindf = pd.concat(x[1] for x in train_grps)
-        validdf = pd.concat(x[1] for x in valid_grps)
+def audit_partition(index, partition_df, group_column='source_index',
+                    class_column='instrument'):
+    """Check a partition for leakage between partitions, and its balance.
 
-        if max_files_per_class:
-            replace = False if len(traindf) > max_files_per_class else True
-            traindf = traindf.sample(n=max_files_per_class,
-                                     replace=replace)
+    Everything is joined through hash tables (`pd.Index`, `pd.factorize`)
+    and counted with `np.bincount`, so this scales to millions of rows.
 
-        selected_instruments_train.append(traindf)
-        selected_instruments_valid.append(validdf)
+    Parameters
+    ----------
+    index : Collection or pd.DataFrame
+        The observations that were partitioned; a dataframe only needs the
+        `group_column` and `class_column` columns.
 
-    train_df = pd.concat(selected_instruments_train)
-    valid_df = pd.concat(selected_instruments_valid)
+    partition_df : pd.DataFrame
+        Partition of (some of) the collection, with a `partition` column;
+        e.g. from `partition_collection`. Repeated rows (from resampling)
+        are counted as many times as they appear.
+
+    group_column : str, default='source_index'
+        Observations that must not be split between partitions.
 
-    # Create the final dataframe
-    partition = (['train'] * len(train_df) +
-                 ['valid'] * len(valid_df) +
-                 ['test'] * len(test_df))
+    class_column : str, default='instrument'
+        Column to count the balance of.
 
-    index = (train_df.index.tolist() +
-             valid_df.index.tolist() +
-             test_df.index.tolist())
+    Returns
+    -------
+    report : dict
+        leakage : pd.DataFrame
+            Observation counts per partition (columns) for each group found
+            in more than one partition (index); empty if there's no leakage.
+        balance : pd.DataFrame
+            Observation counts per partition (columns) for each class
+            (index).
+        missing : list
+            Indexes in the partition that aren't in the collection.
+    """
+    if isinstance(index, Collection):
+        index = index.to_dataframe()
+    positions = index.index.get_indexer(partition_df.index)
+    found = positions >= 0
+    missing = partition_df.index[~found].tolist()
+    positions = positions[found]
+
+    part_codes, partitions = _factorize(
+        np.asarray(partition_df['partition'].values)[found])
+    n_parts = max(len(partitions), 1)
+
+    def counts(column):
+        codes, uniques = _factorize(
+            np.asarray(index[column].values)[positions])
+        table = np.bincount(codes * n_parts + part_codes,
+                            minlength=len(uniques) * n_parts)
+        return pd.DataFrame(table.reshape(len(uniques), n_parts)[:, :len(
+            partitions)], index=uniques, columns=partitions)
+
+    groups = counts(group_column)
+    leakage = groups[(groups.values > 0).sum(axis=1) > 1]
+    return dict(leakage=leakage, balance=counts(class_column),
+                missing=missing)
 
-    result = pd.DataFrame(partition,
-                          columns=['partition'],
-                          index=index)
-    return result
@@ -1,24 +1,105 @@
 import claudio
+import itertools
 import librosa
 import logging
 import numpy as np
 import os
 import pandas as pd
 import scipy.signal as sig
+import scipy.ndimage
+import scipy.sparse
 import shutil
+import wave
 
+import minst.cache as cache
 import minst.hll as H
 import minst.utils as utils
 
 logger = logging.getLogger(__name__)
 
+# Filter banks for `fast_cqt`, by configuration; see `cqt_filter_bank`.
+_CQT_FILTER_BANKS = dict()
 
-def hll_onsets(filename, mfilt_len=51, threshold=0.5, wait=100):
-    time_points, freqs, amps = H.hll(filename)
+# Frame rate of `envelope_onsets`, in samples.
+ENVELOPE_HOP = 100
+
+
+HLL_PARAMS = ('mfilt_len', 'threshold', 'wait')
+
+
+def hll_onsets(filename, mfilt_len=51, threshold=0.5, wait=100,
+               context=None, backend=None):
+    """
+    Parameters
+    ----------
+    filename : str
+        Path to an audiofile to split.
+
+    mfilt_len, threshold, wait
+        Post-processing parameters for the HLL tracks; see
+        `hll_track_onsets`.
+
+    context : AnalysisContext, or None
+        Analyses of `filename` to reuse, if any.
+
+    backend : str, or None
+        HLL tracker to use; see `minst.hll.get_tracker`.
+
+    Returns
+    -------
+    onsets : np.ndarray, ndim=1
+        Times in seconds for splitting.
+    """
+    context = AnalysisContext(filename) if context is None else context
+    time_points, freqs, amps = context.hll(backend)
+    return hll_track_onsets(time_points, freqs, amps, mfilt_len, threshold,
+                            wait)
+
+
+def hll_track_onsets(time_points, freqs, amps, mfilt_len=51, threshold=0.5,
+                     wait=100):
+    """Detect onsets from HLL tracks, as the rising edges of their voicing.
+
+    Parameters
+    ----------
+    time_points, freqs, amps : np.ndarray
+        HLL tracks; see `minst.hll.hll`.
+
+    mfilt_len : int
+        Length of the median filter over the frequencies and amplitudes.
+
+    threshold : float
+        Smallest product of frequency and amplitude of a voiced frame.
+
+    wait : int
+        Number of frames to wait after an onset.
+
+    Returns
+    -------
+    onsets : np.ndarray, ndim=1
+        Times in seconds for splitting.
+
+    Notes
+    -----
+    `mfilt_len` and `wait` count points of the binary's grid (44.1kHz), so
+    coarser tracks, e.g. the numpy tracker's, are held onto it first.
+    """
+    time_points, freqs, amps = _binary_grid(time_points, freqs, amps)
     freqs = sig.medfilt(freqs, mfilt_len)
     amps = sig.medfilt(amps, mfilt_len)
+    return _voicing_onsets(time_points, freqs * amps, threshold, wait)
+
+
+def _binary_grid(time_points, freqs, amps):
+    """Hold tracks coarser than the binary's onto its grid."""
+    rate = H.BinaryTracker.SAMPLERATE
+    if len(time_points) > 1 and time_points[1] - time_points[0] > 1.5 / rate:
+        return H.hold_tracks(time_points, freqs, amps, rate)
+    return time_points, freqs, amps
 
-    voicings = (freqs * amps) > threshold
+
+def _voicing_onsets(time_points, voicing, threshold, wait):
+    voicings = voicing > threshold
     c_n = utils.canny(25, 3.5, 1)
 
     novelty = sig.lfilter(c_n, [1], voicings > .5)
@@ -37,9 +118,210 @@ def hll_onsets(filename, mfilt_len=51, threshold=0.5, wait=100):
     return onset_times  # , novelty, onsets, voicings
 
 
-def logcqt(x, fs, hop_length=1024):
+def sweep_hll_onsets(filename, context=None, backend=None, **grid):
+    """Detect onsets for every combination of a grid of HLL post-processing
+    parameters, from a single (cached) tracking of the file.
+
+    Parameters
+    ----------
+    filename : str
+        Path to an audiofile.
+
+    context : AnalysisContext, or None
+        Analyses of `filename` to reuse, if any.
+
+    backend : str, or None
+        HLL tracker to use; see `minst.hll.get_tracker`.
+
+    grid : dict
+        Any of `HLL_PARAMS`, as a value or a list of values; the rest
+        default to those of `hll_onsets`.
+
+    Returns
+    -------
+    onsets : pd.DataFrame
+        One row per combination (in the order of `HLL_PARAMS`), with a
+        column per parameter and the onset times (in seconds) under
+        `onsets`. These match `hll_onsets` with the same parameters.
     """
+    unknown = set(grid) - set(HLL_PARAMS)
+    if unknown:
+        raise ValueError("Unknown parameters: {}".format(sorted(unknown)))
+    context = AnalysisContext(filename) if context is None else context
+    time_points, freqs, amps = _binary_grid(*context.hll(backend))
+    params = dict(dict(mfilt_len=51, threshold=0.5, wait=100), **grid)
+    values = [np.atleast_1d(params[name]).tolist() for name in HLL_PARAMS]
+
+    voicing = dict((mfilt_len, sig.medfilt(freqs, mfilt_len) *
+                    sig.medfilt(amps, mfilt_len))
+                   for mfilt_len in values[0])
+    records = []
+    for mfilt_len, threshold, wait in itertools.product(*values):
+        records.append(dict(
+            mfilt_len=mfilt_len, threshold=threshold, wait=wait,
+            onsets=_voicing_onsets(time_points, voicing[mfilt_len],
+                                   threshold, wait)))
+    return pd.DataFrame.from_records(records,
+                                     columns=list(HLL_PARAMS) + ['onsets'])
+
+
+def cqt_filter_bank(sr, hop_length, fmin=27.5, n_bins=24 * 8,
+                    bins_per_octave=24, sparsity=0.01):
+    """Build (or fetch from the cache) the filter bank for `fast_cqt`.
+
+    Each octave is analyzed at the lowest samplerate that leaves it below
+    half of Nyquist (and divides `hop_length`), so every octave has short
+    kernels. The kernels are Hann-windowed complex sinusoids, L1-normalized
+    and then scaled by the square root of their length at the input
+    samplerate, like `librosa.cqt(..., norm=1, scale=True)`, and stored as
+    sparse, single precision FFT-domain matrices with the smallest
+    coefficients (`sparsity` of each kernel's mass) dropped.
+
+    Returns
+    -------
+    octaves : list of dict
+        Per octave, from the lowest: `bins` (indices of the output rows),
+        `decimation` (factor), `n_fft`, `kernels` (sparse, bins x
+        n_fft // 2 + 1) and `noise_gain` (RMS response, per bin, to unit
+        variance white noise at the input).
     """
+    key = (sr, hop_length, fmin, n_bins, bins_per_octave, sparsity)
+    if key in _CQT_FILTER_BANKS:
+        return _CQT_FILTER_BANKS[key]
+
+    Q = 1.0 / (2.0 ** (1.0 / bins_per_octave) - 1)
+    freqs = fmin * 2.0 ** (np.arange(n_bins) / float(bins_per_octave))
+    octaves = []
+    for start in range(0, n_bins, bins_per_octave):
+        bins = np.arange(start, min(start + bins_per_octave, n_bins))
+        decimation = 1
+        while (hop_length % (2 * decimation) == 0 and
+               sr / (2.0 * decimation) >= 4 * freqs[bins[-1]]):
+            decimation *= 2
+        sr_d = sr / float(decimation)
+
+        lengths = np.ceil(Q * sr_d / freqs[bins]).astype(int)
+        scales = np.sqrt(Q * sr / freqs[bins])
+        n_fft = int(2 ** np.ceil(np.log2(lengths.max())))
+        kernels = np.zeros((len(bins), n_fft), dtype=np.complex128)
+        for row, (freq, length, scale) in enumerate(
+                zip(freqs[bins], lengths, scales)):
+            n = np.arange(length) - (length - 1) / 2.0
+            kernel = np.hanning(length) * np.exp(2j * np.pi * freq * n / sr_d)
+            offset = (n_fft - length) // 2
+            kernels[row, offset:offset + length] = scale * kernel / np.abs(
+                kernel).sum()
+
+        # Decimated white noise keeps 1 / decimation of its variance.
+        noise_gain = np.sqrt((np.abs(kernels) ** 2).sum(axis=1) / decimation)
+
+        # The kernels are analytic, so only the positive frequencies count.
+        spectra = np.fft.fft(kernels, axis=1)[:, :n_fft // 2 + 1] / n_fft
+        mags = np.abs(spectra)
+        for row in range(len(bins)):
+            order = np.argsort(mags[row])
+            mass = np.cumsum(mags[row, order])
+            drop = np.searchsorted(mass, sparsity * mass[-1])
+            spectra[row, order[:drop]] = 0
+
+        octaves.append(dict(
+            bins=bins, decimation=decimation, n_fft=n_fft,
+            kernels=scipy.sparse.csr_matrix(
+                np.conj(spectra).astype(np.complex64)),
+            noise_gain=noise_gain.astype(np.float32)))
+
+    _CQT_FILTER_BANKS[key] = octaves
+    return octaves
+
+
+def fast_cqt(x, fs, hop_length=1024, fmin=27.5, n_bins=24 * 8,
+             bins_per_octave=24, dither=0.0, block_size=2 ** 20):
+    """Approximate, single precision constant-Q magnitude spectrogram.
+
+    Octaves are analyzed from the top down, halving the samplerate of the
+    signal as they go, with sparse kernels from `cqt_filter_bank`. Frames
+    are centered on multiples of `hop_length`, as for `librosa.cqt`.
+
+    Parameters
+    ----------
+    x : np.ndarray
+        Audio signal.
+
+    fs : scalar
+        Samplerate of the audio signal.
+
+    hop_length, fmin, n_bins, bins_per_octave
+        See `librosa.cqt`.
+
+    dither : float, default=0.0
+        Standard deviation of white noise to add to the signal. Rather than
+        adding actual noise, its expected power is added to the output.
+
+    block_size : int
+        Approximate number of samples to transform at a time.
+
+    Returns
+    -------
+    cqt : np.ndarray, dtype=np.float32, shape=(n_bins, 1 + len(x) // hop)
+        Magnitudes.
+    """
+    x = np.asarray(x, dtype=np.float32).ravel()
+    n_frames = 1 + len(x) // hop_length
+    cqt = np.empty((n_bins, n_frames), dtype=np.float32)
+
+    decimation = 1
+    for octave in cqt_filter_bank(fs, hop_length, fmin, n_bins,
+                                  bins_per_octave)[::-1]:
+        while decimation < octave['decimation']:
+            x = sig.resample_poly(x, 1, 2).astype(np.float32)
+            decimation *= 2
+        n_fft, hop = octave['n_fft'], hop_length // decimation
+        pad_end = max(n_fft // 2, (n_frames - 1) * hop + n_fft - len(x))
+        x_pad = np.pad(x, (n_fft // 2, pad_end), mode='constant')
+        block_frames = max(1, block_size // n_fft)
+
+        for t0 in range(0, n_frames, block_frames):
+            t1 = min(t0 + block_frames, n_frames)
+            frames = np.lib.stride_tricks.as_strided(
+                x_pad[t0 * hop:], shape=(t1 - t0, n_fft),
+                strides=(hop * x_pad.strides[0], x_pad.strides[0]))
+            spectra = np.fft.rfft(frames, axis=1).astype(np.complex64)
+            cqt[octave['bins'], t0:t1] = np.abs(
+                octave['kernels'].dot(spectra.T))
+
+        if dither:
+            floor = (dither * octave['noise_gain'][:, np.newaxis]) ** 2
+            cqt[octave['bins']] = np.sqrt(cqt[octave['bins']] ** 2 + floor)
+    return cqt
+
+
+def logcqt(x, fs, hop_length=1024, fast=False):
+    """
+    Parameters
+    ----------
+    x : np.ndarray
+        Audio signal
+
+    fs : scalar
+        Samplerate of the audio signal.
+
+    hop_length : int
+        Hop size, in samples.
+
+    fast : bool, default=False
+        If True, use the approximate, single precision `fast_cqt`; the
+        dither is then added as expected power rather than as noise.
+
+    Returns
+    -------
+    lcqt : np.ndarray, shape=(192, n_frames)
+        Log-compressed constant-Q magnitudes.
+    """
+    if fast:
+        cqt = fast_cqt(x, fs, hop_length=hop_length, fmin=27.5,
+                       n_bins=24 * 8, bins_per_octave=24, dither=10.**-3)
+        return np.log1p(5000 * cqt)
+
     x_noise = x + np.random.normal(scale=10.**-3, size=x.shape)
     cqt = librosa.cqt(x_noise.flatten(),
                       sr=fs, hop_length=hop_length, fmin=27.5,
@@ -51,7 +333,8 @@ def logcqt(x, fs, hop_length=1024):
 
 
 def logcqt_onsets(x, fs, pre_max=0, post_max=1, pre_avg=0,
-                  post_avg=1, delta=0.05, wait=50, hop_length=1024):
+                  post_avg=1, delta=0.05, wait=50, hop_length=1024,
+                  context=None, fast=False):
     """
     Parameters
     ----------
@@ -64,50 +347,226 @@ def logcqt_onsets(x, fs, pre_max=0, post_max=1, pre_avg=0,
     pre_max, post_max, pre_avg, post_avg, delta, wait
         See `librosa.util.peak_pick` for details.
 
+    context : AnalysisContext, or None
+        Analyses of `x` to reuse, if any.
+
+    fast : bool, default=False
+        If True, use the fast, approximate CQT; see `logcqt`.
+
     Returns
     -------
     onsets : np.ndarray, ndim=1
         Times in seconds for splitting.
     """
-    lcqt = logcqt(x, fs, hop_length)
-    c_n = utils.canny(51, 3.5, 1)
-    onset_strength = sig.lfilter(c_n, np.ones(1), lcqt, axis=1).mean(axis=0)
-
+    context = AnalysisContext(x=x, fs=fs) if context is None else context
+    onset_strength = context.logcqt_onset_strength(hop_length, fast)
     peak_idx = librosa.onset.onset_detect(
         onset_envelope=onset_strength, delta=delta, wait=wait)
     return librosa.frames_to_time(peak_idx, hop_length=hop_length)
 
 
-def envelope_onsets(x, fs, wait=100):
+def envelope_onsets(x, fs, wait=100, context=None, multirate=False):
     """
     Parameters
     ----------
-    filename : str
-        Path to an audiofile to split.
+    x : np.ndarray
+        Audio signal
+
+    fs : scalar
+        Samplerate of the audio signal.
+
+    wait : int
+        See `librosa.util.peak_pick` for details.
+
+    context : AnalysisContext, or None
+        Analyses of `x` to reuse, if any.
+
+    multirate : bool, default=False
+        If True, only compute the envelope at the frame rate; see
+        `decimated_log_envelope`. Onset times agree with the full-rate
+        computation to within one frame (n_hop=100 samples), apart from
+        onsets in the first or last few frames of the signal.
 
     Returns
     -------
     onsets : np.ndarray, ndim=1
         Times in seconds for splitting.
     """
+    context = AnalysisContext(x=x, fs=fs) if context is None else context
+    onsets_pos = context.envelope_onset_strength(multirate)
+    peak_idx = librosa.util.peak_pick(onsets_pos,
+                                      pre_max=500, post_max=500, pre_avg=10,
+                                      post_avg=10, delta=0.025, wait=wait)
+    return librosa.frames_to_time(peak_idx, hop_length=ENVELOPE_HOP)
 
-    log_env = 10 * np.log10(10. ** -4.5 + np.power(x.flatten()[:], 2.0))
-    w_n = np.hanning(100)
-    w_n /= w_n.sum()
-    log_env_lpf = sig.filtfilt(w_n, np.ones(1), log_env)
 
-    n_hop = 100
+def logcqt_onset_strength(x, fs, hop_length=1024, context=None, fast=False):
+    """Onset strength of `logcqt_onsets`, one value per frame.
+
+    Parameters
+    ----------
+    x, fs, hop_length, context, fast
+        See `logcqt_onsets`.
+
+    Returns
+    -------
+    onset_strength : np.ndarray, ndim=1
+        Before the normalization of `librosa.onset.onset_detect`.
+    """
+    context = AnalysisContext(x=x, fs=fs) if context is None else context
+    lcqt = context.logcqt(hop_length, fast)
+    c_n = utils.canny(51, 3.5, 1)
+    return sig.lfilter(c_n, np.ones(1), lcqt, axis=1).mean(axis=0)
+
+
+def envelope_onset_strength(x, fs, context=None, multirate=False):
+    """Onset strength of `envelope_onsets`, one value per `ENVELOPE_HOP`
+    samples.
+
+    Parameters
+    ----------
+    x, fs, context, multirate
+        See `envelope_onsets`.
+
+    Returns
+    -------
+    onsets_pos : np.ndarray, ndim=1
+        Half-wave rectified derivative of the smoothed log envelope.
+    """
+    context = AnalysisContext(x=x, fs=fs) if context is None else context
+    if multirate:
+        log_env_frames = context.decimated_log_envelope(100, ENVELOPE_HOP)
+        env_min = log_env_frames.min()
+    else:
+        log_env_lpf = context.log_envelope(100)
+        log_env_frames = log_env_lpf[::ENVELOPE_HOP]
+        env_min = log_env_lpf.min()
+
     kernel = utils.canny(100, 3.5, 1)
     kernel /= np.abs(kernel).sum()
     onsets_forward = sig.lfilter(
-        kernel, np.ones(1),
-        log_env_lpf[::n_hop] - log_env_lpf.min(), axis=0)
+        kernel, np.ones(1), log_env_frames - env_min, axis=0)
+    return onsets_forward * (onsets_forward > 0)
 
-    onsets_pos = onsets_forward * (onsets_forward > 0)
-    peak_idx = librosa.util.peak_pick(onsets_pos,
-                                      pre_max=500, post_max=500, pre_avg=10,
-                                      post_avg=10, delta=0.025, wait=wait)
-    return librosa.frames_to_time(peak_idx, hop_length=n_hop)
+
+# Peak picking parameters of the detectors, as used by `sweep_onsets`; for
+# logcqt, those `librosa.onset.onset_detect` uses with its default sr and
+# hop_length.
+PEAK_PICK_PARAMS = ('pre_max', 'post_max', 'pre_avg', 'post_avg', 'delta',
+                    'wait')
+PEAK_PICK = {
+    'envelope': dict(pre_max=500, post_max=500, pre_avg=10, post_avg=10,
+                     delta=0.025, wait=100),
+    'logcqt': dict(pre_max=1, post_max=1, pre_avg=4, post_avg=5, delta=0.05,
+                   wait=50)
+}
+
+
+def sweep_peak_pick(x, **grid):
+    """Pick peaks for every combination of a grid of parameters.
+
+    Moving maxima and averages are computed once per distinct window, and
+    thresholds and waits are applied to the (few) local maxima, so a whole
+    grid costs little more than a single `librosa.util.peak_pick`, with
+    the same results.
+
+    Parameters
+    ----------
+    x : np.ndarray, ndim=1
+        Onset strength.
+
+    grid : dict
+        Each of `PEAK_PICK_PARAMS`, as a value or a list of values.
+
+    Returns
+    -------
+    peaks : list of (dict, np.ndarray)
+        Parameters and peak indices, for the product of the grid (in the
+        order of `PEAK_PICK_PARAMS`).
+    """
+    missing = set(PEAK_PICK_PARAMS) - set(grid)
+    if missing:
+        raise ValueError("Missing parameters: {}".format(sorted(missing)))
+    values = [np.atleast_1d(grid[name]).tolist() for name in PEAK_PICK_PARAMS]
+    if min(values[1] + values[3]) < 1:
+        raise ValueError("post_max and post_avg must be positive")
+
+    x = np.asarray(x, dtype=np.float64)
+    # Zeros are never peaks (librosa only keeps the nonzero detections);
+    # otherwise, with delta=0, every run of zeros would be one.
+    nonzero = x != 0
+    maxima = dict(((pre, post), np.flatnonzero(
+        (x == _moving_max(x, pre, post)) & nonzero))
+        for pre in values[0] for post in values[1])
+    excess = dict(((pre, post), x - _moving_mean(x, pre, post))
+                  for pre in values[2] for post in values[3])
+
+    peaks = []
+    for params in itertools.product(*values):
+        pre_max, post_max, pre_avg, post_avg, delta, wait = params
+        idx = maxima[pre_max, post_max]
+        idx = idx[excess[pre_avg, post_avg][idx] >= delta]
+        peaks.append((dict(zip(PEAK_PICK_PARAMS, params)),
+                      _wait(idx, int(wait))[0]))
+    return peaks
+
+
+def sweep_onsets(x, fs, mode, context=None, hop_length=1024, fast=False,
+                 multirate=False, **grid):
+    """Detect onsets for every combination of a grid of peak picking
+    parameters, from a single onset strength.
+
+    Parameters
+    ----------
+    x : np.ndarray
+        Audio signal.
+
+    fs : scalar
+        Samplerate of the audio signal.
+
+    mode : str
+        Either 'envelope' or 'logcqt'.
+
+    context : AnalysisContext, or None
+        Analyses of `x` to reuse, if any; the onset strength is kept there.
+
+    hop_length, fast
+        See `logcqt_onsets`; for logcqt only.
+
+    multirate : bool
+        See `envelope_onsets`; for envelope only.
+
+    grid : dict
+        Any of `PEAK_PICK_PARAMS`, as a value or a list of values; the rest
+        default to those of the detector (see `PEAK_PICK`).
+
+    Returns
+    -------
+    onsets : pd.DataFrame
+        One row per combination, with a column per parameter and the onset
+        times (in seconds) under `onsets`. With the defaults, these match
+        `envelope_onsets` or `logcqt_onsets`.
+    """
+    if mode not in PEAK_PICK:
+        raise ValueError("Unsupported mode: {}".format(mode))
+    context = AnalysisContext(x=x, fs=fs) if context is None else context
+    params = dict(PEAK_PICK[mode], **grid)
+    if mode == 'envelope':
+        onset_strength = context.envelope_onset_strength(multirate)
+        hop_length = ENVELOPE_HOP
+    else:
+        # Normalized, as by `onset_detect`.
+        onset_strength = context.logcqt_onset_strength(hop_length, fast)
+        onset_strength = onset_strength - onset_strength.min()
+        onset_strength /= onset_strength.max() + np.finfo(float).tiny
+
+    records = []
+    for record, peak_idx in sweep_peak_pick(onset_strength, **params):
+        record['onsets'] = librosa.frames_to_time(peak_idx,
+                                                  hop_length=hop_length)
+        records.append(record)
+    return pd.DataFrame.from_records(
+        records, columns=list(PEAK_PICK_PARAMS) + ['onsets'])
 
 
 ONSETS = {
@@ -124,28 +583,673 @@ def log_envelope(x, fs, filt_len=100):
     return sig.filtfilt(w_n, np.ones(1), log_env)
 
 
-def segment(audio_file, mode, db_delta_thresh=2.5, **kwargs):
-    x, fs = claudio.read(audio_file, samplerate=22050, channels=1, bytedepth=2)
+def _reflect(x, start, stop):
+    """Return x[start:stop], extending x past its ends by odd reflection
+    (as `scipy.signal.filtfilt` pads)."""
+    n = len(x)
+    idx = np.arange(start, stop)
+    below, above = idx < 0, idx >= n
+    values = x[np.clip(idx, 0, n - 1)].astype(np.float64)
+    values[below] = 2 * x[0] - x[np.minimum(-idx[below], n - 1)]
+    values[above] = 2 * x[-1] - x[np.maximum(2 * (n - 1) - idx[above], 0)]
+    return values
+
+
+def decimated_log_envelope(x, fs, filt_len=100, n_hop=100,
+                           block_frames=4096):
+    """Compute `log_envelope(x, fs, filt_len)[::n_hop]` at the frame rate.
+
+    The zero-phase smoothing of `log_envelope` (a Hann window, forwards and
+    backwards) is one symmetric FIR filter, so it's only evaluated at the
+    output frames, and the signal is processed a block of frames at a time.
+    Memory scales with the number of frames, and no full-length
+    intermediate arrays are made.
+
+    The result matches the full-rate computation to within floating point
+    error, except for the first and last few frames, which differ slightly
+    as `filtfilt` pads the ends differently.
+
+    Parameters
+    ----------
+    x : np.ndarray
+        Audio signal.
+
+    fs : scalar
+        Samplerate of the audio signal.
+
+    filt_len : int
+        Length of the smoothing window.
+
+    n_hop : int
+        Decimation factor, in samples.
+
+    block_frames : int
+        Number of output frames to compute at a time.
+
+    Returns
+    -------
+    log_env_lpf : np.ndarray, len=ceil(len(x) / n_hop)
+        Smoothed log envelope, in dB, at every `n_hop`-th sample.
+    """
+    x = x.ravel()
+    w_n = np.hanning(filt_len)
+    w_n /= w_n.sum()
+    h_n = np.convolve(w_n, w_n)
+    center = filt_len - 1
+
+    n_frames = (len(x) + n_hop - 1) // n_hop
+    log_env_lpf = np.empty(n_frames)
+    for k0 in range(0, n_frames, block_frames):
+        k1 = min(k0 + block_frames, n_frames)
+        # Output frame k needs the samples within `center` of k * n_hop.
+        start = k0 * n_hop - center
+        x_m = _reflect(x, start, (k1 - 1) * n_hop + center + 1)
+        log_env = 10 * np.log10(10.**-4.5 + x_m ** 2.0)
+        windows = np.lib.stride_tricks.as_strided(
+            log_env, shape=(k1 - k0, len(h_n)),
+            strides=(n_hop * log_env.strides[0], log_env.strides[0]))
+        log_env_lpf[k0:k1] = windows.dot(h_n[::-1])
+    return log_env_lpf
+
+
+class AnalysisContext(object):
+    """Memoized analyses of one audio signal.
+
+    Decoding, and each transform (per set of parameters), runs at most once
+    over the lifetime of the context, so detectors and statistics drawing
+    from the same context share the work.
+
+    Example
+    -------
+    >>> context = AnalysisContext(audio_file)
+    >>> onsets = envelope_onsets(*context.signal, context=context)
+    >>> log_env_lpf = context.log_envelope(100)  # Already computed.
+    """
+    SAMPLERATE = 22050
+
+    def __init__(self, audio_file=None, x=None, fs=None, hll=None):
+        """
+        Parameters
+        ----------
+        audio_file : str, or None
+            Audio file to analyze; decoded (mono, at `SAMPLERATE`) on first
+            use. Required for the HLL tracks.
+
+        x : np.ndarray, or None
+            Already decoded audio signal, if any.
+
+        fs : scalar, or None
+            Samplerate of `x`.
+
+        hll : tuple of np.ndarray, or None
+            Already computed HLL tracks of the default backend, if any, as
+            from `minst.hll.TrackerPool`.
+        """
+        if audio_file is None and x is None:
+            raise ValueError("Either an audio_file or a signal is required")
+        self.audio_file = audio_file
+        self._cache = dict()
+        if x is not None:
+            self._cache['signal'] = (x, fs)
+        if hll is not None:
+            self._cache[('hll', None)] = tuple(hll)
+
+    def _memoize(self, key, func, *args, **kwargs):
+        if key not in self._cache:
+            self._cache[key] = func(*args, **kwargs)
+        return self._cache[key]
+
+    @property
+    def signal(self):
+        """The decoded audio signal, as (x, fs); see `minst.cache.read`."""
+        return self._memoize('signal', cache.read, self.audio_file,
+                             samplerate=self.SAMPLERATE, channels=1,
+                             bytedepth=2)
+
+    def log_envelope(self, filt_len=100):
+        """See `log_envelope`."""
+        return self._memoize(('log_envelope', filt_len), log_envelope,
+                             self.signal[0], self.signal[1], filt_len)
+
+    def decimated_log_envelope(self, filt_len=100, n_hop=100):
+        """See `decimated_log_envelope`; decimates `log_envelope` instead,
+        if that's already been computed."""
+        if ('log_envelope', filt_len) in self._cache:
+            return self.log_envelope(filt_len)[::n_hop]
+        return self._memoize(('decimated_log_envelope', filt_len, n_hop),
+                             decimated_log_envelope, self.signal[0],
+                             self.signal[1], filt_len, n_hop)
+
+    def logcqt(self, hop_length=1024, fast=False):
+        """See `logcqt`."""
+        return self._memoize(('logcqt', hop_length, fast), logcqt,
+                             self.signal[0], self.signal[1], hop_length,
+                             fast)
+
+    def logcqt_onset_strength(self, hop_length=1024, fast=False):
+        """See `logcqt_onset_strength`."""
+        return self._memoize(('logcqt_onset_strength', hop_length, fast),
+                             logcqt_onset_strength, self.signal[0],
+                             self.signal[1], hop_length, self, fast)
+
+    def envelope_onset_strength(self, multirate=False):
+        """See `envelope_onset_strength`."""
+        return self._memoize(('envelope_onset_strength', multirate),
+                             envelope_onset_strength, self.signal[0],
+                             self.signal[1], self, multirate)
+
+    def hll(self, backend=None):
+        """HLL tracks of the audio file, as (time_points, freqs, amps),
+        through the track cache; see `minst.hll.hll`. In-process trackers
+        at `SAMPLERATE` reuse the decoded signal."""
+        key = ('hll', backend if backend is None else str(backend))
+        if key in self._cache:
+            return self._cache[key]
+        if self.audio_file is None:
+            raise ValueError("HLL tracking requires an audio_file")
+        tracker = H.get_tracker(backend)
+        if tracker.IN_PROCESS and tracker.SAMPLERATE == self.SAMPLERATE:
+            def track():
+                return tracker.track(*self.signal)
+        else:
+            def track():
+                return tracker.track_file(self.audio_file)
+        track_cache = cache.default_track_cache()
+        if track_cache is None:
+            return self._memoize(key, track)
+        return self._memoize(key, track_cache.read, self.audio_file,
+                             tracker.signature(), track)
+
+
+def iter_audio_blocks(audio, block_size=2 ** 18, samplerate=22050):
+    """Iterate over a mono audio signal in consecutive blocks of samples.
+
+    Files already in the decoded audio cache (see `minst.cache`) are read
+    from there. Others are converted to a temporary, mono 16-bit WAV file at
+    `samplerate` (as `claudio.read` does), which is then read a block at a
+    time, so the decoded signal is never held in memory.
+
+    Parameters
+    ----------
+    audio : str or np.ndarray
+        Audio file, or an already decoded signal.
+
+    block_size : int
+        Number of samples per block.
+
+    samplerate : scalar
+        Samplerate to decode files at.
+
+    Yields
+    ------
+    block : np.ndarray, ndim=1
+        Up to `block_size` samples, in [-1, 1) for files.
+    """
+    if isinstance(audio, np.ndarray):
+        x = audio.ravel()
+        for start in range(0, len(x), block_size):
+            yield x[start:start + block_size]
+        return
+
+    cached = cache.lookup(audio, samplerate=samplerate, channels=1,
+                          bytedepth=2)
+    if cached is not None:
+        for block in iter_audio_blocks(cached, block_size):
+            yield block
+        return
+
+    tempfile = claudio.util.temp_file('.wav')
+    try:
+        claudio.sox.convert(audio, tempfile, samplerate=samplerate,
+                            channels=1, bytedepth=2)
+        reader = wave.open(tempfile, 'rb')
+        try:
+            while True:
+                data = reader.readframes(block_size)
+                if not data:
+                    break
+                yield np.frombuffer(data, dtype='<i2') / 32768.0
+        finally:
+            reader.close()
+    finally:
+        if os.path.exists(tempfile):
+            os.remove(tempfile)
+
+
+def _moving_max(x, pre_max, post_max):
+    """Return max(x[n - pre_max:n + post_max]) for every n, with the window
+    clipped to x, as in `librosa.util.peak_pick`."""
+    return scipy.ndimage.maximum_filter1d(
+        x, pre_max + post_max, mode='constant', cval=-np.inf,
+        origin=int(np.ceil(0.5 * (pre_max - post_max))))
+
+
+def _moving_mean(x, pre_avg, post_avg):
+    """Return mean(x[n - pre_avg:n + post_avg]) for every n, with the window
+    clipped to x, as in `librosa.util.peak_pick`."""
+    cumsum = np.concatenate([[0], np.cumsum(x)])
+    n = np.arange(len(x))
+    lo = np.maximum(n - pre_avg, 0)
+    hi = np.minimum(n + post_avg, len(x))
+    return (cumsum[hi] - cumsum[lo]) / (hi - lo)
+
+
+def _wait(idx, wait, last=None):
+    """Greedily keep the peaks more than `wait` frames after the last kept
+    one; returns the peaks and the new last one."""
+    peaks = []
+    for n in idx:
+        if last is None or n > last + wait:
+            peaks.append(n)
+            last = n
+    return np.asarray(peaks, dtype=int), last
+
+
+class PeakPicker(object):
+    """Incremental version of `librosa.util.peak_pick`.
+
+    Values are pushed a block at a time, and each peak is returned as soon
+    as the values after it (`post_max` and `post_avg`) have arrived. Only
+    the values within reach of the undecided frames are kept.
+
+    As in `librosa.onset.onset_detect`, `normalize` rescales the input to
+    [0, 1] before thresholding. That needs the range of the whole input, so
+    the local maxima are kept instead, and all peaks are returned by
+    `finish`.
+    """
+
+    def __init__(self, pre_max, post_max, pre_avg, post_avg, delta, wait,
+                 normalize=False):
+        """
+        Parameters
+        ----------
+        pre_max, post_max, pre_avg, post_avg, delta, wait
+            See `librosa.util.peak_pick`.
+
+        normalize : bool, default=False
+            If True, `delta` is relative to the range of the input.
+        """
+        if post_max < 1 or post_avg < 1:
+            raise ValueError("post_max and post_avg must be positive")
+        self.pre_max, self.post_max = int(pre_max), int(post_max)
+        self.pre_avg, self.post_avg = int(pre_avg), int(post_avg)
+        self.delta, self.wait = delta, int(wait)
+        self.normalize = normalize
+
+        self._x = np.empty(0)
+        self._start = 0
+        self._next = 0
+        self._last = None
+        self._range = (np.inf, -np.inf)
+        self._maxima = []
+
+    def push(self, x):
+        """Add values to the input.
+
+        Returns
+        -------
+        peaks : np.ndarray, dtype=int
+            Indices of the peaks that can now be decided.
+        """
+        x = np.asarray(x, dtype=np.float64).ravel()
+        if len(x):
+            self._x = np.concatenate([self._x, x])
+            self._range = (min(self._range[0], x.min()),
+                           max(self._range[1], x.max()))
+        return self._pick(final=False)
+
+    def finish(self):
+        """Mark the end of the input, returning the remaining peaks."""
+        peaks = self._pick(final=True)
+        if not self.normalize:
+            return peaks
+
+        if not self._maxima:
+            return peaks
+        idx, excess = [np.concatenate(x) for x in zip(*self._maxima)]
+        self._maxima = []
+        scale = self._range[1] - self._range[0]
+        scale += np.finfo(np.float64).tiny
+        return self._wait(idx[excess >= self.delta * scale])
+
+    def _wait(self, idx):
+        peaks, self._last = _wait(idx, self.wait, self._last)
+        return peaks
+
+    def _pick(self, final):
+        end = self._start + len(self._x)
+        stop = end
+        if not final:
+            stop -= max(self.post_max, self.post_avg) - 1
+        if stop <= self._next:
+            return np.array([], dtype=int)
+
+        local = np.arange(self._next, stop) - self._start
+        mov_max = _moving_max(self._x, self.pre_max, self.post_max)[local]
+        mov_avg = _moving_mean(self._x, self.pre_avg, self.post_avg)[local]
+
+        x = self._x[local]
+        maxima = x == mov_max
+        idx = local + self._start
+        if self.normalize:
+            self._maxima.append((idx[maxima], (x - mov_avg)[maxima]))
+            peaks = np.array([], dtype=int)
+        else:
+            peaks = self._wait(idx[maxima & (x >= mov_avg + self.delta)])
+
+        self._next = stop
+        drop = max(self._next - max(self.pre_max, self.pre_avg),
+                   self._start) - self._start
+        self._x = self._x[drop:]
+        self._start += drop
+        return peaks
+
+
+def iter_decimated_log_envelope(blocks, filt_len=100, n_hop=100):
+    """Streaming version of `decimated_log_envelope`.
+
+    Only the samples within reach of the next output frame are kept
+    between blocks, so memory is bounded by the block size.
+
+    Parameters
+    ----------
+    blocks : iterable of np.ndarray
+        Consecutive blocks of the audio signal; see `iter_audio_blocks`.
+
+    filt_len, n_hop
+        See `decimated_log_envelope`.
+
+    Yields
+    ------
+    log_env_lpf : np.ndarray
+        Consecutive frames of the smoothed log envelope, in dB.
+    """
+    w_n = np.hanning(filt_len)
+    w_n /= w_n.sum()
+    h_n = np.convolve(w_n, w_n)
+    center = filt_len - 1
+
+    def frames(buf, start, k0, k1):
+        x_m = buf[k0 * n_hop - center - start:
+                  (k1 - 1) * n_hop + center + 1 - start]
+        log_env = 10 * np.log10(10.**-4.5 + x_m ** 2.0)
+        windows = np.lib.stride_tricks.as_strided(
+            log_env, shape=(k1 - k0, len(h_n)),
+            strides=(n_hop * log_env.strides[0], log_env.strides[0]))
+        return windows.dot(h_n[::-1])
+
+    buf, start, n_samples, k = np.empty(0), None, 0, 0
+    for block in blocks:
+        block = np.asarray(block, dtype=np.float64).ravel()
+        buf = np.concatenate([buf, block])
+        n_samples += len(block)
+        if n_samples <= center:
+            continue
+        if start is None:
+            # Odd reflection about the first sample, as `_reflect`.
+            buf = np.concatenate([2 * buf[0] - buf[center:0:-1], buf])
+            start = -center
+
+        k1 = (n_samples - 1 - center) // n_hop + 1
+        if k1 > k:
+            yield frames(buf, start, k, k1)
+            k = k1
+        # Keep enough samples to reflect about the last one, too.
+        drop = min(k * n_hop - center, n_samples - center - 1) - start
+        buf, start = buf[drop:], start + drop
+
+    if n_samples <= center:
+        if n_samples:
+            yield decimated_log_envelope(buf, None, filt_len, n_hop)
+        return
+
+    n_frames = (n_samples + n_hop - 1) // n_hop
+    if k < n_frames:
+        idx = np.arange(n_samples, (n_frames - 1) * n_hop + center + 1)
+        tail = 2 * buf[-1] - buf[2 * (n_samples - 1) - idx - start]
+        yield frames(np.concatenate([buf, tail]), start, k, n_frames)
+
+
+def iter_fast_cqt(blocks, fs, hop_length=1024, fmin=27.5, n_bins=24 * 8,
+                  bins_per_octave=24, dither=0.0, block_frames=64):
+    """Streaming version of `fast_cqt`.
+
+    Frames are computed `block_frames` at a time, from the samples within
+    reach of their longest kernel, plus a margin for the resampling
+    filters. Apart from floating point error, the result is the same as
+    transforming the whole signal at once.
+
+    Parameters
+    ----------
+    blocks : iterable of np.ndarray
+        Consecutive blocks of the audio signal; see `iter_audio_blocks`.
+
+    fs, hop_length, fmin, n_bins, bins_per_octave, dither
+        See `fast_cqt`.
+
+    block_frames : int
+        Number of frames to compute at a time.
+
+    Yields
+    ------
+    cqt : np.ndarray, dtype=np.float32, shape=(n_bins, n)
+        Consecutive frames of magnitudes.
+    """
+    octaves = cqt_filter_bank(fs, hop_length, fmin, n_bins, bins_per_octave)
+    max_decimation = max(x['decimation'] for x in octaves)
+    margin = max(x['n_fft'] // 2 * x['decimation'] for x in octaves)
+    # Each halving reaches 10 taps past the end of its input.
+    margin += 20 * max_decimation
+    margin = -(-margin // hop_length) * hop_length
+
+    def frames(x, first, t0, t1):
+        cqt = fast_cqt(x, fs, hop_length=hop_length, fmin=fmin,
+                       n_bins=n_bins, bins_per_octave=bins_per_octave,
+                       dither=dither)
+        return cqt[:, t0 - first:t1 - first]
+
+    buf, start, n_samples, t = np.empty(0, dtype=np.float32), 0, 0, 0
+    for block in blocks:
+        buf = np.concatenate([buf, np.asarray(block, np.float32).ravel()])
+        n_samples += len(block)
+        while (t + block_frames - 1) * hop_length + margin <= n_samples:
+            t1 = t + block_frames
+            x_m = buf[:(t1 - 1) * hop_length + margin - start]
+            yield frames(x_m, start // hop_length, t, t1)
+            t = t1
+            drop = max(t * hop_length - margin, 0) - start
+            buf, start = buf[drop:], start + drop
+
+    n_frames = 1 + n_samples // hop_length
+    if t < n_frames:
+        yield frames(buf, start // hop_length, t, n_frames)
+
+
+def stream_envelope_onsets(audio, fs=None, wait=100, block_size=2 ** 18,
+                           env_min=None):
+    """Streaming version of `envelope_onsets(..., multirate=True)`.
+
+    The audio is read once, a block at a time. The envelope is normalized
+    by its minimum, so unless that is given as `env_min`, the envelope
+    frames (`ENVELOPE_HOP` times fewer than the samples) are kept until the
+    signal has been read, and the onsets are only yielded then. Given
+    `env_min`, memory is independent of the length of the signal, and
+    onsets are yielded as they're found.
+
+    Parameters
+    ----------
+    audio : str or np.ndarray
+        Audio file, or an already decoded signal; see `iter_audio_blocks`.
+
+    fs : scalar, or None
+        Samplerate of the signal; unused for files.
+
+    wait : int
+        See `librosa.util.peak_pick` for details.
+
+    block_size : int
+        Number of samples to read at a time.
+
+    env_min : float, or None
+        Minimum of the decimated log envelope, if already known; e.g. from
+        `AnalysisContext.decimated_log_envelope(100, ENVELOPE_HOP)`.
+
+    Yields
+    ------
+    onset : float
+        Time in seconds for splitting.
+    """
+    envelope = iter_decimated_log_envelope(
+        iter_audio_blocks(audio, block_size, AnalysisContext.SAMPLERATE),
+        100, ENVELOPE_HOP)
+    if env_min is None:
+        envelope = list(envelope)
+        env_min = min([log_env_frames.min() for log_env_frames in envelope] or
+                      [0])
+
+    kernel = utils.canny(100, 3.5, 1)
+    kernel /= np.abs(kernel).sum()
+    zi = np.zeros(len(kernel) - 1)
+    picker = PeakPicker(**dict(PEAK_PICK['envelope'], wait=wait))
+    for log_env_frames in envelope:
+        onsets_forward, zi = sig.lfilter(
+            kernel, np.ones(1), log_env_frames - env_min, zi=zi)
+        onsets_pos = onsets_forward * (onsets_forward > 0)
+        for onset in librosa.frames_to_time(picker.push(onsets_pos),
+                                            hop_length=ENVELOPE_HOP):
+            yield onset
+
+    for onset in librosa.frames_to_time(picker.finish(),
+                                        hop_length=ENVELOPE_HOP):
+        yield onset
+
+
+def stream_logcqt_onsets(audio, fs=None, delta=0.05, wait=50,
+                         hop_length=1024, block_size=2 ** 18):
+    """Streaming version of `logcqt_onsets(..., fast=True)`.
+
+    The audio is read a block at a time, and the onset strength is computed
+    from `iter_fast_cqt`, carrying the filter state across blocks. As
+    `librosa.onset.onset_detect` normalizes the onset strength by its
+    range, the onsets are only yielded once the signal has been read.
+
+    Parameters
+    ----------
+    audio : str or np.ndarray
+        Audio file, or an already decoded signal; see `iter_audio_blocks`.
+
+    fs : scalar, or None
+        Samplerate of the signal; ignored for files, which are decoded at
+        `AnalysisContext.SAMPLERATE`.
+
+    delta, wait
+        See `librosa.util.peak_pick` for details.
+
+    hop_length : int
+        Hop size, in samples.
+
+    block_size : int
+        Number of samples to read at a time.
+
+    Yields
+    ------
+    onset : float
+        Time in seconds for splitting.
+    """
+    if not isinstance(audio, np.ndarray):
+        fs = AnalysisContext.SAMPLERATE
+    c_n = utils.canny(51, 3.5, 1)
+    zi = None
+
+    params = dict(PEAK_PICK['logcqt'], delta=delta, wait=wait)
+    picker = PeakPicker(normalize=True, **params)
+
+    blocks = iter_audio_blocks(audio, block_size, AnalysisContext.SAMPLERATE)
+    for cqt in iter_fast_cqt(blocks, fs, hop_length=hop_length, fmin=27.5,
+                             n_bins=24 * 8, bins_per_octave=24,
+                             dither=10.**-3):
+        lcqt = np.log1p(5000 * cqt)
+        if zi is None:
+            zi = np.zeros((len(lcqt), len(c_n) - 1))
+        onset_strength, zi = sig.lfilter(c_n, np.ones(1), lcqt, axis=1,
+                                         zi=zi)
+        picker.push(onset_strength.mean(axis=0))
+
+    for onset in librosa.frames_to_time(picker.finish(),
+                                        hop_length=hop_length):
+        yield onset
+
+
+STREAM_ONSETS = {
+    'logcqt': stream_logcqt_onsets,
+    'envelope': stream_envelope_onsets
+}
+
+
+def envelope_stats(log_env_lpf, onset_idx, length):
+    """Statistics of the envelope over the `length` samples after each onset.
+
+    All windows are handled at once: maxima with a moving max, and means
+    and deviations from cumulative sums (of the envelope less its mean, to
+    keep them well conditioned).
+
+    Parameters
+    ----------
+    log_env_lpf : np.ndarray, ndim=1
+        Smoothed log envelope; see `log_envelope`.
+
+    onset_idx : np.ndarray, dtype=int
+        Onsets, in samples; windows are clipped to the envelope.
+
+    length : int
+        Window length, in samples.
+
+    Returns
+    -------
+    env_max, env_mean, env_std, env_delta : np.ndarray
+        Per onset, as for `log_env_lpf[idx:idx + length]`; env_delta is the
+        max less the mean of the whole envelope.
+    """
+    onset_idx = np.asarray(onset_idx, dtype=int)
+    env_mean = log_env_lpf.mean()
+    y = log_env_lpf - env_mean
+    cumsum = np.concatenate([[0], np.cumsum(y)])
+    cumsum_sq = np.concatenate([[0], np.cumsum(y ** 2)])
+
+    stop = np.minimum(onset_idx + length, len(y))
+    count = stop - onset_idx
+    mean = (cumsum[stop] - cumsum[onset_idx]) / count
+    mean_sq = (cumsum_sq[stop] - cumsum_sq[onset_idx]) / count
+    env_max = _moving_max(log_env_lpf, 0, length)[onset_idx]
+    return (env_max, mean + env_mean, np.sqrt(np.maximum(mean_sq - mean ** 2,
+                                                         0)),
+            env_max - env_mean)
+
+
+def segment(audio_file, mode, db_delta_thresh=2.5, context=None, **kwargs):
+    context = AnalysisContext(audio_file) if context is None else context
+    x, fs = context.signal
 
     if mode == 'hll':
-        onset_times = hll_onsets(audio_file)
+        onset_times = hll_onsets(audio_file, context=context)
     else:
-        onset_times = ONSETS.get(mode)(x, fs, **kwargs)
-
-    onset_idx = librosa.time_to_samples(onset_times, fs)
-
-    log_env_lpf = log_envelope(x, fs, 100)
-    recs = []
-    for time, idx in zip(onset_times, onset_idx):
-        x_m = log_env_lpf[idx: idx + int(fs)]
-        if len(x_m) > 0:
-            rec = dict(time=time, env_max=x_m.max(),
-                       env_mean=x_m.mean(), env_std=x_m.std(),
-                       env_delta=x_m.max() - log_env_lpf.mean())
-            if rec['env_delta'] > db_delta_thresh:
-                recs += [rec]
-
-    return pd.DataFrame.from_records(recs)
+        onset_times = ONSETS.get(mode)(x, fs, context=context, **kwargs)
+
+    onset_times = np.asarray(onset_times, dtype=float)
+    onset_idx = librosa.time_to_samples(onset_times, sr=fs)
+
+    log_env_lpf = context.log_envelope(100)
+    valid = (onset_idx >= 0) & (onset_idx < len(log_env_lpf))
+    onset_times, onset_idx = onset_times[valid], onset_idx[valid]
+    env_max, env_mean, env_std, env_delta = envelope_stats(
+        log_env_lpf, onset_idx, int(fs))
+
+    keep = env_delta > db_delta_thresh
+    return pd.DataFrame(
+        dict(time=onset_times[keep], env_max=env_max[keep],
+             env_mean=env_mean[keep], env_std=env_std[keep],
+             env_delta=env_delta[keep]),
+        columns=['env_delta', 'env_max', 'env_mean', 'env_std', 'time'])
 
 
 def extract_clip(input_file, output_file, start_time, end_time,
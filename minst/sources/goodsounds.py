@@ -66,6 +66,7 @@ def collect(base_dir, onset_dir=ONSET_DIR):
 
     indexes = []
     records = []
+    path_cache = utils.PathCache()
     # Extracts as {base_dir}/sound_files/{instrument}/{pack}/{mic}/{fbase}.wav
     audio_fmt = os.path.join(root_dir, "*/*/*/*.wav")
     for audio_file_path in glob.glob(audio_fmt):
@@ -73,7 +74,8 @@ def collect(base_dir, onset_dir=ONSET_DIR):
             parse(audio_file_path.split(root_dir)[1]))
 
         uid = utils.generate_id(NAME, audio_file_path.split(base_dir)[-1])
-        onsets = utils.find_onset_file_from_uid(uid, onset_dir)
+        onsets = utils.find_onset_file_from_uid(
+            uid, onset_dir, path_cache)
         indexes.append(uid)
         records.append(
             dict(audio_file=audio_file_path,
@@ -78,6 +78,7 @@ def collect(base_dir, articulations=["normal", "vibrato"],
 
     indexes = []
     records = []
+    path_cache = utils.PathCache()
     # MP3s are extracted automatically as {instrument}/{instrument}/{fbase}.mp3
     audio_path_fmt = os.path.join(root_dir, "*/*/*.mp3")
     for audio_file_path in glob.glob(audio_path_fmt):
@@ -88,7 +89,8 @@ def collect(base_dir, articulations=["normal", "vibrato"],
                      any([x in articulation for x in articulations])]
         if any(art_conds):
             uid = utils.generate_id(NAME, audio_file_path.split(base_dir)[-1])
-            onsets = utils.find_onset_file_from_uid(uid, onset_dir)
+            onsets = utils.find_onset_file_from_uid(
+                uid, onset_dir, path_cache)
             indexes.append(uid)
             records.append(
                 dict(audio_file=audio_file_path,
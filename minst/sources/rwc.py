@@ -111,6 +111,7 @@ def collect(base_dir, fext="*.flac", onset_dir=ONSET_DIR):
 
     indexes = []
     records = []
+    path_cache = utils.PathCache()
     fmt = "*/*/{}".format(fext)
     for audio_file_path in glob.glob(os.path.join(base_dir, fmt)):
         instrument_name, style_code, dynamic_code = parse(audio_file_path)
@@ -118,7 +119,8 @@ def collect(base_dir, fext="*.flac", onset_dir=ONSET_DIR):
         # should really do the same here, but care must be taken to keep the
         # onsets sync'ed.
         uid = utils.generate_id(NAME, utils.filebase(audio_file_path))
-        onsets = utils.find_onset_file_from_uid(uid, onset_dir)
+        onsets = utils.find_onset_file_from_uid(
+            uid, onset_dir, path_cache)
         indexes.append(uid)
         records.append(
             dict(audio_file=audio_file_path,
@@ -106,6 +106,7 @@ def collect(base_dir, depth=6, fext="*.aif*", onset_dir=ONSET_DIR):
 
     indexes = []
     records = []
+    path_cache = utils.PathCache()
     root_dir = os.path.join(base_dir, "theremin.music.uiowa.edu",
                             "sound files", "MIS")
     for n in range(depth):
@@ -113,7 +114,8 @@ def collect(base_dir, depth=6, fext="*.aif*", onset_dir=ONSET_DIR):
         for audio_file_path in glob.glob(glbpath):
             instrument, dynamic, notevalue = parse(audio_file_path)
             uid = utils.generate_id(NAME, audio_file_path.split(base_dir)[-1])
-            onsets = utils.find_onset_file_from_uid(uid, onset_dir)
+            onsets = utils.find_onset_file_from_uid(
+                uid, onset_dir, path_cache)
             indexes.append(uid)
             records.append(
                 dict(audio_file=audio_file_path,
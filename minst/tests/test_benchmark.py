@@ -0,0 +1,64 @@
+import pytest
+
+import numpy as np
+import os
+
+import minst.benchmark
+
+
+def test_f_measure():
+    reference = [1.0, 2.0, 3.0, 4.0]
+    f, p, r = minst.benchmark.f_measure(reference, [1.02, 1.03, 2.9, 5.0],
+                                        window=0.05)
+    assert (p, r) == (0.25, 0.25)
+    assert f == 0.25
+
+    f, p, r = minst.benchmark.f_measure(reference, [4.01, 2.96, 1.0, 2.0])
+    assert (f, p, r) == (1.0, 1.0, 1.0)
+    assert minst.benchmark.f_measure([], []) == (0.0, 0.0, 0.0)
+    assert minst.benchmark.f_measure(reference, [])[0] == 0.0
+
+
+def test_measure():
+    result, usage = minst.benchmark.measure(np.ones, 10 ** 6)
+    assert len(result) == 10 ** 6
+    assert usage['wall_time'] >= 0 and usage['cpu_time'] >= 0
+    if minst.benchmark.tracemalloc is not None:
+        assert usage['peak_memory'] >= 8 * 10 ** 6
+
+
+def test_benchmark_onsets(workspace):
+    index = minst.benchmark.synthesize_corpus(workspace, n_files=2,
+                                              random_state=1)
+    assert len(index) == 2
+    assert all(os.path.exists(x) for x in index['audio_file'])
+    assert len(minst.benchmark.read_onsets(index['onsets_file'].iloc[0])) >= 2
+
+    index.loc['no_onsets'] = [index['audio_file'].iloc[0], None]
+    results = minst.benchmark.benchmark_onsets(
+        index, modes=['envelope', 'hll'], window=0.25)
+    assert list(results.columns) == minst.benchmark.RESULT_COLUMNS
+    assert 'no_onsets' not in results.index
+
+    # The envelope detector lags by about 0.22s (half its kernel).
+    envelope = results[results['mode'] == 'envelope']
+    assert len(envelope) == 2
+    assert (envelope['f_measure'] > 0.5).all()
+    assert envelope['error'].isnull().all()
+    assert (envelope['wall_time'] > 0).all()
+
+    summary = minst.benchmark.summarize(results)
+    assert summary.loc['envelope', 'n_files'] == 2
+
+
+def test_benchmark_sweep(workspace):
+    index = minst.benchmark.synthesize_corpus(workspace, n_files=2,
+                                              random_state=2)
+    results = minst.benchmark.benchmark_sweep(
+        index, 'envelope', window=0.25, wait=[10, 100], delta=[0.025, 100])
+    assert len(results) == 2 * 4
+    assert set(results.index) == set(index.index)
+
+    best = results.groupby(['wait', 'delta'])['f_measure'].mean()
+    assert best.loc[(100, 0.025)] > 0.5
+    assert best.loc[(100, 100)] == 0.0
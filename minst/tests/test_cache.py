@@ -0,0 +1,147 @@
+import pytest
+
+import claudio
+import numpy as np
+import os
+import shutil
+
+import minst.cache
+import minst.signal
+
+
+@pytest.fixture()
+def read_calls(monkeypatch):
+    calls = []
+    read = claudio.read
+
+    def counted_read(filename, **kwargs):
+        calls.append(filename)
+        return read(filename, **kwargs)
+
+    monkeypatch.setattr(claudio, 'read', counted_read)
+    return calls
+
+
+def test_AudioCache(audio_file, workspace, read_calls):
+    cache = minst.cache.AudioCache(os.path.join(workspace, 'cache'), 2 ** 30)
+    assert cache.lookup(audio_file) is None
+
+    x, fs = cache.read(audio_file, samplerate=22050)
+    assert fs == 22050 and x.dtype == np.float32
+    y, _ = cache.read(audio_file, samplerate=22050)
+    assert isinstance(y, np.memmap)
+    assert np.array_equal(x, y)
+    assert len(read_calls) == 1
+
+    # Other decode parameters, or a modified file, are separate entries.
+    cache.read(audio_file, samplerate=8000)
+    assert len(read_calls) == 2
+    copy = os.path.join(workspace, 'copy.wav')
+    shutil.copy(audio_file, copy)
+    cache.read(copy)
+    os.utime(copy, (0, 0))
+    cache.read(copy)
+    assert len(read_calls) == 4
+    assert len(cache.entries()) == 4
+
+    # Evicts least recently used first.
+    for n, (path, _, _) in enumerate(cache.entries()):
+        os.utime(path, (1000 + n, 1000 + n))
+    cache.read(audio_file, samplerate=22050)
+    cache.evict(x.nbytes + 1000)
+    assert [entry[0] for entry in cache.entries()] == [
+        cache.path(cache.key(audio_file, 22050, 1, 2))]
+    cache.clear()
+    assert cache.size() == 0
+
+
+def test_AudioCache_evict_on_overflow(audio_file, workspace, monkeypatch):
+    cache = minst.cache.AudioCache(os.path.join(workspace, 'cache'), 2 ** 30)
+    x, _ = cache.read(audio_file, samplerate=22050)
+    listings = []
+    entries = cache.entries
+    monkeypatch.setattr(cache, 'entries',
+                        lambda: listings.append(1) or entries())
+
+    # Under the cap, stores don't list the cache.
+    for samplerate in (8000, 11025, 16000):
+        cache.read(audio_file, samplerate=samplerate)
+    assert not listings
+    assert cache._total == cache.size()
+
+    cache.max_bytes = x.nbytes + 1000
+    cache.read(audio_file, samplerate=4000)
+    assert listings
+    assert cache._total == cache.size() <= cache.max_bytes
+    assert len(cache.entries()) < 5
+    assert minst.cache.default_cache() is minst.cache.default_cache()
+
+
+def test_AudioCache_shared(audio_file, workspace):
+    # Two processes' caches on the same directory.
+    cache_dir = os.path.join(workspace, 'cache')
+    x = np.zeros(1000, dtype=np.float32)
+    entry_size = x.nbytes + 128
+    max_bytes = 40 * entry_size
+    caches = [minst.cache.AudioCache(cache_dir, max_bytes) for _ in range(2)]
+    for n in range(200):
+        caches[n % 2].store(audio_file, x, samplerate=1000 + n)
+        assert caches[0].size() <= max_bytes * (1 + 2. / caches[0].RESYNC)
+    assert len(caches[0].entries()) < 50
+
+
+def test_AnalysisContext_cached(audio_file, audio_cache_dir, read_calls):
+    x, fs = minst.signal.AnalysisContext(audio_file).signal
+    y, _ = minst.signal.AnalysisContext(audio_file).signal
+    assert len(read_calls) == 1
+    assert np.array_equal(x, y)
+    assert os.listdir(audio_cache_dir)
+
+    blocks = list(minst.signal.iter_audio_blocks(audio_file, 1000))
+    assert np.array_equal(np.concatenate(blocks), x.ravel())
+
+
+def test_read_disabled(audio_file, monkeypatch, read_calls):
+    monkeypatch.setattr(minst.cache, 'CACHE_DIR', '')
+    minst.cache.read(audio_file)
+    minst.cache.read(audio_file)
+    assert len(read_calls) == 2
+
+
+def test_TrackCache(audio_file, workspace):
+    cache = minst.cache.TrackCache(os.path.join(workspace, 'tracks'))
+    tracks = (np.arange(5.), np.ones(5), np.zeros(5))
+    calls = []
+
+    def track():
+        calls.append(1)
+        return tracks
+
+    assert cache.lookup(audio_file, ['numpy']) is None
+    for n in range(2):
+        cached = cache.read(audio_file, ['numpy'], track)
+        assert all(np.array_equal(a, b) for a, b in zip(cached, tracks))
+    assert len(calls) == 1
+
+    # Other trackers are separate entries.
+    assert cache.lookup(audio_file, ['binary']) is None
+    cache.read(audio_file, ['binary'], track)
+    assert len(calls) == 2 and len(cache.entries()) == 2
+
+    # Tracks on a regular grid are stored as float32 values, without their
+    # time points.
+    n_points = 44100
+    tracks = (np.arange(n_points) / 44100., np.linspace(0, 1000, n_points),
+              np.linspace(0, 1, n_points))
+    cached = cache.read(audio_file, ['dense'], track)
+    size = os.path.getsize(cache.path(cache.key(audio_file, ['dense'])))
+    assert size <= 2 * 4 * (n_points + 1) + 128
+    assert np.array_equal(cached[0], tracks[0])
+    assert all(np.allclose(a, b, rtol=1e-6) for a, b in zip(cached, tracks))
+    assert all(np.array_equal(a, b) for a, b in zip(
+        cache.lookup(audio_file, ['dense']), cached))
+
+    # Irregular time points are kept as they are.
+    tracks = (np.array([0., 0.1, 0.5]), np.ones(3), np.zeros(3))
+    cached = cache.read(audio_file, ['irregular'], track)
+    assert all(np.array_equal(a, b) for a, b in zip(cached, tracks))
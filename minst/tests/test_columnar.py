@@ -0,0 +1,84 @@
+import pytest
+
+import numpy as np
+import os
+import pandas as pd
+
+import minst.columnar as columnar
+
+
+@pytest.fixture
+def index_df():
+    return pd.DataFrame.from_records(
+        [dict(audio_file='a.flac', dataset='rwc', start_time=0.0,
+              note_number=None, onsets_file='a.csv'),
+         dict(audio_file='b.flac', dataset='rwc', start_time=1.5,
+              note_number=60, onsets_file=None),
+         dict(audio_file='c.flac', dataset='uiowa', start_time=2.0,
+              note_number='C4', onsets_file='c.csv')],
+        index=['rwc0', 'rwc1', 'uiowa0'])
+
+
+def test_write_read_dataframe(index_df, workspace):
+    path = os.path.join(workspace, 'index')
+    assert columnar.write_dataframe(index_df, path)
+    assert not os.path.exists(path + '.tmp')
+
+    manifest = columnar.read_manifest(path)
+    assert manifest['length'] == len(index_df)
+
+    df = columnar.read_dataframe(path)
+    assert df.index.tolist() == index_df.index.tolist()
+    assert df.columns.tolist() == index_df.columns.tolist()
+    assert df.start_time.dtype == np.float64
+    assert str(df.dataset.dtype) == 'category'
+    assert df.dataset.tolist() == index_df.dataset.tolist()
+    assert pd.isnull(df.onsets_file.iloc[1])
+
+    # Write it back out again, with categoricals this time.
+    assert columnar.write_dataframe(df, path)
+    assert columnar.read_dataframe(path).dataset.tolist() == \
+        index_df.dataset.tolist()
+
+
+def test_read_arrays(index_df, workspace):
+    path = os.path.join(workspace, 'index')
+    columnar.write_dataframe(index_df, path)
+
+    index, data = columnar.read_arrays(path, columns=['note_number',
+                                                      'start_time'])
+    assert index.tolist() == index_df.index.tolist()
+    assert list(data.keys()) == ['note_number', 'start_time']
+    assert data['note_number'].tolist() == [None, 60, 'C4']
+    assert isinstance(data['start_time'], np.memmap)
+
+    with pytest.raises(KeyError):
+        columnar.read_arrays(path, columns=['features'])
+
+
+def test_read_write_index(index_df, workspace):
+    for fname in ['index.csv', 'index.cols']:
+        path = os.path.join(workspace, fname)
+        assert columnar.write_index(index_df, path)
+        df = columnar.read_index(path, columns=['dataset', 'start_time'])
+        assert df.index.tolist() == index_df.index.tolist()
+        assert df.start_time.tolist() == index_df.start_time.tolist()
+        assert df.dataset.tolist() == index_df.dataset.tolist()
+    assert os.path.isdir(os.path.join(workspace, 'index.cols'))
+
+
+def test_iter_arrays(index_df, workspace):
+    path = os.path.join(workspace, 'index')
+    columnar.write_dataframe(index_df, path)
+
+    blocks = list(columnar.iter_arrays(path, rows=2,
+                                       columns=['dataset', 'start_time']))
+    assert [len(index) for index, _ in blocks] == [2, 1]
+    assert blocks[1][0].tolist() == ['uiowa0']
+    assert list(blocks[0][1].keys()) == ['dataset', 'start_time']
+    assert np.concatenate([data['dataset'] for _, data in blocks]).tolist() \
+        == index_df.dataset.tolist()
+    assert blocks[0][1]['start_time'].tolist() == [0.0, 1.5]
+
+    with pytest.raises(ValueError):
+        next(columnar.iter_arrays(path, rows=0))
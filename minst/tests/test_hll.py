@@ -0,0 +1,253 @@
+import pytest
+
+import claudio
+import numpy as np
+import os
+import stat
+import sys
+
+import minst.cache
+import minst.hll as H
+import minst.signal
+
+# Stand-in for `hll_mono`: reports a 440Hz track at 0.25 for every 100th
+# sample of the input, and a null frame at the end.
+STUB = """#!{executable}
+import sys
+import wave
+
+wav_file, output_file, params = sys.argv[1:]
+n_samples = wave.open(wav_file).getnframes()
+with open(output_file, 'w') as fh:
+    fh.write('time,freq,amp\\n')
+    for n in range(0, n_samples, 100):
+        fh.write('{{}},440.0,0.25\\n'.format(n))
+    fh.write('{{}},-1.0,1.0\\n'.format(n_samples))
+"""
+
+
+# Stand-in for `hll_mono` that tracks for real, like it, at every sample:
+# frequency and amplitude from the analytic signal, nulled in silence.
+TRACKING_STUB = """#!{executable}
+import numpy as np
+import scipy.signal
+import sys
+import wave
+
+wav_file, output_file, params = sys.argv[1:]
+reader = wave.open(wav_file)
+fs = reader.getframerate()
+x = np.frombuffer(reader.readframes(reader.getnframes()), '<i2') / 32768.
+z = scipy.signal.hilbert(x)
+amps = np.abs(z)
+freqs = np.gradient(np.unwrap(np.angle(z))) * fs / (2 * np.pi)
+freqs[amps < 1e-3] = -1
+amps[amps < 1e-3] = 1
+np.savetxt(output_file, np.array([np.arange(len(x)), freqs, amps]).T,
+           delimiter=',', header='time,freq,amp', comments='')
+"""
+
+
+@pytest.fixture()
+def stub_binary(workspace, monkeypatch):
+    return _write_stub(workspace, monkeypatch, STUB)
+
+
+@pytest.fixture()
+def tracking_stub(workspace, monkeypatch):
+    return _write_stub(workspace, monkeypatch, TRACKING_STUB)
+
+
+def _write_stub(workspace, monkeypatch, script):
+    binary = os.path.join(workspace, 'hll_stub')
+    with open(binary, 'w') as fh:
+        fh.write(script.format(executable=sys.executable))
+    os.chmod(binary, os.stat(binary).st_mode | stat.S_IEXEC)
+    params = os.path.join(workspace, 'params.csv')
+    open(params, 'w').close()
+    monkeypatch.setattr(H, 'BIN', binary)
+    monkeypatch.setattr(H, 'PARAMS', params)
+    return binary
+
+
+def test_BinaryTracker(audio_file, stub_binary):
+    time_points, freqs, amps = H.hll(audio_file, backend='binary')
+    assert np.allclose(np.diff(time_points[:-1]), 100 / 44100.)
+    assert (freqs[:-1] == 440).all() and (amps[:-1] == 0.25).all()
+    assert freqs[-1] == 0 and amps[-1] == 0
+
+    x = np.zeros(22050)
+    time_points, _, _ = H.BinaryTracker().track(x, 22050)
+    assert np.isclose(time_points[-1], 1.0)
+
+    with pytest.raises(EnvironmentError):
+        H.BinaryTracker(binary='not-a-file').track_file(audio_file)
+
+
+def test_NumpyTracker():
+    fs = 22050
+    t = np.arange(2 * fs) / float(fs)
+    x = 0.5 * np.sin(2 * np.pi * 440 * t) * (t > 0.5)
+    x += sum(0.1 / k * np.sin(2 * np.pi * k * 110 * t)
+             for k in range(1, 4)) * (t > 1.5)
+
+    # By default, one point per frame.
+    time_points, freqs, amps = H.NumpyTracker(hop_length=128).track(x, fs)
+    assert len(time_points) == len(freqs) == len(amps) == 1 + len(x) // 128
+    assert np.allclose(np.diff(time_points), 128. / fs)
+
+    held = H.NumpyTracker(hop_length=128,
+                          output_rate=H.BinaryTracker.SAMPLERATE).track(x, fs)
+    assert len(held[0]) == 2 * 44100
+    assert np.allclose(np.diff(held[0]), 1. / 44100)
+    assert set(held[1]) == set(freqs)
+    # Onsets are detected on the binary's grid either way.
+    assert np.array_equal(minst.signal.hll_track_onsets(*held),
+                          minst.signal.hll_track_onsets(time_points, freqs,
+                                                        amps))
+
+    silent = time_points < 0.4
+    assert (freqs[silent] == 0).all() and (amps[silent] == 0).all()
+    tone = (time_points > 0.6) & (time_points < 1.4)
+    assert np.allclose(freqs[tone], 440, atol=1)
+    assert np.allclose(amps[tone], 0.5, atol=0.01)
+
+
+def test_get_tracker():
+    tracker = H.NumpyTracker()
+    assert H.get_tracker(tracker) is tracker
+    assert isinstance(H.get_tracker('numpy'), H.NumpyTracker)
+    with pytest.raises(ValueError):
+        H.get_tracker('bogus')
+
+
+def test_hll_onsets_numpy(audio_file):
+    context = minst.signal.AnalysisContext(audio_file)
+    onsets = minst.signal.hll_onsets(audio_file, context=context,
+                                     backend='numpy')
+    assert onsets.ndim == 1
+    # The in-process tracker runs on the context's decoded signal.
+    assert ('hll', 'numpy') in context._cache
+    assert 'signal' in context._cache
+
+
+def _describe(tracker, value):
+    return os.getpid(), tracker.signature(), value
+
+
+def test_TrackerPool(audio_file, stub_binary, monkeypatch):
+    fs = 22050
+    t = np.arange(fs) / float(fs)
+    signals = [(0.5 * np.sin(2 * np.pi * f0 * t), fs)
+               for f0 in (220, 440, 880)]
+    expected = [H.NumpyTracker().track(x, fs) for x, fs in signals]
+
+    with H.TrackerPool(2, backend='numpy') as pool:
+        assert len(pool) == 2
+        for tracks, ref in zip(pool.track_many(signals), expected):
+            for value, ref_value in zip(tracks, ref):
+                assert np.allclose(value, ref_value, atol=1e-3)
+        # Errors are raised in the parent, and the pool stays usable.
+        with pytest.raises(ValueError):
+            list(pool.track_many([(np.zeros(10), 0)]))
+        assert len(list(pool.track_many(signals[:1]))) == 1
+        # Functions run in the workers, with their trackers.
+        results = list(pool.map(_describe, range(4)))
+        assert [value for _, _, value in results] == list(range(4))
+        assert {pid for pid, _, _ in results} == \
+            {process.pid for process, _ in pool._workers}
+        assert all(sig == H.NumpyTracker().signature()
+                   for _, sig, _ in results)
+    assert len(pool) == 0 and not os.path.exists(pool.tmp_dir)
+
+    expected = H.NumpyTracker().track_file(audio_file)
+    read = H.cache.read
+    with H.TrackerPool(2, backend='numpy') as pool:
+        # Files are decoded by the workers, not here.
+        def parent_read(*args, **kwargs):
+            raise AssertionError("Decoded in the parent")
+        monkeypatch.setattr(H.cache, 'read', parent_read)
+        for tracks in pool.track_files([audio_file] * 2):
+            assert np.allclose(tracks[1], expected[1])
+    monkeypatch.setattr(H.cache, 'read', read)
+
+    with H.TrackerPool(2, backend='binary') as pool:
+        tracks = list(pool.track_files([audio_file] * 3))
+        tmp_dir = pool.tmp_dir
+        assert not any(files for _, _, files in os.walk(tmp_dir))
+    assert len(tracks) == 3
+    for time_points, freqs, amps in tracks:
+        assert (freqs[:-1] == 440).all() and amps[-1] == 0
+    assert not os.path.exists(tmp_dir)
+
+
+def test_hll_cached(audio_file, stub_binary, monkeypatch):
+    tracks = H.hll(audio_file, backend='binary')
+    # Cached tracks don't need the binary.
+    monkeypatch.setattr(H, 'BIN', 'not-a-file')
+    with pytest.raises(EnvironmentError):
+        H.hll(audio_file, backend='binary')
+    monkeypatch.setattr(H, 'BIN', stub_binary)
+    for value, cached in zip(tracks, H.hll(audio_file, backend='binary')):
+        assert np.array_equal(value, cached)
+
+    # Changing the parameters (or the binary) is a cache miss.
+    track_cache = minst.cache.default_track_cache()
+    signature = H.BinaryTracker().signature()
+    assert track_cache.lookup(audio_file, signature) is not None
+    with open(H.PARAMS, 'w') as fh:
+        fh.write('retuned\n')
+    os.utime(H.PARAMS, (1000, 1000))
+    assert H.BinaryTracker().signature() != signature
+    assert track_cache.lookup(audio_file,
+                              H.BinaryTracker().signature()) is None
+
+    # Post-processing reuses the tracks of the same tracker.
+    context = minst.signal.AnalysisContext(audio_file)
+    minst.signal.hll_onsets(audio_file, context=context, backend='numpy')
+    calls = []
+    monkeypatch.setattr(H.NumpyTracker, 'track',
+                        lambda *args: calls.append(args))
+    onsets = minst.signal.sweep_hll_onsets(audio_file, backend='numpy',
+                                           threshold=[0.5, 1e6], wait=[1, 100])
+    assert not calls
+    assert len(onsets) == 4
+    assert list(onsets.columns[:-1]) == list(minst.signal.HLL_PARAMS)
+    for _, row in onsets.iterrows():
+        expected = minst.signal.hll_onsets(
+            audio_file, threshold=row['threshold'], wait=row['wait'],
+            context=context, backend='numpy')
+        assert np.allclose(row['onsets'], expected)
+    assert not onsets['onsets'][onsets['threshold'] > 1].map(len).any()
+
+    with pytest.raises(ValueError):
+        minst.signal.sweep_hll_onsets(audio_file, delta=0.1)
+
+
+def test_hll_onsets_backends_agree(workspace, tracking_stub):
+    fs = 44100
+    t = np.arange(2 * fs) / float(fs)
+    x = np.zeros_like(t)
+    # Closer together than `wait` frames of the numpy tracker's own grid.
+    for onset, f0 in [(0.5, 220), (1.0, 330)]:
+        note = (t >= onset) & (t < onset + 0.3)
+        x += 0.3 * np.sin(2 * np.pi * f0 * t) * note
+    audio_file = os.path.join(workspace, 'notes.wav')
+    claudio.write(audio_file, x, samplerate=fs)
+
+    tracks = [minst.signal.AnalysisContext(audio_file).hll(backend)
+              for backend in ('binary', 'numpy')]
+    # The numpy tracker's are per frame; once held onto the binary's grid,
+    # the same grid (to within a frame), and amplitudes on the same scale.
+    assert len(tracks[1][0]) < len(tracks[0][0]) // 100
+    tracks[1] = H.hold_tracks(*tracks[1], rate=H.BinaryTracker.SAMPLERATE)
+    assert abs(len(tracks[0][0]) - len(tracks[1][0])) <= 2 * 128
+    voiced = tracks[0][2] > 0.2
+    assert np.allclose(np.median(tracks[1][2][voiced[:len(tracks[1][2])]]),
+                       0.3, atol=0.02)
+
+    onsets = [minst.signal.hll_onsets(audio_file, backend=backend)
+              for backend in ('binary', 'numpy')]
+    assert len(onsets[0]) == len(onsets[1]) == 2
+    assert np.allclose(onsets[0], [0.5, 1.0], atol=0.02)
+    assert np.allclose(onsets[0], onsets[1], atol=0.05)
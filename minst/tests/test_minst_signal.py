@@ -1,10 +1,13 @@
 import pytest
 
 import claudio.sox
+import librosa
 import numpy as np
 import os
+import scipy.signal as sig
 
 import minst.signal
+import minst.utils
 
 TOLERANCE = 0.0001
 
@@ -55,3 +58,263 @@ def test_signal_extract_clip_longer_pad(audio_file, tmpdir):
         start_time + clip_duration, desired_duration)
     obs_duration = float(claudio.sox.soxi(output_file, 'D'))
     assert np.abs(obs_duration - desired_duration) < TOLERANCE
+
+
+def test_AnalysisContext(audio_file, monkeypatch):
+    calls = []
+    log_envelope = minst.signal.log_envelope
+
+    def counted_log_envelope(*args):
+        calls.append(args[2:])
+        return log_envelope(*args)
+
+    monkeypatch.setattr(minst.signal, 'log_envelope', counted_log_envelope)
+    context = minst.signal.AnalysisContext(audio_file)
+    x, fs = context.signal
+    assert context.signal[0] is x
+
+    onsets = minst.signal.envelope_onsets(x, fs, context=context)
+    assert np.allclose(onsets, minst.signal.envelope_onsets(x, fs))
+    assert len(calls) == 2
+
+    onset_data = minst.signal.segment(audio_file, 'envelope',
+                                      context=context)
+    assert onset_data.time.tolist() == onsets.tolist()
+    assert calls == [(100,), (100,)]
+
+    with pytest.raises(ValueError):
+        minst.signal.AnalysisContext(x=x, fs=fs).hll()
+
+
+def test_decimated_log_envelope():
+    fs = 22050
+    rng = np.random.RandomState(12)
+    x = rng.normal(scale=1e-3, size=fs * 9)
+    for onset in [0.5, 3.2, 6.0]:
+        n = int(onset * fs)
+        x[n:n + fs // 2] += 0.5 * np.sin(np.arange(fs // 2) * 0.1) * \
+            np.exp(-np.arange(fs // 2) / 2000.)
+
+    expected = minst.signal.log_envelope(x, fs, 100)[::100]
+    for block_frames in [7, 4096]:
+        log_env_frames = minst.signal.decimated_log_envelope(
+            x, fs, 100, 100, block_frames=block_frames)
+        assert log_env_frames.shape == expected.shape
+        assert np.allclose(log_env_frames[5:-5], expected[5:-5])
+
+    onsets = minst.signal.envelope_onsets(x, fs)
+    assert len(onsets) == 3
+    assert np.allclose(onsets, minst.signal.envelope_onsets(
+        x, fs, multirate=True), atol=100. / fs)
+
+
+def test_fast_cqt():
+    fs = 22050
+    t = np.arange(fs * 3) / float(fs)
+    x = 0.5 * np.sin(2 * np.pi * 440 * t) * (t > 1)
+
+    bank = minst.signal.cqt_filter_bank(fs, 1024)
+    assert minst.signal.cqt_filter_bank(fs, 1024) is bank
+    assert [octave['decimation'] for octave in bank][0] > 1
+
+    cqt = minst.signal.fast_cqt(x, fs, hop_length=1024)
+    assert cqt.shape == (192, 1 + len(x) // 1024)
+    assert cqt.dtype == np.float32
+    # A4 is 4 octaves above A0.
+    assert np.argmax(cqt[:, 40]) == 24 * 4
+    assert cqt[:, 3].max() < 1e-6
+
+    dithered = minst.signal.fast_cqt(x, fs, hop_length=1024, dither=1e-3)
+    assert (dithered[:, 3] > 1e-6).all()
+    assert np.allclose(dithered[96, 40], cqt[96, 40], rtol=1e-3)
+
+    lcqt = minst.signal.logcqt(x, fs, fast=True)
+    assert lcqt.shape == cqt.shape
+
+
+def test_fast_cqt_matches_librosa():
+    fs = 22050
+    t = np.arange(fs * 10) / float(fs)
+    x = (0.5 * np.sin(2 * np.pi * 440 * t) * (t > 2) +
+         0.3 * np.sin(2 * np.pi * 110 * t) * (t > 6))
+
+    # As `logcqt`, with the dither added as actual noise.
+    rng = np.random.RandomState(0)
+    expected = np.abs(librosa.cqt(
+        x + rng.normal(scale=10.**-3, size=x.shape), sr=fs, hop_length=1024,
+        fmin=27.5, n_bins=24 * 8, bins_per_octave=24, tuning=0, sparsity=0,
+        norm=1))
+    cqt = minst.signal.fast_cqt(x, fs, hop_length=1024, dither=10.**-3)
+    assert cqt.shape == expected.shape
+    # Compare the bins within 40dB of the peak, an octave at a time; below
+    # that, the sparse kernels' leakage differs.
+    active = expected > 1e-2 * expected.max()
+    for octave in range(8):
+        rows = slice(24 * octave, 24 * (octave + 1))
+        if active[rows].any():
+            ratio = cqt[rows][active[rows]] / expected[rows][active[rows]]
+            assert np.abs(np.median(ratio) - 1) < 0.05, octave
+
+    c_n = minst.utils.canny(51, 3.5, 1)
+    expected_strength = sig.lfilter(c_n, np.ones(1),
+                                    np.log1p(5000 * expected),
+                                    axis=1).mean(axis=0)
+    strength = minst.signal.logcqt_onset_strength(x, fs, fast=True)
+    assert np.corrcoef(strength, expected_strength)[0, 1] > 0.99
+
+    params = dict(pre_max=10, post_max=10, pre_avg=10, post_avg=10,
+                  delta=1.0, wait=20)
+    onsets = librosa.util.peak_pick(strength, **params)
+    expected_onsets = librosa.util.peak_pick(expected_strength, **params)
+    # Both notes, delayed by the (causal) smoothing filter.
+    assert len(onsets) == len(expected_onsets)
+    assert np.abs(onsets - expected_onsets).max() <= 1
+    note_frames = librosa.time_to_frames([2, 6], sr=fs, hop_length=1024)
+    for frame in note_frames:
+        assert np.any((onsets > frame) & (onsets < frame + 25))
+
+
+def test_PeakPicker():
+    rng = np.random.RandomState(3)
+    x = rng.uniform(size=1000) ** 4
+    params = dict(pre_max=5, post_max=3, pre_avg=10, post_avg=7, delta=0.05,
+                  wait=4)
+    expected = librosa.util.peak_pick(x, **params)
+
+    picker = minst.signal.PeakPicker(**params)
+    peaks = [picker.push(x[n:n + 37]) for n in range(0, len(x), 37)]
+    peaks.append(picker.finish())
+    assert np.array_equal(np.concatenate(peaks), expected)
+    # Most peaks are decided before the end of the input.
+    assert len(np.concatenate(peaks[:-1])) > len(expected) - 3
+
+    picker = minst.signal.PeakPicker(normalize=True, **params)
+    assert not len(picker.push(10 * x + 2))
+    x_norm = (x - x.min()) / (x.max() - x.min())
+    assert np.array_equal(picker.finish(),
+                          librosa.util.peak_pick(x_norm, **params))
+
+
+def test_stream_onsets(monkeypatch):
+    fs = 22050
+    rng = np.random.RandomState(12)
+    x = rng.normal(scale=1e-3, size=fs * 9)
+    for onset in [0.5, 3.2, 6.0]:
+        n = int(onset * fs)
+        x[n:n + fs // 2] += 0.5 * np.sin(np.arange(fs // 2) * 0.1) * \
+            np.exp(-np.arange(fs // 2) / 2000.)
+
+    expected = minst.signal.decimated_log_envelope(x, fs)
+    blocks = minst.signal.iter_audio_blocks(x, 1234)
+    log_env_frames = np.concatenate(list(
+        minst.signal.iter_decimated_log_envelope(blocks)))
+    assert np.allclose(log_env_frames, expected)
+
+    # The audio is only read once.
+    reads = []
+    iter_audio_blocks = minst.signal.iter_audio_blocks
+    monkeypatch.setattr(minst.signal, 'iter_audio_blocks',
+                        lambda *args: reads.append(args) or
+                        iter_audio_blocks(*args))
+    onsets = list(minst.signal.stream_envelope_onsets(x, fs, block_size=5000))
+    assert len(reads) == 1
+    assert np.allclose(onsets, minst.signal.envelope_onsets(
+        x, fs, multirate=True))
+
+    context = minst.signal.AnalysisContext(x=x, fs=fs)
+    env_min = context.decimated_log_envelope(
+        100, minst.signal.ENVELOPE_HOP).min()
+    stream = minst.signal.stream_envelope_onsets(x, fs, block_size=5000,
+                                                 env_min=env_min)
+    assert np.allclose(list(stream), onsets)
+
+    expected = minst.signal.fast_cqt(x, fs, dither=1e-3)
+    blocks = minst.signal.iter_audio_blocks(x, 20000)
+    cqt = np.concatenate(list(minst.signal.iter_fast_cqt(
+        blocks, fs, dither=1e-3, block_frames=16)), axis=1)
+    assert np.allclose(cqt, expected, atol=1e-5)
+
+    onsets = list(minst.signal.stream_logcqt_onsets(x, fs, block_size=20000))
+    assert np.allclose(onsets, minst.signal.logcqt_onsets(x, fs, fast=True))
+
+
+def test_sweep_peak_pick():
+    rng = np.random.RandomState(5)
+    x = rng.uniform(size=2000) ** 4
+    grid = dict(pre_max=[0, 3, 10], post_max=[1, 4], pre_avg=[2, 7],
+                post_avg=[1, 6], delta=[0.0, 0.1], wait=[0, 5, 20])
+    peaks = minst.signal.sweep_peak_pick(x, **grid)
+    assert len(peaks) == 3 * 2 * 2 * 2 * 2 * 3
+    for params, peak_idx in peaks:
+        assert np.array_equal(peak_idx, librosa.util.peak_pick(x, **params))
+
+    with pytest.raises(ValueError):
+        minst.signal.sweep_peak_pick(x, pre_max=1)
+
+
+def test_sweep_peak_pick_zeros():
+    # Runs of zeros, as in a half-wave rectified onset strength.
+    rng = np.random.RandomState(6)
+    x = rng.uniform(size=2000) ** 4 * (rng.uniform(size=2000) > 0.6)
+    grid = dict(pre_max=[0, 3], post_max=[1, 4], pre_avg=[2], post_avg=[1],
+                delta=[0.0], wait=[0])
+    for params, peak_idx in minst.signal.sweep_peak_pick(x, **grid):
+        expected = librosa.util.peak_pick(x, **params)
+        assert np.array_equal(peak_idx, expected[x[expected] != 0])
+
+    x = np.maximum(np.sin(np.linspace(0, 6 * np.pi, 600)), 0)
+    grid = dict(pre_max=5, post_max=5, pre_avg=5, post_avg=5, delta=0.0,
+                wait=[0, 20])
+    tops = [np.argmax(x[:200]), 200 + np.argmax(x[200:400]),
+            400 + np.argmax(x[400:])]
+    for params, peak_idx in minst.signal.sweep_peak_pick(x, **grid):
+        assert peak_idx.tolist() == tops
+
+
+def test_sweep_onsets():
+    fs = 22050
+    rng = np.random.RandomState(12)
+    x = rng.normal(scale=1e-3, size=fs * 9)
+    for onset in [0.5, 3.2, 6.0]:
+        n = int(onset * fs)
+        x[n:n + fs // 2] += 0.5 * np.sin(np.arange(fs // 2) * 0.1) * \
+            np.exp(-np.arange(fs // 2) / 2000.)
+
+    context = minst.signal.AnalysisContext(x=x, fs=fs)
+    onsets = minst.signal.sweep_onsets(x, fs, 'envelope', context=context,
+                                       wait=[10, 100, 1000],
+                                       delta=[0.025, 100])
+    assert len(onsets) == 6
+    assert list(onsets.columns[:-1]) == list(minst.signal.PEAK_PICK_PARAMS)
+    for _, row in onsets.iterrows():
+        expected = minst.signal.envelope_onsets(x, fs, wait=row['wait']) \
+            if row['delta'] == 0.025 else []
+        assert np.allclose(row['onsets'], expected)
+
+    onsets = minst.signal.sweep_onsets(x, fs, 'logcqt', context=context,
+                                       fast=True, wait=[10, 50])
+    assert np.allclose(onsets['onsets'][1], minst.signal.logcqt_onsets(
+        x, fs, context=context, fast=True))
+
+    with pytest.raises(ValueError):
+        minst.signal.sweep_onsets(x, fs, 'hll')
+
+
+def test_envelope_stats():
+    rng = np.random.RandomState(7)
+    log_env_lpf = -40 + np.cumsum(rng.normal(size=5000)) * 0.1
+    onset_idx = np.array([0, 17, 1000, 4990, 4999])
+    stats = minst.signal.envelope_stats(log_env_lpf, onset_idx, 300)
+    for n, idx in enumerate(onset_idx):
+        x_m = log_env_lpf[idx:idx + 300]
+        expected = (x_m.max(), x_m.mean(), x_m.std(),
+                    x_m.max() - log_env_lpf.mean())
+        # Up to the rounding of the cumulative sums.
+        assert np.allclose([x[n] for x in stats], expected, atol=1e-5)
+
+
+def test_segment(audio_file):
+    oframe = minst.signal.segment(audio_file, 'envelope')
+    assert list(oframe.columns) == ['env_delta', 'env_max', 'env_mean',
+                                    'env_std', 'time']
+    assert (oframe['env_delta'] > 2.5).all()
@@ -80,6 +80,24 @@ def test_Observation_from_series(test_obs):
     assert obs.instrument == 'tuba'
 
 
+def test_Observation_from_arrays(test_obs):
+    columns = dict((k, [x[k] for x in test_obs])
+                   for k in model.Observation.FIELDS
+                   if k not in ('index', 'partition'))
+    index = np.array([x['index'] for x in test_obs])
+    observations = model.Observation.from_arrays(index, **columns)
+    assert len(observations) == len(test_obs)
+    assert observations[2].index == test_obs[2]['index']
+    assert observations[2].partition == ''
+    assert isinstance(observations[2].index, str)
+
+    with pytest.raises(TypeError):
+        model.Observation.from_arrays(index, features=index, **columns)
+
+    observations = model.Observation.from_records(test_obs)
+    assert [x.to_builtin() for x in observations] == test_obs
+
+
 def test_Observation_to_series(rwc_obs):
     obs = model.Observation(**rwc_obs)
     rec = obs.to_series()
@@ -96,6 +114,10 @@ def test_Observation_to_dict(rwc_obs):
 def test_Observation___get_item__(rwc_obs):
     obs = model.Observation(**rwc_obs)
     assert obs['index'] == obs.index == rwc_obs['index']
+    assert not hasattr(obs, '__dict__')
+
+    with pytest.raises(KeyError):
+        obs['features']
 
 
 def test_Observation_validate(rwc_root, rwc_obs, test_obs):
@@ -143,6 +165,23 @@ def test_Collection___init__(test_obs, rwc_obs, rwc_root):
     assert dset is not None
 
 
+def test_Collection_path_cache(rwc_obs, rwc_root):
+    cache = model.utils.PathCache()
+    dset = model.Collection([rwc_obs], audio_root=rwc_root, strict=True,
+                            path_cache=cache)
+    assert os.path.exists(dset.iloc(0).audio_file)
+    assert len(cache._listings) > 0
+
+    # A stale snapshot is trusted until it's refreshed.
+    cache.invalidate()
+    cache._listings[os.path.dirname(dset.iloc(0).audio_file)] = frozenset()
+    with pytest.raises(model.MissingDataException):
+        dset.append(rwc_obs, path_cache=cache)
+    cache.invalidate()
+    dset.append(rwc_obs, path_cache=cache)
+    assert len(dset) == 2
+
+
 def test_Collection___len__(test_obs):
     dset = model.Collection(test_obs)
     assert len(dset) == len(test_obs)
@@ -170,6 +209,20 @@ def test_Collection_append(test_obs, rwc_obs):
     assert len(dset) == len(test_obs) + 1
 
 
+def test_Collection_append_many(test_obs):
+    dset = model.Collection(test_obs[:1])
+    dset.groups('instrument')
+    records = [dict(test_obs[0], index='obs{}'.format(n)) for n in range(50)]
+    for n, record in enumerate(records):
+        dset.append(record)
+        assert record['index'] in dset
+        assert len(dset) == n + 2
+    # Buffered appends are folded in on read.
+    assert dset.iloc(len(dset) - 1).index == 'obs49'
+    assert dset.to_builtin() == test_obs[:1] + records
+    assert len(dset.rows('instrument', test_obs[0]['instrument'])) == 51
+
+
 def test_Collection_to_builtin(test_obs):
     dset = model.Collection(test_obs)
     rec_obs = dset.to_builtin()
@@ -186,6 +239,78 @@ def test_Collection_to_read_json(test_obs, workspace):
     assert dset == new_dset
 
 
+def test_Collection_to_read_columnar(test_obs, workspace):
+    dset = model.Collection(test_obs)
+    path = os.path.join(workspace, "dummy_collection")
+    assert dset.to_columnar(path)
+    new_dset = model.Collection.read_columnar(path)
+    assert dset == new_dset
+    assert new_dset.to_dataframe().duration.dtype == np.float64
+
+    # Non-numeric columns stay encoded, and decode a row at a time.
+    assert isinstance(new_dset._index, pd.Categorical)
+    assert isinstance(new_dset._columns['instrument'], pd.Categorical)
+    assert new_dset['rwcabc534'].to_builtin() == test_obs[2]
+    assert new_dset.iloc(0).note_number is None
+    assert len(new_dset.view(dataset='rwc', instrument='tuba')) == 2
+    assert new_dset.rows('dynamic', 'mf').tolist() == \
+        dset.rows('dynamic', 'mf').tolist()
+    assert new_dset.rows('dynamic', 'ff').tolist() == []
+    assert new_dset.to_dataframe().index.tolist() == dset.keys()
+
+    new_dset.set('dynamic', 'ff', rows=[0])
+    assert isinstance(new_dset._columns['dynamic'], np.ndarray)
+    assert new_dset.iloc(0).dynamic == 'ff'
+    assert new_dset.iloc(1).dynamic == 'mf'
+    new_dset.append(dict(test_obs[0], index='rwcabc999'))
+    assert new_dset.keys()[-1] == 'rwcabc999'
+    assert len(new_dset) == len(dset) + 1
+
+
+def test_Collection_iter_chunks(test_obs, workspace):
+    dset = model.Collection(test_obs)
+    paths = [os.path.join(workspace, "dummy.csv"),
+             os.path.join(workspace, "dummy.json"),
+             os.path.join(workspace, "dummy_columnar")]
+    dset.to_dataframe().to_csv(paths[0])
+    dset.to_json(paths[1], indent=2)
+    dset.to_columnar(paths[2])
+
+    for path in paths:
+        chunks = list(model.Collection.iter_chunks(path, rows=3))
+        assert [len(x) for x in chunks] == [3, 3, 2]
+        assert model.Collection.concat(chunks).keys() == dset.keys()
+
+    with open(paths[0], 'r') as fh:
+        with pytest.raises(ValueError):
+            list(model._iter_json_array(fh))
+
+
+def test_ChunkedCollection(test_obs, rwc_obs, workspace):
+    dset = model.Collection(test_obs)
+    rwc_obs['duration'] = 'abcdef'
+    dset.append(rwc_obs)
+    path = os.path.join(workspace, "dummy.json")
+    dset.to_json(path)
+
+    chunked = model.ChunkedCollection(path, rows=2)
+    assert len(chunked) == len(dset)
+    assert chunked.to_collection() == dset
+
+    rwc = chunked.view('dataset', 'rwc')
+    assert rwc.keys() == dset.view(dataset='rwc').keys()
+    assert rwc.where(instrument='saxophone').to_dataframe().index.tolist() \
+        == ['rwcabc534', 'rwcabc675']
+    assert len(rwc.where(dataset='uiowa')) == 0
+
+    assert not chunked.validate(check_files=False)
+    report = chunked.validation_report(check_files=False)
+    assert report.index.tolist() == ['U1309f091']
+    assert report['position'].tolist() == [8]
+    assert rwc.validate(check_files=False)
+    assert rwc.where(dataset='uiowa').validation_report().empty
+
+
 def test_Collection_validate(test_obs, rwc_obs):
     dset = model.Collection(test_obs)
     assert dset.validate(verbose=True, check_files=False)
@@ -195,6 +320,29 @@ def test_Collection_validate(test_obs, rwc_obs):
     assert not dset.validate(verbose=True)
 
 
+def test_Collection_validation_report(test_obs, rwc_obs, rwc_root):
+    dset = model.Collection(test_obs)
+    report = dset.validation_report(check_files=False)
+    assert report.empty
+
+    rwc_obs['duration'] = 'abcdef'
+    rwc_obs['start_time'] = -1.0
+    dset.append(rwc_obs)
+    dset.append(dict(test_obs[0], index='rwcabc999', dataset='mystery'))
+    report = dset.validation_report(check_files=False)
+    assert report.index.tolist() == ['U1309f091', 'U1309f091', 'rwcabc999']
+    assert report['field'].tolist() == ['start_time', 'duration', 'dataset']
+    assert report['position'].tolist() == [8, 8, 9]
+
+    good_obs = dict(test_obs[0], index='rwcabc998', audio_file=os.path.join(
+        rwc_root, "RWC_I_05/172/172VCSPP.flac"))
+    dset = model.Collection([test_obs[0], good_obs])
+    for header_only in [False, True]:
+        report = dset.validation_report(header_only=header_only, num_cpus=2)
+        assert report.index.tolist() == ['rwcabc123']
+        assert report['field'].tolist() == ['audio_file']
+
+
 def test_Collection_to_dataframe(test_obs):
     dset = model.Collection(test_obs).to_dataframe()
     assert len(dset) == len(test_obs)
@@ -206,7 +354,118 @@ def test_Collection_from_dataframe(test_obs):
     df = pd.DataFrame.from_records(test_obs, index=index)
     dset = model.Collection.from_dataframe(df)
     assert len(dset) == len(test_obs)
-    assert df.ix[0].name == dset[0].index
+    assert df.ix[0].name == dset.iloc(0).index
+
+
+def test_Collection___getitem__(test_obs):
+    dset = model.Collection(test_obs)
+    obs = dset[test_obs[1]['index']]
+    assert isinstance(obs, model.Observation)
+    assert obs.to_builtin() == test_obs[1]
+
+    subset = dset[1:4]
+    assert isinstance(subset, model.Collection)
+    assert subset.to_builtin() == test_obs[1:4]
+    assert dset[::-2].keys() == [x['index'] for x in test_obs[::-2]]
+
+    # Integers are keys, never positions.
+    with pytest.raises(KeyError):
+        dset[0]
+    records = [dict(x, index=n + 10) for n, x in enumerate(test_obs)]
+    dset = model.Collection(records[::-1])
+    assert dset[12].index == 12 == dset.get(12).index
+    with pytest.raises(KeyError):
+        dset[0]
+
+
+def test_Collection_iloc(test_obs):
+    dset = model.Collection(test_obs)
+    assert dset.iloc(1).to_builtin() == test_obs[1]
+    assert dset.iloc(-1).index == test_obs[-1]['index']
+    assert dset.iloc(slice(1, 4)).to_builtin() == test_obs[1:4]
+
+    with pytest.raises(IndexError):
+        dset.iloc(len(test_obs))
+
+
+def test_Collection_position(test_obs):
+    dset = model.Collection(test_obs)
+    assert dset.position('rwcabc534') == 2
+    assert dset['rwcabc534'].instrument == 'saxophone'
+    assert 'phil456' in dset
+    assert 'nope' not in dset
+    assert dset.get('nope') is None
+
+    with pytest.raises(KeyError):
+        dset['nope']
+
+    dset.append(dict(test_obs[0], index='rwcabc999'))
+    assert dset.position('rwcabc999') == len(test_obs)
+
+
+def test_Collection_groups(test_obs):
+    dset = model.Collection(test_obs)
+    groups = dset.groups('source_index')
+    assert set(groups.keys()) == set(['001', '002', '003', '004', '005',
+                                      '006'])
+    assert groups['002'].tolist() == [2, 3]
+    assert dset.groups('partition')[None].tolist() == list(range(8))
+    assert dset.rows('instrument', 'tuba').tolist() == [0, 1, 4, 6]
+    assert len(dset.rows('dataset', 'nope')) == 0
+
+    dset.append(dict(test_obs[2], index='rwcabc999'))
+    assert dset.groups('source_index')['002'].tolist() == [2, 3, 8]
+    assert dset.rows('instrument', 'saxophone').tolist() == [2, 3, 5, 7, 8]
+
+    with pytest.raises(ValueError):
+        dset.groups('duration')
+
+
+def test_Collection_dataframe_roundtrip(test_obs):
+    dset = model.Collection(test_obs)
+    new_dset = model.Collection.from_dataframe(dset.to_dataframe())
+    assert dset == new_dset
+    assert new_dset.keys() == dset.keys()
+
+    with pytest.raises(TypeError):
+        model.Collection.from_dataframe(
+            dset.to_dataframe().assign(features=1.0))
+
+
+def test_Collection_copy(test_obs):
+    dset = model.Collection(test_obs)
+    dset_copy = dset.copy()
+    assert dset == dset_copy
+    dset_copy.append(test_obs[0])
+    assert len(dset_copy) == len(dset) + 1
+
+
+def test_Collection_copy_on_write(test_obs):
+    dset = model.Collection(test_obs)
+    dset_copy = dset.copy()
+    assert np.shares_memory(dset._columns['instrument'],
+                            dset_copy._columns['instrument'])
+
+    dset_copy.set('instrument', 'kazoo', rows=[0])
+    assert dset_copy.iloc(0).instrument == 'kazoo'
+    assert dset.iloc(0).instrument == test_obs[0]['instrument']
+    assert not np.shares_memory(dset._columns['instrument'],
+                                dset_copy._columns['instrument'])
+    assert np.shares_memory(dset._columns['dataset'],
+                            dset_copy._columns['dataset'])
+    assert dset_copy.rows('instrument', 'kazoo').tolist() == [0]
+
+    dset.set('duration', 0.0)
+    assert set(dset_copy.to_dataframe().duration) != set([0.0])
+
+    with pytest.raises(ValueError):
+        dset.set('index', 'abc')
+
+    rwc = dset.view(dataset='rwc').materialize()
+    assert np.shares_memory(dset._columns['dataset'],
+                            rwc._columns['dataset'])
+    rwc.set('dataset', 'uiowa')
+    assert len(dset.view(dataset='rwc')) == len(rwc)
 
 
 def test_Collection_view(test_obs):
@@ -215,6 +474,47 @@ def test_Collection_view(test_obs):
     assert set(rwc_view["dataset"].unique()) == set(["rwc"])
 
 
+def test_CollectionView_where(test_obs):
+    ds = model.Collection(test_obs)
+    rwc_view = ds.view(dataset='rwc')
+    assert isinstance(rwc_view, model.CollectionView)
+    assert len(rwc_view) == 4
+
+    sax_view = rwc_view.where(instrument='saxophone')
+    assert sax_view.keys() == ['rwcabc534', 'rwcabc675']
+    assert sax_view[1].index == 'rwcabc675'
+    assert len(rwc_view.where(instrument='saxophone', dynamic='pp')) == 0
+
+    multi_view = ds.view('instrument', 'tuba').where(
+        dataset=['uiowa', 'philharmonia'])
+    assert multi_view.keys() == ['uiowaabc098', 'phildef123']
+
+    sax_coll = sax_view.materialize()
+    assert isinstance(sax_coll, model.Collection)
+    assert sax_coll.to_builtin() == test_obs[2:4]
+    assert len(ds.view()) == len(ds)
+
+
+def test_ObservationJournal(test_obs, workspace):
+    journal_file = os.path.join(workspace, "journal.jsonl")
+    journal = model.ObservationJournal(journal_file)
+    assert journal.completed == set()
+
+    journal.write('001', test_obs[:2])
+    journal.write('002', [model.Observation(**x) for x in test_obs[2:4]])
+    journal.write('007', [])
+    assert journal.completed == set(['001', '002', '007'])
+
+    # Simulate a crash halfway through writing an entry.
+    with open(journal_file, 'a') as fh:
+        fh.write('{"source": "003", "observations": [{"ind')
+
+    journal = model.ObservationJournal(journal_file)
+    assert journal.completed == set(['001', '002', '007'])
+    journal.write('003', test_obs[4:5])
+    assert journal.to_collection().to_builtin() == test_obs[:5]
+
+
 def test_partition_collection(test_bigobs):
     dset = model.Collection(test_bigobs)
     dset_df = dset.to_dataframe()
@@ -252,3 +552,117 @@ def test_partition_collection(test_bigobs):
     train_sources = set(train_df.source_index.values)
     valid_sources = set(valid_df.source_index.values)
     assert len(valid_sources.intersection(train_sources)) == 0
+
+
+def test_partition_collection_random_state(test_bigobs):
+    dset = model.Collection(test_bigobs)
+    partition_df = model.partition_collection(
+        dset, test_set='rwc', train_val_split=0.5, random_state=12)
+    assert partition_df.equals(model.partition_collection(
+        dset, test_set='rwc', train_val_split=0.5, random_state=12))
+    assert partition_df.index.is_unique
+
+    partition_df = model.partition_collection(
+        dset, test_set='rwc', max_files_per_class=3, random_state=12)
+    train_df = dset.to_dataframe().loc[
+        partition_df[partition_df['partition'] == 'train'].index]
+    assert set(train_df.instrument.value_counts()) == set([3])
+
+
+def test_Partitioner(test_bigobs):
+    dset = model.Collection(test_bigobs)
+    dset_df = dset.to_dataframe()
+    partitioner = model.Partitioner(dset)
+    assert set(partitioner.datasets) == set(dset_df.dataset)
+
+    partitions = partitioner.leave_one_out(0.5, random_state=3)
+    assert list(partitions.keys()) == partitioner.datasets
+    for test_set, partition_df in partitions.items():
+        test_df = partition_df[partition_df['partition'] == 'test']
+        assert set(dset_df.loc[test_df.index].dataset) == set([test_set])
+
+    assert len(partitioner.repeated('rwc', n_repeats=3)) == 3
+
+    folds = partitioner.kfold('rwc', n_folds=3, random_state=3)
+    assert len(folds) == 3
+    valid_index = []
+    for partition_df in folds:
+        assert len(partition_df) == len(dset)
+        train_df = dset_df.loc[
+            partition_df[partition_df['partition'] == 'train'].index]
+        valid_df = dset_df.loc[
+            partition_df[partition_df['partition'] == 'valid'].index]
+        assert not (set(zip(train_df.instrument, train_df.source_index)) &
+                    set(zip(valid_df.instrument, valid_df.source_index)))
+        valid_index += valid_df.index.tolist()
+    assert sorted(valid_index) == sorted(dset_df[dset_df.dataset != 'rwc']
+                                         .index.tolist())
+
+    with pytest.raises(ValueError):
+        partitioner.kfold('rwc', n_folds=1)
+
+
+def test_partition_collection_hashed(test_bigobs):
+    dset = model.Collection(test_bigobs)
+    partition_df = model.partition_collection(dset, 'rwc', 0.5, salt='abc')
+    assert len(partition_df) == len(dset)
+    assert partition_df.sort_index().equals(model.partition_collection(
+        dset, 'rwc', 0.5, salt='abc').sort_index())
+
+    # Partitioning a subset first, then the rest, gives the same result.
+    subset = model.Collection(test_bigobs[:30])
+    existing = model.partition_collection(subset, 'rwc', 0.5, salt='abc')
+    extended = model.Partitioner(dset).hashed('rwc', 0.5, salt='abc',
+                                              existing=existing)
+    assert extended.index[:30].tolist() == existing.index.tolist()
+    assert extended.sort_index().equals(partition_df.sort_index())
+
+    # Whole source_index groups stay together.
+    dset_df = dset.to_dataframe()
+    del dset_df['partition']
+    dset_df = dset_df.join(partition_df)
+    assert (dset_df.groupby('source_index').partition.nunique() == 1).all()
+
+    with pytest.raises(ValueError):
+        model.partition_collection(dset, 'rwc', salt='abc',
+                                   max_files_per_class=2)
+
+
+def test_partition_collection_hashed_roundtrip(test_bigobs, workspace):
+    dset = model.Collection(test_bigobs)
+    partition_df = model.partition_collection(dset, 'rwc', 0.5, salt='abc')
+
+    # Zero-padded source indexes come back from CSV as integers.
+    csv_file = os.path.join(workspace, 'index.csv')
+    dset.to_dataframe().to_csv(csv_file)
+    dframe = pd.read_csv(csv_file, index_col=0)
+    assert dframe['source_index'].dtype.kind == 'i'
+    reread = model.Collection.from_dataframe(dframe)
+    assert model.partition_collection(reread, 'rwc', 0.5, salt='abc') \
+        .sort_index().equals(partition_df.sort_index())
+
+    values = [1, 1.0, '1', '001', np.int64(1), np.float32(1)]
+    assert len(set(model._stable_hash(model._object_column(values)))) == 1
+    values = model._object_column(['1.5', 1.5, 'a', None])
+    assert len(set(model._stable_hash(values))) == 3
+
+
+def test_audit_partition(test_bigobs):
+    dset = model.Collection(test_bigobs)
+    partition_df = model.partition_collection(
+        dset, test_set='rwc', max_files_per_class=4, random_state=1)
+    report = model.audit_partition(dset, partition_df)
+    assert report['leakage'].empty
+    assert report['missing'] == []
+    balance = report['balance']
+    assert balance.values.sum() == len(partition_df)
+    assert set(balance['train'][balance['train'] > 0]) == set([4])
+
+    partition_df.loc['not-an-index'] = 'train'
+    leaky_index = partition_df[partition_df['partition'] == 'valid'].index[0]
+    partition_df = pd.concat([partition_df, pd.DataFrame(
+        dict(partition=['train']), index=[leaky_index])])
+    report = model.audit_partition(dset.to_dataframe(), partition_df)
+    assert report['missing'] == ['not-an-index']
+    assert len(report['leakage']) == 1
+    assert report['leakage'].index[0] == dset[leaky_index].source_index
@@ -62,6 +62,13 @@ def test_check_audio_file(data_root):
     __test(minst.utils.check_audio_file('heavy_metal.wav')[0], False)
 
 
+def test_check_audio_header(data_root):
+    for af in collect_files(['mp3', 'aif', 'aiff'], data_root):
+        __test(minst.utils.check_audio_header(af), (True, None))
+
+    __test(minst.utils.check_audio_header('heavy_metal.wav')[0], False)
+
+
 def test_check_many_audio_files(data_root):
     afiles = collect_files(['mp3', 'aif', 'aiff'], data_root)
     for sterr in minst.utils.check_many_audio_files(afiles):
@@ -80,3 +87,34 @@ def test_trim(workspace, data_root):
     other_files = collect_files(['zip'], data_root)
     ofile = minst.utils.trim(other_files[0], workspace, 0.5)
     assert ofile is None
+
+
+def test_PathCache(workspace):
+    cache = minst.utils.PathCache()
+    fpath = os.path.join(workspace, 'a.csv')
+    assert not cache.exists(fpath)
+    assert cache.exists(workspace)
+    assert not cache.exists(os.path.join(workspace, 'nope', 'a.csv'))
+
+    open(fpath, 'w').close()
+    # Snapshots don't see changes until refreshed.
+    assert not cache.exists(fpath)
+    cache.refresh(workspace)
+    assert cache.exists(fpath)
+
+    os.remove(fpath)
+    assert cache.exists(fpath)
+    cache.invalidate()
+    assert not cache.exists(fpath)
+
+
+def test_find_onset_file_from_uid(onset_root):
+    onset_dir = os.path.join(onset_root, 'uiowa')
+    cache = minst.utils.PathCache()
+    for path_cache in [None, cache]:
+        onset_file = minst.utils.find_onset_file_from_uid(
+            'uiowa78fae0a0', onset_dir, path_cache)
+        assert os.path.exists(onset_file)
+        assert minst.utils.find_onset_file_from_uid(
+            'uiowaXXXXXXXX', onset_dir, path_cache) is None
+    assert os.path.abspath(onset_dir) in cache._listings
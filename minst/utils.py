@@ -5,6 +5,7 @@ from joblib import Parallel, delayed
 import logging
 import numpy as np
 import os
+import subprocess
 import wave
 import zipfile
 
@@ -198,7 +199,43 @@ def check_audio_file(filename, min_duration=0.0):
     return status, error
 
 
-def check_many_audio_files(fileset, min_duration=0.0, num_cpus=-1, verbose=0):
+def check_audio_header(filename, min_duration=0.0):
+    """Check an audio file from its header only, without decoding it.
+
+    Cheaper, but less thorough, than `check_audio_file`: a file with a sane
+    header and a corrupt body will pass.
+
+    Parameters
+    ----------
+    filename : str
+        Path to an audio file on disk.
+
+    min_duration : scalar, default=0.0
+        Minimum time duration for the audio file to be considered valid.
+
+    Returns
+    -------
+    status : bool
+        True if legit, False otherwise.
+
+    message : ExceptionType, or None
+        None on success, else the exception class capturing the death.
+    """
+    status = False
+    error = None
+    try:
+        if not os.path.exists(filename):
+            raise IOError("No such file: {}".format(filename))
+        status = float(claudio.sox.soxi(filename, 'D')) >= min_duration
+    except (IOError, OSError, ValueError,
+            subprocess.CalledProcessError) as derp:
+        error = derp
+
+    return status, error
+
+
+def check_many_audio_files(fileset, min_duration=0.0, num_cpus=-1, verbose=0,
+                           header_only=False):
     """
     Tries to load every file, and returns a list of any file
     that fails to load.
@@ -208,6 +245,9 @@ def check_many_audio_files(fileset, min_duration=0.0, num_cpus=-1, verbose=0):
     fileset : list of str
         Set of audiofiles on disk.
 
+    header_only : bool, default=False
+        If True, only check file headers; see `check_audio_header`.
+
     Returns
     -------
     status : list of (bool, ...)
@@ -215,8 +255,8 @@ def check_many_audio_files(fileset, min_duration=0.0, num_cpus=-1, verbose=0):
         contain the status (True if good), and the remainder will describe
         the issue caught.
     """
-    pool = Parallel(n_jobs=num_cpus, verbose=0)
-    fx = delayed(check_audio_file)
+    pool = Parallel(n_jobs=num_cpus, verbose=verbose)
+    fx = delayed(check_audio_header if header_only else check_audio_file)
     return pool(fx(af, min_duration) for af in fileset)
 
 
@@ -285,7 +325,57 @@ def canny(nlen, beta, sig=2.0):
     return alpha * np.exp(-(n ** 2.0) / (2.0 * (sig ** 2.0)))
 
 
-def find_onset_file_from_uid(index, onset_dir):
+class PathCache(object):
+    """Answers file existence checks from in-memory directory snapshots.
+
+    Each directory is listed once (with `os.scandir`, where available) on
+    first use; later checks against it never touch the filesystem. The
+    snapshots do not notice changes on disk, so `refresh` or `invalidate`
+    them after creating or deleting files.
+    """
+
+    def __init__(self):
+        self._listings = dict()
+
+    def listdir(self, dirname):
+        """Return the (cached) set of entry names in a directory.
+
+        Missing or unreadable directories are treated as empty.
+        """
+        dirname = os.path.abspath(dirname)
+        if dirname not in self._listings:
+            self.refresh(dirname)
+        return self._listings[dirname]
+
+    def exists(self, path):
+        """Cached equivalent of `os.path.exists`."""
+        dirname, basename = os.path.split(os.path.abspath(path))
+        if not basename:
+            # The filesystem root.
+            return os.path.exists(dirname)
+        return basename in self.listdir(dirname)
+
+    def refresh(self, dirname):
+        """Re-take the snapshot of a directory."""
+        dirname = os.path.abspath(dirname)
+        try:
+            if hasattr(os, 'scandir'):
+                names = [entry.name for entry in os.scandir(dirname)]
+            else:
+                names = os.listdir(dirname)
+        except OSError:
+            names = []
+        self._listings[dirname] = frozenset(names)
+
+    def invalidate(self, dirname=None):
+        """Drop the snapshot of a directory, or all of them if None."""
+        if dirname is None:
+            self._listings.clear()
+        else:
+            self._listings.pop(os.path.abspath(dirname), None)
+
+
+def find_onset_file_from_uid(index, onset_dir, path_cache=None):
     """Find an onsetfile of the form [index].csv in the onset_dir.
 
     Parameters
@@ -295,7 +385,12 @@ def find_onset_file_from_uid(index, onset_dir):
 
     onset_dir : str
         Path to the onsets.
+
+    path_cache : PathCache, or None
+        If given, answer the existence check from this cache; useful when
+        looking up many indexes against the same directory.
     """
     onset_file = "{}.csv".format(index)
     onset_path = os.path.abspath(os.path.join(onset_dir, onset_file))
-    return onset_path if os.path.exists(onset_path) else None
+    exists = os.path.exists if path_cache is None else path_cache.exists
+    return onset_path if exists(onset_path) else None
@@ -13,7 +13,6 @@ Keys:
 """
 from __future__ import print_function
 import argparse
-import claudio
 import logging
 import matplotlib
 import numpy as np
@@ -43,16 +42,18 @@ class OnsetCanvas(object):
                                            figsize=(20, 6))
 
         self.audio_file = audio_file
-        self.x, self.fs = claudio.read(audio_file, samplerate=22050,
-                                       channels=1, bytedepth=2)
+        # Every analysis below, and the onset detectors bound to the number
+        # keys, draw from (and fill) this context.
+        self.context = S.AnalysisContext(audio_file)
+        self.x, self.fs = self.context.signal
 
         onset_data = pd.DataFrame([]) if onset_data is None else onset_data
         self.output_file = output_file
         self.x_max = np.abs(self.x).max()
         self.trange = np.arange(0, len(self.x), nhop) / float(self.fs)
         self.waveform = self.x.flatten()[::nhop]
-        self.envelope = S.log_envelope(self.x, self.fs, nhop)[::nhop]
-        self.lcqt = S.logcqt(self.x, self.fs)
+        self.envelope = self.context.log_envelope(nhop)[::nhop]
+        self.lcqt = self.context.logcqt()
 
         # self.onset_data = set_onset_data
         self.wave_handle = self.axes[0].plot(self.trange, self.waveform)
@@ -252,48 +253,54 @@ class OnsetCanvas(object):
         elif event.key == '1':
             logger.debug("Getting envelope_onsets(.008)")
             onsets = S.envelope_onsets(self.x, self.fs,
-                                       wait=int(self.fs * .008))
+                                       wait=int(self.fs * .008),
+                                       context=self.context)
             self.set_onset_data(pd.DataFrame(dict(time=onsets)))
 
         elif event.key == '2':
             # Reset onsets with "envelope_onsets"
             logger.debug("Getting envelope_onsets(.01)")
             onsets = S.envelope_onsets(self.x, self.fs,
-                                       wait=int(self.fs * .01))
+                                       wait=int(self.fs * .01),
+                                       context=self.context)
             self.set_onset_data(pd.DataFrame(dict(time=onsets)))
 
         elif event.key == '3':
             # Reset onsets with "envelope_onsets"
             logger.debug("Getting envelope_onsets(.02)")
             onsets = S.envelope_onsets(self.x, self.fs,
-                                       wait=int(self.fs * .02))
+                                       wait=int(self.fs * .02),
+                                       context=self.context)
             self.set_onset_data(pd.DataFrame(dict(time=onsets)))
 
         elif event.key == '4':
             # Reset onsets with "envelope_onsets"
             logger.debug("Getting envelope_onsets(.05)")
             onsets = S.envelope_onsets(self.x, self.fs,
-                                       wait=int(self.fs * .05))
+                                       wait=int(self.fs * .05),
+                                       context=self.context)
             self.set_onset_data(pd.DataFrame(dict(time=onsets)))
 
         elif event.key == '6':
             # Reset onsets with "logcqt_onsets"
             logger.debug("Getting logcqt_onsets()")
             onsets = S.logcqt_onsets(self.x, self.fs,
-                                     wait=int(self.fs * .01))
+                                     wait=int(self.fs * .01),
+                                     context=self.context)
             self.set_onset_data(pd.DataFrame(dict(time=onsets)))
 
         elif event.key == '7':
             # Reset onsets with "logcqt_onsets"
             logger.debug("Getting logcqt_onsets()")
             onsets = S.logcqt_onsets(self.x, self.fs,
-                                     wait=int(self.fs * .02))
+                                     wait=int(self.fs * .02),
+                                     context=self.context)
             self.set_onset_data(pd.DataFrame(dict(time=onsets)))
 
         elif event.key == '0':
             # Reset onsets with "logcqt_onsets"
             logger.debug("Getting hll_onsets()")
-            onsets = S.hll_onsets(self.audio_file)
+            onsets = S.hll_onsets(self.audio_file, context=self.context)
             self.set_onset_data(pd.DataFrame(dict(time=onsets)))
 
         elif event.key == 'left':
@@ -0,0 +1,114 @@
+"""Benchmark the onset detectors against reference onsets.
+
+Each detector is run over every file in an index that has an
+`onsets_file` (e.g. the annotated onsets gathered by collect_onsets.py),
+scored by F-measure, and timed. Per-file results are written to a CSV, and
+a summary per detector is printed.
+
+Example:
+$ python scripts/benchmark_onsets.py \
+    uiowa_index.csv \
+    uiowa_benchmark.csv \
+    --modes envelope logcqt \
+    --window 0.05
+
+To benchmark offline, on a generated corpus of 10 files:
+$ python scripts/benchmark_onsets.py \
+    synthetic/index.csv \
+    synthetic_benchmark.csv \
+    --synthetic 10
+"""
+from __future__ import print_function
+
+import argparse
+import logging
+import logging.config
+import os
+import sys
+
+import minst.benchmark
+import minst.columnar
+import minst.logger
+import minst.signal as S
+
+logger = logging.getLogger('benchmark_onsets')
+
+
+def main(index_file, output_file, modes=('envelope', 'logcqt'), window=0.05,
+         synthetic=0):
+    """Benchmark onset detectors over an index.
+
+    Parameters
+    ----------
+    index_file : str
+        Index with audio_file and onsets_file columns; CSV if it ends in
+        '.csv', else columnar.
+
+    output_file : str
+        CSV file for the per-file results.
+
+    modes : iterable of str
+        Detectors to run; see minst.signal.ONSETS.
+
+    window : float
+        Tolerance for matching onsets, in seconds.
+
+    synthetic : int
+        If positive, first write a synthetic corpus of this many files
+        next to `index_file`, and its index to `index_file`.
+
+    Returns
+    -------
+    success : bool
+        True if the results were written.
+    """
+    if synthetic > 0:
+        corpus_dir = os.path.dirname(os.path.abspath(index_file))
+        minst.columnar.write_index(
+            minst.benchmark.synthesize_corpus(corpus_dir, synthetic,
+                                              random_state=synthetic),
+            index_file)
+
+    dframe = minst.columnar.read_index(index_file)
+    results = minst.benchmark.benchmark_onsets(dframe, modes, window)
+    results.to_csv(output_file)
+    print(minst.benchmark.summarize(results))
+    return os.path.exists(output_file)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "index_file",
+        metavar="index_file", type=str,
+        help="Input index; CSV if it ends in '.csv', else columnar.")
+    parser.add_argument(
+        "output_file",
+        metavar="output_file", type=str,
+        help="Output CSV for the per-file results.")
+    parser.add_argument(
+        "--modes",
+        metavar="modes", type=str, nargs='+',
+        default=['envelope', 'logcqt'], choices=sorted(S.ONSETS),
+        help="Onset detectors to benchmark.")
+    parser.add_argument(
+        "--window",
+        metavar="window", type=float, default=0.05,
+        help="Tolerance for matching onsets, in seconds.")
+    parser.add_argument(
+        "--synthetic",
+        metavar="synthetic", type=int, default=0,
+        help="Generate a synthetic corpus of this many files first.")
+    parser.add_argument(
+        "--verbose",
+        metavar="verbose", type=int, default=0,
+        help="verbosity.")
+
+    args = parser.parse_args()
+
+    level = 'INFO' if args.verbose <= 20 else 'DEBUG'
+    logging.config.dictConfig(minst.logger.get_config(level))
+
+    success = main(args.index_file, args.output_file, args.modes,
+                   args.window, args.synthetic)
+    sys.exit(0 if success else 1)
@@ -4,6 +4,7 @@ import logging.config
 import os
 import sys
 
+import minst.columnar
 import minst.logger
 import minst.sources
 import minst.taxonomy
@@ -24,10 +25,10 @@ def build_index(dataset, base_directory, output_file, backup_index=None,
                                       "vailable at {}?"
                                       .format(dataset, base_directory)))
 
-    df.to_csv(output_file)
+    success = minst.columnar.write_index(df, output_file)
     if backup_index is not None:
         df.audio_file.to_csv(backup_index)
-    return os.path.exists(output_file)
+    return success
 
 
 if __name__ == "__main__":
@@ -43,7 +44,7 @@ if __name__ == "__main__":
     parser.add_argument(
         "index_file",
         metavar="index_file", type=str,
-        help="A dframe in CSV format.")
+        help="Output index; CSV if it ends in '.csv', else columnar.")
     parser.add_argument(
         "--backup_index", default=None,
         metavar="backup_index", type=str,
@@ -15,10 +15,11 @@ from joblib import Parallel, delayed
 import logging
 import logging.config
 import os
-import pandas as pd
 import sys
 import time
 
+import minst.columnar
+import minst.hll as H
 import minst.logger
 import minst.signal as S
 import minst.utils as utils
@@ -26,7 +27,7 @@ import minst.utils as utils
 logger = logging.getLogger('segment_collection')
 
 
-def segment_one(index, audio_file, mode, output_directory):
+def segment_one(index, audio_file, mode, output_directory, context=None):
     """Segment a single audio file.
 
     Parameters
@@ -43,13 +44,16 @@ def segment_one(index, audio_file, mode, output_directory):
     output_directory : str
         Path at which to write outputs.
 
+    context : minst.signal.AnalysisContext, or None
+        Analyses of `audio_file` to reuse, if any.
+
     Returns
     -------
     output_file : str
         Path at which data was written.
     """
     t0_segment = time.time()
-    oframe = S.segment(audio_file, mode)
+    oframe = S.segment(audio_file, mode, context=context)
     time_to_segment = time.time() - t0_segment
 
     t0_write = time.time()
@@ -67,8 +71,17 @@ def segment_one(index, audio_file, mode, output_directory):
     return output_file
 
 
+def _segment_hll(tracker, index, audio_file, output_directory):
+    """Segment a file in mode 'hll' with the given tracker, in a worker of
+    a minst.hll.TrackerPool; see segment_one."""
+    context = S.AnalysisContext(audio_file,
+                                hll=H.hll(audio_file, backend=tracker))
+    return segment_one(index, audio_file, 'hll', output_directory,
+                       context=context)
+
+
 def segment_many(index, audio_files, mode, output_directory,
-                 num_cpus=-1, verbose=0):
+                 num_cpus=-1, verbose=0, hll_workers=0):
     """Segment a collection of audio files.
 
     Parameters
@@ -88,6 +101,12 @@ def segment_many(index, audio_files, mode, output_directory,
     verbose : int, default=0
         Verbosity level for parallel computation.
 
+    hll_workers : int, default=0
+        For mode='hll', the number of long-lived tracker processes (see
+        minst.hll.TrackerPool) that segment the files, each with its own
+        tracker, instead of starting a tracker per file; -1 for one per
+        CPU, 0 to not use a pool. Replaces `num_cpus`.
+
     Returns
     -------
     output_paths : list
@@ -99,21 +118,26 @@ def segment_many(index, audio_files, mode, output_directory,
     logger.info("beginning segmenting {} files with mode={}"
                 "".format(len(index), mode))
     utils.create_directory(output_directory)
+    if mode == 'hll' and hll_workers:
+        with H.TrackerPool(n_workers=max(hll_workers, 0)) as pool:
+            return list(pool.map(_segment_hll, index, audio_files,
+                                 [output_directory] * len(index)))
+
     pool = Parallel(n_jobs=num_cpus, verbose=verbose)
     fx = delayed(segment_one)
     return pool(fx(idx, afile, mode, output_directory)
                 for idx, afile in zip(index, audio_files))
 
 
-def main(index_file, output_dir, output_index, mode, num_cpus=1, verbose=0):
-    dframe = pd.read_csv(index_file, index_col=[0])
+def main(index_file, output_dir, output_index, mode, num_cpus=1, verbose=0,
+         hll_workers=0):
+    dframe = minst.columnar.read_index(index_file)
     outputs = segment_many(dframe.index.tolist(), dframe.audio_file, mode,
                            output_dir, num_cpus=num_cpus,
-                           verbose=verbose)
+                           verbose=verbose, hll_workers=hll_workers)
     dframe['onsets_file'] = outputs
     output_file = os.path.join(output_dir, output_index)
-    dframe.to_csv(output_file)
-    return os.path.exists(output_file)
+    return minst.columnar.write_index(dframe, output_file)
 
 
 if __name__ == "__main__":
@@ -121,7 +145,7 @@ if __name__ == "__main__":
     parser.add_argument(
         "index_file",
         metavar="index_file", type=str,
-        help="A dframe in CSV format.")
+        help="Input index; CSV if it ends in '.csv', else columnar.")
     parser.add_argument(
         "output_dir",
         metavar="output_dir", type=str,
@@ -138,6 +162,12 @@ if __name__ == "__main__":
         "--num_cpus",
         metavar="num_cpus", type=int, default=-1,
         help="Number of CPUs to use; by default, uses all.")
+    parser.add_argument(
+        "--hll_workers",
+        metavar="hll_workers", type=int, default=0,
+        help="With --mode hll, number of persistent tracker processes to "
+             "segment the files in, instead of --num_cpus; -1 for one per "
+             "CPU, 0 (default) for none.")
     parser.add_argument(
         "--verbose",
         metavar="verbose", type=int, default=0,
@@ -149,5 +179,6 @@ if __name__ == "__main__":
     logging.config.dictConfig(minst.logger.get_config(level))
 
     success = main(args.index_file, args.output_dir, args.output_index,
-                   args.mode, args.num_cpus, args.verbose)
+                   args.mode, args.num_cpus, args.verbose,
+                   args.hll_workers)
     sys.exit(0 if success else 1)
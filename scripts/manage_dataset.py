@@ -2,15 +2,32 @@
 
 Usage:
  manage_dataset.py join <sources>... --output=MASTER_INDEX
- manage_dataset.py split <source_index> <test_set> <train_val_split> <output>
+ manage_dataset.py split <source_index> <test_set> <train_val_split> <output> [--salt=<SALT>]
+ manage_dataset.py splits [options] <source_index> <train_val_split> <output_dir> [--n_folds=<N>] [--n_repeats=<N>] [--seed=<S>] [--columnar]
  manage_dataset.py example [options] <destination_dir> <note_audio_dir> <source_index>... [--n_per_instrument=<N>]
+ manage_dataset.py audit [options] <source_index> <partition_index>...
+ manage_dataset.py validate [options] <source_index> [--check_files] [--chunk_rows=<N>]
 
 
 Arguments:
- join     Combine index csv files into one file.
- split    Perform a train-test split.
+ join     Combine index files into one file.
+ split    Perform a train-test split. With --salt, source_index groups
+          are assigned by a salted hash instead, and an existing output
+          is only extended with the new observations.
+ splits   Write every leave-one-dataset-out split, and optionally
+          --n_folds grouped k-fold and --n_repeats random splits for
+          each, from one pass over the index.
  example  Create an example notes dataset with N files sampled from
           the original datasets.
+ audit    Check partition files against the index they were made from:
+          fail if any source_index is in more than one partition (or
+          an observation is missing from the index), and log the
+          per-instrument counts of each partition.
+ validate Check every observation in an index against the schema,
+          reading it in chunks of --chunk_rows observations.
+
+Index paths ending in '.csv' are read / written as CSV; anything else as a
+columnar directory (see `minst.columnar`).
 
 Options:
 """
@@ -18,11 +35,14 @@ import boltons.fileutils
 from docopt import docopt
 import logging
 import logging.config
+import numpy as np
 import os
 import pandas as pd
 import shutil
+import sys
 import time
 
+import minst.columnar
 import minst.logger
 import minst.model
 import minst.taxonomy
@@ -34,7 +54,7 @@ logger = logging.getLogger('manage_dataset')
 def join_dataframes(sources):
     source_data = []
     for path in sources:
-        source_data.append(pd.read_csv(path, index_col=0))
+        source_data.append(minst.columnar.read_index(path))
 
     return pd.concat(source_data)
 
@@ -44,23 +64,133 @@ def join_note_files(sources, output_index):
     and write them back out to output_index.
     """
     final_data = join_dataframes(sources)
-    final_data.to_csv(output_index)
-    return os.path.exists(output_index)
+    return minst.columnar.write_index(final_data, output_index)
 
 
-def train_test_split(source_index, test_set, train_val_split, output_index):
+def train_test_split(source_index, test_set, train_val_split, output_index,
+                     salt=None):
     """Using test_set as the 'hold-out-set', segment source_index
     into train/test splits at the ratio train_test_split, and
     write the result to output.
+
+    If `salt` is given, the split is deterministic (see
+    `minst.model.Partitioner.hashed`); if output_index already exists, its
+    assignments are kept and only new observations are partitioned.
+    """
+    source = minst.columnar.read_index(source_index)
+    collection = minst.model.Collection.from_dataframe(source)
+
+    if salt is not None:
+        existing = None
+        if os.path.exists(output_index):
+            existing = minst.columnar.read_index(output_index)
+        partition_index_df = minst.model.Partitioner(collection).hashed(
+            test_set, train_val_split, salt, existing=existing)
+        logger.info("Partitioned {} new observation(s)".format(
+            len(partition_index_df) -
+            (0 if existing is None else len(existing))))
+    else:
+        partition_index_df = minst.model.partition_collection(
+            collection, test_set, train_val_split)
+
+    return minst.columnar.write_index(partition_index_df, output_index)
+
+
+def write_partitions(source_index, train_val_split, output_dir, n_folds=0,
+                     n_repeats=0, random_state=None, columnar=False):
+    """Load source_index once, and write every leave-one-dataset-out
+    partition to output_dir, as '{test_set}_partitions.csv'.
+
+    Optionally, also write for each test set `n_folds` grouped k-fold
+    partitions, as '{test_set}_fold{k}_partitions.csv', and `n_repeats`
+    further random partitions, as '{test_set}_repeat{k}_partitions.csv'.
+    All of them share one encoding of the source_index groups.
+
+    Parameters
+    ----------
+    columnar : bool, default=False
+        If True, write columnar directories (dropping the '.csv').
+
+    Returns
+    -------
+    success : bool
+        True if all outputs were written.
     """
-    source = pd.read_csv(source_index, index_col=0)
+    source = minst.columnar.read_index(source_index)
     collection = minst.model.Collection.from_dataframe(source)
+    partitioner = minst.model.Partitioner(collection)
+    rng = np.random.RandomState(random_state)
+    boltons.fileutils.mkdir_p(output_dir)
+
+    def write(partition_df, test_set, label=''):
+        name = "{}{}_partitions{}".format(test_set, label,
+                                          '' if columnar else '.csv')
+        return minst.columnar.write_index(partition_df,
+                                          os.path.join(output_dir, name))
 
-    partition_index_df = minst.model.partition_collection(
-        collection, test_set, train_val_split)
+    success = True
+    for test_set, partition_df in partitioner.leave_one_out(
+            train_val_split, random_state=rng).items():
+        success &= write(partition_df, test_set)
+        if n_folds:
+            for k, fold_df in enumerate(partitioner.kfold(
+                    test_set, n_folds, random_state=rng)):
+                success &= write(fold_df, test_set, "_fold{}".format(k))
+        for k, repeat_df in enumerate(partitioner.repeated(
+                test_set, train_val_split, n_repeats, random_state=rng)):
+            success &= write(repeat_df, test_set, "_repeat{}".format(k))
+        logger.info("Wrote partitions for test set: {}".format(test_set))
+    return success
+
+
+def audit_partitions(source_index, partition_indexes):
+    """Audit each partition index for leakage and class balance against
+    source_index; see `minst.model.audit_partition`.
 
-    partition_index_df.to_csv(output_index)
-    return os.path.exists(output_index)
+    Returns
+    -------
+    success : bool
+        True if no partition leaks, or refers to missing observations.
+    """
+    source = minst.columnar.read_index(
+        source_index, columns=['instrument', 'source_index'])
+
+    success = True
+    for partition_index in partition_indexes:
+        report = minst.model.audit_partition(
+            source, minst.columnar.read_index(partition_index))
+        logger.info("Class balance of {}:\n{}".format(
+            partition_index, report['balance']))
+        if len(report['leakage']):
+            logger.error("{} source(s) leak across partitions in {}:\n{}"
+                         "".format(len(report['leakage']), partition_index,
+                                   report['leakage']))
+        if report['missing']:
+            logger.error("{} observation(s) in {} missing from {}, e.g. {}"
+                         "".format(len(report['missing']), partition_index,
+                                   source_index, report['missing'][:5]))
+        success &= report['leakage'].empty and not report['missing']
+    return success
+
+
+def validate_index(source_index, check_files=False, chunk_rows=None):
+    """Validate an index chunk by chunk, so that memory use is bounded
+    by `chunk_rows` rather than the size of the index.
+
+    Returns
+    -------
+    success : bool
+        True if every observation is valid.
+    """
+    chunk_rows = chunk_rows or minst.model.Collection.CHUNK_ROWS
+    collection = minst.model.ChunkedCollection(source_index, rows=chunk_rows)
+    report = collection.validation_report(check_files=check_files)
+    for index, row in report.iterrows():
+        logger.warning("Failed {} check [{}]: {}".format(
+            row['field'], index, row['reason']))
+    logger.info("{} invalid observation(s) in {}".format(
+        len(report.index.unique()), source_index))
+    return report.empty
 
 
 def create_example_dataset(destination_dir, source_indexes, note_audio_dir,
@@ -146,6 +276,7 @@ if __name__ == "__main__":
     logger.debug(arguments)
 
     t0 = time.time()
+    success = True
     if arguments['join']:
         join_note_files(arguments['<sources>'], arguments['--output'])
     elif arguments['split']:
@@ -154,7 +285,27 @@ if __name__ == "__main__":
                          # source_index as a list for examples...
                          arguments['<test_set>'],
                          float(arguments['<train_val_split>']),
-                         arguments['<output>'])
+                         arguments['<output>'],
+                         salt=arguments['--salt'])
+    elif arguments['splits']:
+        seed = arguments['--seed']
+        success = write_partitions(
+            arguments['<source_index>'][0],
+            float(arguments['<train_val_split>']),
+            arguments['<output_dir>'],
+            n_folds=int(arguments['--n_folds'] or 0),
+            n_repeats=int(arguments['--n_repeats'] or 0),
+            random_state=int(seed) if seed else None,
+            columnar=arguments['--columnar'])
+    elif arguments['audit']:
+        success = audit_partitions(arguments['<source_index>'][0],
+                                   arguments['<partition_index>'])
+    elif arguments['validate']:
+        chunk_rows = arguments['--chunk_rows']
+        success = validate_index(
+            arguments['<source_index>'][0],
+            check_files=arguments['--check_files'],
+            chunk_rows=int(chunk_rows) if chunk_rows else None)
     elif arguments['example']:
         create_example_dataset(
             arguments['<destination_dir>'],
@@ -163,3 +314,5 @@ if __name__ == "__main__":
             int(arguments['--n_per_instrument']))
     t_end = time.time()
     logger.info("manage_dataset.py completed in: {}s".format(t_end - t0))
+    if not success:
+        sys.exit(1)
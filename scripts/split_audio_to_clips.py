@@ -8,8 +8,8 @@ Example:
 
 Arguments:
  segment_index   Input index file, as generated by `collect_data.py`.
- note_index      csv file which will contain the record of all notes
-                 created.
+ note_index      Index file which will contain the record of all notes
+                 created; CSV if it ends in '.csv', else columnar.
  note_audio_dir  Directory where note audio will be stored.
 
 Options:
@@ -18,6 +18,7 @@ Options:
  -v, --verbose   Increase verbosity level.
  --limit=N_FILES  Limit to procesing N_FILES for testing.
  --duration=DUR  Desired (fixed) output duration, in DUR sec, of notes.
+ --resume        Pick up from the journal left behind by an interrupted run.
 """
 from __future__ import print_function
 
@@ -30,6 +31,7 @@ import pandas as pd
 import sys
 import time
 
+import minst.columnar
 import minst.logger
 import minst.model as model
 import minst.signal as signal
@@ -122,8 +124,12 @@ def audio_to_observations(index, audio_file, onsets_file, note_audio_dir,
 
 def audio_collection_to_observations(segment_index_file, note_index_file,
                                      note_audio_dir, limit_n_files=None,
-                                     note_duration=None):
+                                     note_duration=None, resume=False):
     """
+    Observations are appended to a journal, `{note_index_file}.jsonl`, as
+    each source file is finished; the note index is written from the
+    journal at the end, and the journal then removed.
+
     Parameters
     ----------
     segment_index_file : str
@@ -137,6 +143,10 @@ def audio_collection_to_observations(segment_index_file, note_index_file,
     note_audio_dir : str
         Path to store the resulting audio file.
 
+    resume : bool, default=False
+        If True, keep an existing journal and skip the source files already
+        recorded in it; otherwise, start from scratch.
+
     Returns
     -------
     success : bool
@@ -144,7 +154,7 @@ def audio_collection_to_observations(segment_index_file, note_index_file,
     """
     logger.info("Begin audio collection segmentation")
     logger.debug("Loading segment index")
-    segment_df = pd.read_csv(segment_index_file, index_col=0)
+    segment_df = minst.columnar.read_index(segment_index_file)
     logger.debug("loaded {} records.".format(len(segment_df)))
 
     if segment_df.empty:
@@ -158,17 +168,28 @@ def audio_collection_to_observations(segment_index_file, note_index_file,
     # Drop rows that do not have onsets_files.
     segment_df = segment_df.loc[segment_df.onsets_file.dropna().index]
     utils.create_directory(note_audio_dir)
+
+    journal_file = "{}.jsonl".format(note_index_file)
+    if not resume and os.path.exists(journal_file):
+        os.remove(journal_file)
+    journal = model.ObservationJournal(journal_file)
+    if journal.completed:
+        logger.info("Resuming; skipping {} completed source files.".format(
+            len(journal.completed)))
+
     count = 0
-    observations = []
     for idx, row in segment_df.iterrows():
         if pd.isnull(row.onsets_file):
             logger.warning("No onset file for {} [{}]; moving on.".format(
                 row.audio_file, row.dataset))
             continue
-        observations += audio_to_observations(
+        if idx in journal.completed:
+            continue
+        observations = audio_to_observations(
             idx, row.audio_file, row.onsets_file, note_audio_dir,
             file_ext='flac', dataset=row.dataset, instrument=row.instrument,
             dynamic=row.dynamic, note_duration=note_duration)
+        journal.write(idx, observations)
         logger.debug("Generated {} observations ({} of {}).".format(
             len(observations), (count + 1), len(segment_df)))
 
@@ -185,12 +206,15 @@ def audio_collection_to_observations(segment_index_file, note_index_file,
     if PRINT_PROGRESS:
         print()
 
-    collection = model.Collection(observations)
-    collection.to_dataframe().to_csv(note_index_file)
+    collection = journal.to_collection()
+    success = minst.columnar.write_index(collection.to_dataframe(),
+                                         note_index_file)
     logger.debug("Wrote note index to {} with {} records".format(
         note_index_file, len(collection)))
+    if success and os.path.exists(journal_file):
+        os.remove(journal_file)
     logger.info("Completed audio collection segmentation")
-    return os.path.exists(note_index_file)
+    return success
 
 
 if __name__ == "__main__":
@@ -206,7 +230,8 @@ if __name__ == "__main__":
         arguments['<note_index>'],
         arguments['<note_audio_dir>'],
         int(arguments['--limit']) if arguments['--limit'] else None,
-        float(arguments['--duration']) if arguments['--duration'] else None)
+        float(arguments['--duration']) if arguments['--duration'] else None,
+        arguments['--resume'])
     t_end = time.time()
     print("segmented audio collection to observations completed in: {}s"
           "".format(t_end - t0))
@@ -0,0 +1,16 @@
+import pytest
+
+import os
+import pandas as pd
+
+import benchmark_onsets
+
+
+def test_main(workspace):
+    index_file = os.path.join(workspace, 'index.csv')
+    output_file = os.path.join(workspace, 'benchmark.csv')
+    assert benchmark_onsets.main(index_file, output_file, modes=['envelope'],
+                                 synthetic=2)
+    results = pd.read_csv(output_file, index_col=0)
+    assert len(results) == 2
+    assert (results['mode'] == 'envelope').all()
@@ -42,3 +42,20 @@ def test_main(audio_file, workspace):
                        # Some parallelization funniness with librosa?
                        num_cpus=1)
     assert success
+
+
+def test_segment_many_hll_workers(audio_file, workspace, monkeypatch):
+    monkeypatch.setattr(CNO.H, 'BACKEND', 'numpy')
+    # Files are segmented in the workers, not here.
+    parent, segment_one = os.getpid(), CNO.segment_one
+
+    def worker_segment_one(*args, **kwargs):
+        assert os.getpid() != parent
+        return segment_one(*args, **kwargs)
+    monkeypatch.setattr(CNO, 'segment_one', worker_segment_one)
+    idxs = ['abc', 'def']
+    output_files = CNO.segment_many(
+        index=idxs, audio_files=[audio_file] * 2,
+        mode='hll', output_directory=workspace, hll_workers=2)
+    for fout in output_files:
+        assert os.path.exists(fout)
@@ -5,6 +5,7 @@ import os
 import pandas as pd
 import random
 
+import minst.columnar
 import minst.model
 import minst.sources
 
@@ -52,6 +53,84 @@ def test_train_test_split(dummy_observations, workspace, uiowa_root,
     assert M.train_test_split(note_index, 'c', 0.2, partition_index)
 
 
+def test_train_test_split_columnar(dummy_observations, workspace):
+    collec = minst.model.Collection(dummy_observations, strict=False)
+    note_index = os.path.join(workspace, 'train_test_split_note_index')
+    assert collec.to_columnar(note_index)
+
+    partition_index = os.path.join(workspace, 'train_test_split_output')
+    assert M.train_test_split(note_index, 'rwc', 0.2, partition_index)
+    partition_df = minst.columnar.read_index(partition_index)
+    assert len(partition_df) == len(collec)
+
+
+def test_train_test_split_salted(dummy_observations, workspace):
+    collec = minst.model.Collection(dummy_observations[:300], strict=False)
+    note_index = os.path.join(workspace, 'salted_note_index.csv')
+    collec.to_dataframe().to_csv(note_index)
+
+    partition_index = os.path.join(workspace, 'salted_partitions.csv')
+    assert M.train_test_split(note_index, 'rwc', 0.2, partition_index,
+                              salt='xyz')
+    first_df = pd.read_csv(partition_index, index_col=0)
+
+    collec = minst.model.Collection(dummy_observations, strict=False)
+    collec.to_dataframe().to_csv(note_index)
+    assert M.train_test_split(note_index, 'rwc', 0.2, partition_index,
+                              salt='xyz')
+    partition_df = pd.read_csv(partition_index, index_col=0)
+    assert len(partition_df) == len(collec)
+    assert partition_df.loc[first_df.index].equals(first_df)
+
+
+def test_write_partitions(dummy_observations, workspace):
+    collec = minst.model.Collection(dummy_observations, strict=False)
+    note_index = os.path.join(workspace, 'write_partitions_note_index.csv')
+    collec.to_dataframe().to_csv(note_index)
+
+    output_dir = os.path.join(workspace, 'partitions')
+    assert M.write_partitions(note_index, 0.2, output_dir, n_folds=3,
+                              n_repeats=2, random_state=5)
+    outputs = os.listdir(output_dir)
+    assert len(outputs) == 3 * (1 + 3 + 2)
+    for test_set in ['rwc', 'uiowa', 'philharmonia']:
+        assert "{}_partitions.csv".format(test_set) in outputs
+        assert "{}_fold2_partitions.csv".format(test_set) in outputs
+        partition_df = pd.read_csv(os.path.join(
+            output_dir, "{}_repeat1_partitions.csv".format(test_set)),
+            index_col=0)
+        assert len(partition_df) == len(collec)
+
+
+def test_audit_partitions(dummy_observations, workspace):
+    # Sources of real observations only ever have one instrument.
+    for obs in dummy_observations:
+        obs.source_index += obs.instrument
+    collec = minst.model.Collection(dummy_observations, strict=False)
+    note_index = os.path.join(workspace, 'audit_note_index.csv')
+    collec.to_dataframe().to_csv(note_index)
+    partition_index = os.path.join(workspace, 'audit_partitions.csv')
+    assert M.train_test_split(note_index, 'rwc', 0.2, partition_index)
+    assert M.audit_partitions(note_index, [partition_index])
+
+    partition_df = pd.read_csv(partition_index, index_col=0)
+    partition_df['partition'] = partition_df['partition'].sample(frac=1.0) \
+        .values
+    partition_df.to_csv(partition_index)
+    assert not M.audit_partitions(note_index, [partition_index])
+
+
+def test_validate_index(dummy_observations, workspace):
+    collec = minst.model.Collection(dummy_observations, strict=False)
+    note_index = os.path.join(workspace, 'validate_note_index')
+    assert collec.to_columnar(note_index)
+    assert M.validate_index(note_index, chunk_rows=64)
+
+    collec.set('start_time', -1.0, rows=[3])
+    assert collec.to_columnar(note_index)
+    assert not M.validate_index(note_index, chunk_rows=64)
+
+
 def test_create_example_dataset(dummy_observations, workspace, uiowa_root,
                                 rwc_root, philz_root):
     notes_dir = os.path.join(workspace, 'notes_data')
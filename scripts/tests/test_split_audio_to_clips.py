@@ -80,3 +80,27 @@ def test_audio_collection_to_observations_no_onsets(uiowa_root, workspace):
 
     assert SC.audio_collection_to_observations(
         seg_file, 'empty_note_index.csv', output_dir)
+
+
+def test_audio_collection_to_observations_resume(uiowa_root, onset_root,
+                                                 workspace):
+    index = "uiowa78fae0a0"
+    onsets_file = os.path.join(onset_root, 'uiowa', "{}.csv".format(index))
+    rec = dict(audio_file='missing.aiff', onsets_file=onsets_file,
+               instrument="Tuba", dataset='uiowa', dynamic='ff')
+    seg_file = os.path.join(workspace, 'seg_index.csv')
+    pd.DataFrame.from_records([rec], index=[index]).to_csv(seg_file)
+
+    # This source was finished before the "crash", so it isn't re-run.
+    note_index = os.path.join(workspace, 'resumed_note_index.csv')
+    obs = model.Observation(
+        index='uiowa1234', audio_file='uiowa1234.flac', source_index=index,
+        start_time=0.0, duration=1.0, instrument='Tuba', dataset='uiowa')
+    model.ObservationJournal(note_index + '.jsonl').write(index, [obs])
+
+    assert SC.audio_collection_to_observations(
+        seg_file, note_index, os.path.join(workspace, 'notes_tmp'),
+        resume=True)
+    notes = pd.read_csv(note_index, index_col=0)
+    assert notes.index.tolist() == ['uiowa1234']
+    assert not os.path.exists(note_index + '.jsonl')